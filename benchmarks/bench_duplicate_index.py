@@ -0,0 +1,57 @@
+"""
+Benchmark of near-duplicate lookups in the perceptual hash index.
+
+Fills HashIndex with 1M random 64-bit hashes and measures lookups of hashes
+that are a few bits away from an indexed one (hits) and of random hashes
+(misses), compared with a linear scan of all hashes.
+
+Run from the project root: python benchmarks/bench_duplicate_index.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.duplicates import HashIndex  # noqa: E402
+
+
+IMAGES = 1_000_000
+LOOKUPS = 10_000
+USERS = 10_000
+
+
+def flip_bits(value: int, count: int) -> int:
+    for bit in random.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def main() -> None:
+    random.seed(0)
+    hashes = [random.getrandbits(64) for _ in range(IMAGES)]
+
+    index = HashIndex(max_distance=4)
+    start = time.perf_counter()
+    for post_id, value in enumerate(hashes):
+        index.add(post_id, f'{value:016x}', post_id % USERS)
+    print(f'{IMAGES} hashes indexed in {time.perf_counter() - start:.1f} s')
+
+    hits = [f'{flip_bits(random.choice(hashes), random.randint(0, 4)):016x}' for _ in range(LOOKUPS)]
+    misses = [f'{random.getrandbits(64):016x}' for _ in range(LOOKUPS)]
+
+    for name, queries in (('hit', hits), ('miss', misses)):
+        start = time.perf_counter()
+        found = sum(bool(index.find(query)) for query in queries)
+        elapsed = time.perf_counter() - start
+        print(f'{name:>5}: {elapsed / LOOKUPS * 1e6:8.1f} us per lookup, {found} found')
+
+    query = int(hits[0], 16)
+    start = time.perf_counter()
+    [post_id for post_id, value in enumerate(hashes) if (query ^ value).bit_count() <= 4]
+    print(f' scan: {(time.perf_counter() - start) * 1e6:8.1f} us per lookup')
+
+
+if __name__ == '__main__':
+    main()
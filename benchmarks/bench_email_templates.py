@@ -0,0 +1,58 @@
+"""
+Benchmark of rendering the confirmation email.
+
+Renders 10k confirmation emails three ways: loading and compiling the template
+for every message as FastMail did, rendering the compiled Jinja template, and
+joining the pre-rendered fragments of MailTemplates.
+
+Run from the project root: python benchmarks/bench_email_templates.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape  # noqa: E402
+
+from src.services.mail_templates import MailTemplates, TEMPLATE_FOLDER  # noqa: E402
+
+
+MESSAGES = 10_000
+TEMPLATE = 'email_template.html'
+
+
+def contexts():
+    return [
+        {'host': 'http://localhost:8000/', 'username': f'user{i}', 'token': f'eyJhbGciOiJIUzI1NiJ9.{i:032x}.signature'}
+        for i in range(MESSAGES)
+    ]
+
+
+def per_message(context: dict) -> str:
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape())
+    return environment.get_template(TEMPLATE).render(context)
+
+
+def main() -> None:
+    messages = contexts()
+
+    compiled = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape()).get_template(TEMPLATE)
+    templates = MailTemplates()
+    templates.load()
+    assert templates.render(TEMPLATE, messages[0]) == compiled.render(messages[0])
+
+    for name, render in (
+        ('load per message', per_message),
+        ('compiled jinja', compiled.render),
+        ('fragments', lambda context: templates.render(TEMPLATE, context)),
+    ):
+        start = time.perf_counter()
+        for context in messages:
+            render(context)
+        elapsed = time.perf_counter() - start
+        print(f'{name:>16}: {elapsed * 1000:8.1f} ms per {MESSAGES} messages, {elapsed / MESSAGES * 1e6:6.1f} us per message')
+
+
+if __name__ == '__main__':
+    main()
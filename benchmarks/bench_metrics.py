@@ -0,0 +1,64 @@
+"""
+Benchmark of the metrics overhead per request.
+
+Calls a bare ASGI app directly, behind MetricsMiddleware, and renders the
+metrics of a few hundred series, to show what metrics_enabled costs a request
+and what a scrape costs.
+
+Run from the project root: python benchmarks/bench_metrics.py
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.metrics import Metrics, MetricsMiddleware  # noqa: E402
+
+
+REQUESTS = 100_000
+ROUTES = [SimpleNamespace(path=f'/api/route{i}/{{item_id}}') for i in range(50)]
+
+
+async def app(scope, receive, send):
+    scope['route'] = ROUTES[hash(scope['path']) % len(ROUTES)]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'{}'})
+
+
+async def receive():
+    return {'type': 'http.request', 'body': b''}
+
+
+async def send(message):
+    pass
+
+
+async def measure(handler) -> float:
+    scopes = [{'type': 'http', 'method': 'GET', 'path': f'/api/route/{i}', 'headers': []} for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        await handler(dict(scopes[i % len(scopes)]), receive, send)
+    return (time.perf_counter() - start) / REQUESTS
+
+
+async def run() -> None:
+    registry = Metrics()
+    bare = await measure(app)
+    instrumented = await measure(MetricsMiddleware(app, registry))
+    print(f'{"bare app":>20}: {bare * 1e6:6.2f} us per request')
+    print(f'{"with metrics":>20}: {instrumented * 1e6:6.2f} us per request (+{(instrumented - bare) * 1e6:.2f} us)')
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f'{"render":>20}: {(time.perf_counter() - start) * 1e3:6.2f} ms for {len(registry.requests)} series, {len(text)} bytes')
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
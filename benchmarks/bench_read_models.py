@@ -0,0 +1,81 @@
+"""
+Benchmark of ORM instances vs __slots__ read models for 10k comments.
+
+Loads the same 10k rows from an in-memory SQLite database as Comment ORM
+instances and as CommentRecord read models, and reports load time and the
+memory held by the result.
+
+Run from the project root: python benchmarks/bench_read_models.py
+"""
+import asyncio
+from datetime import datetime, timedelta
+import os
+import sys
+import timeit
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.models import Base, Comment, Post, User  # noqa: E402
+from src.repository import comments as comments_repository  # noqa: E402
+
+
+ROWS = 10_000
+REPEAT = 5
+
+
+def make_session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    user = User(username='user', email='user@example.com', password='password')
+    db.add(user)
+    db.commit()
+    post = Post(post_url='url', public_id='public_id', description='description', user_id=user.id)
+    db.add(post)
+    db.commit()
+
+    start = datetime(2024, 1, 1)
+    db.execute(insert(Comment), [
+        {'comment_text': f'Comment number {i}', 'created_at': start + timedelta(seconds=i), 'post_id': post.id, 'user_id': user.id}
+        for i in range(ROWS)
+    ])
+    db.commit()
+    return db, post.id
+
+
+def load_orm(db, post_id):
+    result = db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.created_at, Comment.id).all()
+    db.expunge_all()
+    return result
+
+
+def load_records(db, post_id):
+    return asyncio.run(comments_repository.get_comments_for_post(post_id, db, limit=ROWS))
+
+
+def measure_memory(func, db, post_id) -> int:
+    tracemalloc.start()
+    result = func(db, post_id)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == ROWS
+    return size
+
+
+def main() -> None:
+    db, post_id = make_session()
+
+    print(f'{ROWS} comments, best of {REPEAT}')
+    for name, func in (('orm', load_orm), ('records', load_records)):
+        best = min(timeit.repeat(lambda: func(db, post_id), number=1, repeat=REPEAT))
+        memory = measure_memory(func, db, post_id)
+        print(f'{name:>8}: {best * 1000:8.1f} ms  {memory / 1024:8.0f} KiB held')
+
+
+if __name__ == '__main__':
+    main()
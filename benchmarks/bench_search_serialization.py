@@ -0,0 +1,75 @@
+"""
+Benchmark of the search_posts response path for 10k posts.
+
+Compares the default path (PostProfile models -> response_model validation ->
+jsonable_encoder -> json) with the fast path (plain rows -> FastJSONResponse).
+
+Run from the project root: python benchmarks/bench_search_serialization.py
+"""
+import os
+import sys
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.schemas.comments import CommentByUser  # noqa: E402
+from src.schemas.posts import PostProfile, PostsByFilter  # noqa: E402
+from src.services.responses import FastJSONResponse, orjson  # noqa: E402
+
+
+POSTS = 10_000
+REPEAT = 5
+
+
+def make_rows() -> list[dict]:
+    return [
+        {
+            'id': i,
+            'url': f'https://res.cloudinary.com/demo/image/upload/v1/SomeFile/{i}',
+            'description': f'Description of the post number {i}',
+            'average_rating': 3.5,
+            'tags': ['nature', 'sea', 'summer'],
+            'comments_count': 42,
+            'comments': [{'user_id': j, 'comment': f'Comment {j} to post {i}'} for j in range(3)],
+        }
+        for i in range(POSTS)
+    ]
+
+
+def default_path(rows: list[dict]) -> bytes:
+    posts = [
+        PostProfile(
+            id=row['id'],
+            url=row['url'],
+            description=row['description'],
+            average_rating=row['average_rating'],
+            tags=row['tags'],
+            comments_count=row['comments_count'],
+            comments=[CommentByUser(**comment) for comment in row['comments']],
+        )
+        for row in rows
+    ]
+    result = PostsByFilter(posts=posts)
+    validated = PostsByFilter.model_validate(result, from_attributes=True)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def fast_path(rows: list[dict]) -> bytes:
+    return FastJSONResponse({'posts': rows}).body
+
+
+def main() -> None:
+    rows = make_rows()
+    assert len(default_path(rows)) > 0 and len(fast_path(rows)) > 0
+
+    print(f'{POSTS} posts, best of {REPEAT}, orjson: {"yes" if orjson else "no"}')
+    for name, func in (('default', default_path), ('fast', fast_path)):
+        best = min(timeit.repeat(lambda: func(rows), number=1, repeat=REPEAT))
+        print(f'{name:>8}: {best * 1000:8.1f} ms  {len(func(rows)) / 1024:8.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of access token verification.
+
+Verifies the same set of tokens with every available backend and key type:
+HS256 with the shared secret, RS256 and, with PyJWT, EdDSA, and measures hits
+of the VerifiedTokens LRU. Keys are generated in a temporary directory.
+
+Run from the project root: python benchmarks/bench_token_decode.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa  # noqa: E402
+
+from src.services.tokens import KeySet, VerifiedTokens, pyjwt  # noqa: E402
+
+
+TOKENS = 1_000
+ROUNDS = 5
+
+
+def write_key(directory: str, private_key) -> None:
+    pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    with open(os.path.join(directory, 'key.pem'), 'wb') as f:
+        f.write(pem)
+
+
+def key_sets(directory: str):
+    backends = ['jose'] + (['pyjwt'] if pyjwt is not None else [])
+
+    for backend in backends:
+        yield f'{backend} HS256', KeySet(keys_dir=None, active_kid=None, accept_legacy=True, backend=backend)
+
+    write_key(directory, rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    for backend in backends:
+        yield f'{backend} RS256', KeySet(keys_dir=directory, active_kid=None, accept_legacy=False, backend=backend)
+
+    if pyjwt is not None:
+        write_key(directory, ed25519.Ed25519PrivateKey.generate())
+        yield 'pyjwt EdDSA', KeySet(keys_dir=directory, active_kid=None, accept_legacy=False, backend='auto')
+
+
+def measure(verify, tokens) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for token in tokens:
+            verify(token)
+    return (time.perf_counter() - start) / (ROUNDS * len(tokens))
+
+
+def main() -> None:
+    exp = int(time.time()) + 3600
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, keys in key_sets(directory):
+            tokens = [keys.sign({'sub': f'user{i}@example.com', 'scope': 'access_token', 'exp': exp}) for i in range(TOKENS)]
+            elapsed = measure(keys.verify, tokens)
+            print(f'{name:>12}: {elapsed * 1e6:7.1f} us per token, {1 / elapsed:9.0f} tokens/s')
+
+        cache = VerifiedTokens(keys, size=TOKENS)
+        measure(cache.verify, tokens)
+        elapsed = measure(cache.verify, tokens)
+        print(f'{"LRU hit":>12}: {elapsed * 1e6:7.1f} us per token, {1 / elapsed:9.0f} tokens/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,33 @@
+import asyncio
+
 from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
-import redis.asyncio as redis
 
 from src.routes import  auth, users, posts, transformations, tags, comments, rating
 from src.conf.config import settings
+from src.database.db import replica_pool
+from src.services.comments import comment_service
+from src.services.duplicates import duplicate_index
+from src.services.email import mail_service
+from src.services.media import media_service
+from src.services.metrics import MetricsMiddleware, instrument, metrics_endpoint
+from src.services.rate_limits import RateLimitHeadersMiddleware
+from src.services.responses import FastJSONResponse
+from src.services.uploads import upload_store
+from src.services.upload_guard import BodySizeLimitMiddleware, upload_guard
+
 
+app = FastAPI(default_response_class=FastJSONResponse)
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=upload_guard.body_limit,
+    path_limits={'/api/posts/batch': upload_guard.body_limit * settings.posts_batch_max_files},
+)
 
-app = FastAPI()
+if settings.metrics_enabled:
+    instrument()
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route(settings.metrics_path, metrics_endpoint, methods=['GET'], include_in_schema=False)
 
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
@@ -18,8 +39,30 @@ app.include_router(rating.router, prefix='/api')
 
 @app.on_event('startup')
 async def startup():
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
-    await FastAPILimiter.init(r)
+    await comment_service.start()
+    await duplicate_index.load()
+    app.state.upload_gc = asyncio.create_task(upload_store.monitor())
+    await media_service.start()
+    await mail_service.start()
+
+    if replica_pool.engines:
+        app.state.replica_monitor = asyncio.create_task(replica_pool.monitor())
+
+
+async def cancel(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    await comment_service.stop()
+    await media_service.stop()
+    await mail_service.stop()
+    await cancel(getattr(app.state, 'upload_gc', None))
+    await cancel(getattr(app.state, 'replica_monitor', None))
 
 
 @app.get('/')
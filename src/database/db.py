@@ -1,15 +1,183 @@
+import asyncio
+from contextlib import contextmanager
+from functools import wraps
+import inspect
+from itertools import count
+import logging
+from typing import Callable
+
 from fastapi import HTTPException, status
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 
 from src.conf.config import settings
 
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class ReplicaPool:
+    """
+    Read replicas used in round-robin order.
+
+    A background check measures replication lag of every replica; replicas that
+    are unreachable or lag more than replica_max_lag_seconds are taken out of
+    rotation until a later check finds them healthy again.
+    """
+
+    lag_query = text(
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+    )
+
+    def __init__(self, urls: list[str], max_lag: float = settings.replica_max_lag_seconds):
+        self.engines: list[Engine] = [create_engine(url, pool_pre_ping=True) for url in urls]
+        self.healthy: list[Engine] = list(self.engines)
+        self.lag: dict[Engine, float | None] = {replica: None for replica in self.engines}
+        self.max_lag = max_lag
+        self.counter = count()
+
+    def pick(self) -> Engine | None:
+        """
+        Get the next healthy replica.
+
+        :return: Engine | None: None when no replica is in rotation
+        """
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self.counter) % len(healthy)]
+
+    def measure_lag(self, replica: Engine) -> float | None:
+        """
+        Get replication lag of the replica in seconds.
+
+        :param replica: Engine: Replica engine
+        :return: float | None: None when the replica is unreachable
+        """
+        try:
+            with replica.connect() as connection:
+                if replica.dialect.name != 'postgresql':
+                    connection.execute(text('SELECT 1'))
+                    return 0.0
+                lag = connection.execute(self.lag_query).scalar()
+                return float(lag or 0)
+        except SQLAlchemyError as e:
+            logger.warning('Replica %s is unavailable: %s', replica.url.render_as_string(hide_password=True), e)
+            return None
+
+    def check(self) -> None:
+        """
+        Measure all replicas and rebuild the rotation.
+
+        :return: None
+        """
+        for replica in self.engines:
+            self.lag[replica] = self.measure_lag(replica)
+
+        self.healthy = [replica for replica in self.engines if self.lag[replica] is not None and self.lag[replica] <= self.max_lag]
+
+    async def monitor(self, interval: float = settings.replica_check_interval) -> None:
+        """
+        Check replicas every interval seconds.
+
+        :param interval: float: Seconds between checks
+        :return: None
+        """
+        while True:
+            await asyncio.to_thread(self.check)
+            await asyncio.sleep(interval)
+
+
+replica_pool = ReplicaPool(settings.sqlalchemy_replica_urls)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads of read_only repository functions to replicas.
+
+    Everything else goes to the primary. Once the session has written anything
+    it stays on the primary, so a request reads its own writes. Inside a primary
+    block read_only functions read the primary too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if clause is not None and getattr(clause, 'is_dml', False):
+            self.info['wrote'] = True
+
+        if self._flushing or self.info.get('wrote') or self.info.get('primary') or not self.info.get('read_only'):
+            return engine
+
+        return replica_pool.pick() or engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _stick_to_primary(session, flush_context):
+    session.info['wrote'] = True
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+
+def read_only(func: Callable) -> Callable:
+    """
+    Decorator for repository functions that only read.
+
+    While the function runs, its db session may route queries to a replica.
+
+    :param func: Callable: Async repository function with a db parameter
+    :return: Callable
+    """
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        db = signature.bind_partial(*args, **kwargs).arguments.get('db')
+        info = getattr(db, 'info', None)
+
+        if not isinstance(info, dict):
+            return await func(*args, **kwargs)
+
+        previous = info.get('read_only', False)
+        info['read_only'] = True
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            info['read_only'] = previous
+
+    return wrapper
+
+
+@contextmanager
+def primary(db: Session):
+    """
+    Context manager that sends the queries of the block to the primary, also
+    from read_only functions called in the block or around it.
+
+    Replicas lag behind the primary, so a row written a moment ago, possibly by
+    an earlier request, may be missing or old there. Rechecking a miss on the
+    primary reads it anyway, and responses that are cached or carry the version
+    of the primary are built from the primary.
+
+    :param db: Session: Connection to the database
+    :return: Context manager
+    """
+    info = getattr(db, 'info', None)
+    if not isinstance(info, dict):
+        yield db
+        return
+
+    previous = info.get('primary', False)
+    info['primary'] = True
+    try:
+        yield db
+    finally:
+        info['primary'] = previous
 
 
 def get_db():
@@ -1,8 +1,8 @@
 import enum
 
-from sqlalchemy import Column, ForeignKey, Integer, String, func, DateTime, Boolean, Enum, Table, Text, Float
+from sqlalchemy import Column, ForeignKey, Integer, String, func, DateTime, Boolean, Enum, Table, Text, Float, Index, JSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, relationship
 
 
 Base = declarative_base()
@@ -47,6 +47,7 @@ class Post(Base):
     public_id = Column(String())
     description = Column(Text)
     average_rating = Column(Float, default=0.0)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
     created_at = Column('created_at', DateTime, default=func.now())
     updated_at = Column('updated_at', DateTime, default=func.now())
 
@@ -57,6 +58,21 @@ class Post(Base):
     ratings = relationship('PostRating', backref='posts', cascade='all, delete-orphan')
 
 
+class PostImage(Base):
+    __tablename__ = 'post_images'
+
+    id = Column(Integer, primary_key=True)
+    post_id = Column(Integer, ForeignKey(Post.id, ondelete='CASCADE'), unique=True, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    orientation = Column(Integer, default=1)
+    phash = Column(String(16), index=True)
+    thumbnails = Column(JSON, nullable=False, default=list)
+    created_at = Column('created_at', DateTime, default=func.now())
+
+    post = relationship('Post', backref=backref('image', uselist=False, passive_deletes=True))
+
+
 class Comment(Base):
     __tablename__ = 'comments'
 
@@ -71,6 +87,10 @@ class Comment(Base):
     user = relationship('User', backref='comments')
     post = relationship('Post', backref='comments')
 
+    __table_args__ = (
+        Index('ix_comments_post_id_created_at_id', 'post_id', 'created_at', 'id'),
+    )
+
 
 class Tag(Base):
     __tablename__ = 'tags'
@@ -106,6 +126,31 @@ class PostRating(Base):
     user = relationship('User', backref='posts_rating')
 
 
+class MediaDeletion(Base):
+    __tablename__ = 'media_deletions'
+
+    id = Column(Integer, primary_key=True)
+    public_id = Column(String(255), nullable=False, unique=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=func.now(), index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column('created_at', DateTime, default=func.now())
+
+
+class OutgoingEmail(Base):
+    __tablename__ = 'email_outbox'
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    template = Column(String(100), nullable=False)
+    context = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=func.now(), index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column('created_at', DateTime, default=func.now())
+
+
 class BlacklistToken(Base):
     __tablename__ = 'blacklisted_tokens'
     id = Column(Integer, primary_key=True)
@@ -1,12 +1,17 @@
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, Dict, List
 
 from sqlalchemy.orm import Session
-from sqlalchemy import  and_
+from sqlalchemy import  and_, delete, func, insert, select, tuple_
 from fastapi import HTTPException, status
 
+from src.database.db import read_only
 from src.database.models import Comment, User
 from src.schemas.comments import CommentModel
+from src.conf.config import settings
+from src.repository.post_versions import bump_post_version
+from src.repository.read_models import CommentRecord
+from src.services import events
 
 
 async def create_comment(db: Session, post_id: int, comment_data: CommentModel, user: User) -> Comment:
@@ -29,11 +34,37 @@ async def create_comment(db: Session, post_id: int, comment_data: CommentModel,
         user_id=user.id
     )
     db.add(comment)
+    await bump_post_version(db, post_id)
     db.commit()
     db.refresh(comment)
+    await events.emit(events.COMMENTS_CHANGED, post_id=post_id, user_id=user.id)
     return comment
 
 
+async def create_comments(db: Session, rows: List[dict]) -> List[Comment]:
+    """
+    Function to create several comments with a single INSERT ... RETURNING.
+    The version of each commented post is bumped once for the whole batch, so a burst
+    of comments on one post writes its row once per batch instead of once per comment.
+
+    :param db: Session: Connection to database
+    :param rows: List[dict]: Column values of the comments (comment_text, created_at, post_id, user_id)
+    :return: List[Comment]: Created comments in the order of rows
+    """
+    if not rows:
+        return []
+
+    query = insert(Comment).returning(Comment, sort_by_parameter_order=True)
+    comments = db.scalars(query, rows).all()
+    await bump_post_version(db, *{row['post_id'] for row in rows})
+    db.commit()
+
+    for post_id, user_id in {(row['post_id'], row['user_id']) for row in rows}:
+        await events.emit(events.COMMENTS_CHANGED, post_id=post_id, user_id=user_id)
+    return comments
+
+
+@read_only
 async def get_comment(db: Session, comment_id: int) -> Comment | None:
     """
     Function to get comment.
@@ -64,8 +95,10 @@ async def update_comment(db: Session, comment_id: int, comment_data: CommentMode
     
     comment.comment_text = comment_data.comment_text
     comment.updated_at = datetime.now()
+    await bump_post_version(db, comment.post_id)
     db.commit()
     db.refresh(comment)
+    await events.emit(events.COMMENTS_CHANGED, post_id=comment.post_id)
     return comment
 
 
@@ -82,19 +115,136 @@ async def delete_comment(db: Session, comment_id: int) -> Comment | None:
         return None
     
     db.delete(comment)
+    await bump_post_version(db, comment.post_id)
     db.commit()
+    await events.emit(events.COMMENTS_CHANGED, post_id=comment.post_id, user_id=comment.user_id)
     return comment
 
 
-async def get_comments_for_post(post_id: int, db: Session) -> List[Comment] | None:
+async def delete_comments(db: Session, comment_ids: List[int]) -> int:
+    """
+    Function to delete several comments in one query.
+
+    :param db: Session: Connection session to database
+    :param comment_ids: List[int]: Unique identifiers of comments
+    :return: int: Number of deleted comments
+    """
+    if not comment_ids:
+        return 0
+
+    query = delete(Comment).where(Comment.id.in_(comment_ids)).returning(Comment.post_id, Comment.user_id)
+    deleted = db.execute(query).all()
+    await bump_post_version(db, *{post_id for post_id, _ in deleted})
+    db.commit()
+
+    for post_id, user_id in set(deleted):
+        await events.emit(events.COMMENTS_CHANGED, post_id=post_id, user_id=user_id)
+    return len(deleted)
+
+
+@read_only
+async def get_comments_for_post(
+    post_id: int,
+    db: Session,
+    limit: int = settings.comments_page_size,
+    after: tuple[datetime, int] | None = None,
+) -> List[CommentRecord]:
     """
-    Function to get comments for post.
+    Function to get a page of comments for post.
+
+    Comments are ordered by (created_at, id) and paginated with a keyset
+    cursor, so deep pages cost the same as the first one.
 
     :param post_id: int: Unique identifier of post
     :param db: Session: Connection session to database
-    :return: List[Comment] | None
+    :param limit: int: Maximum number of comments in the page
+    :param after: tuple[datetime, int] | None: (created_at, id) of the last comment of the previous page
+    :return: List[CommentRecord]
     """
-    return  db.query(Comment).filter(Comment.post_id == post_id).all()
+    query = select(*CommentRecord.columns).where(Comment.post_id == post_id)
 
-    
+    if after is not None:
+        query = query.where(tuple_(Comment.created_at, Comment.id) > tuple_(*after))
+
+    query = query.order_by(Comment.created_at, Comment.id).limit(limit)
+    return [CommentRecord(*row) for row in db.execute(query).all()]
+
+
+async def iter_comments_for_post(post_id: int, db: Session, page_size: int = settings.comments_page_size) -> AsyncIterator[CommentRecord]:
+    """
+    Function to iterate over all comments for post page by page.
+
+    :param post_id: int: Unique identifier of post
+    :param db: Session: Connection session to database
+    :param page_size: int: Number of comments fetched per query
+    :return: AsyncIterator[CommentRecord]
+    """
+    after = None
+
+    while True:
+        page = await get_comments_for_post(post_id, db, limit=page_size, after=after)
+
+        for comment in page:
+            yield comment
+
+        if len(page) < page_size:
+            break
+
+        after = (page[-1].created_at, page[-1].id)
+
+
+@read_only
+async def count_comments_for_posts(post_ids: List[int], db: Session) -> Dict[int, int]:
+    """
+    Function to count comments for several posts in one query.
+
+    :param post_ids: List[int]: Unique identifiers of posts
+    :param db: Session: Connection session to database
+    :return: Dict[int, int]: Number of comments by post id
+    """
+    if not post_ids:
+        return {}
+
+    query = (
+        select(Comment.post_id, func.count(Comment.id))
+        .where(Comment.post_id.in_(post_ids))
+        .group_by(Comment.post_id)
+    )
+    return {post_id: count for post_id, count in db.execute(query).all()}
+
+
+@read_only
+async def get_latest_comment_rows_for_posts(post_ids: List[int], db: Session, limit: int = settings.post_profile_comments_limit) -> Dict[int, List[dict]]:
+    """
+    Function to get the latest comments for several posts as plain rows.
+
+    :param post_ids: List[int]: Unique identifiers of posts
+    :param db: Session: Connection session to database
+    :param limit: int: Maximum number of comments per post
+    :return: Dict[int, List[dict]]: {'user_id', 'comment'} rows by post id, newest first
+    """
+    if not post_ids or limit <= 0:
+        return {}
 
+    query = _latest_comments_query(post_ids, limit, Comment.post_id, Comment.user_id, Comment.comment_text)
+
+    result = {}
+    for post_id, user_id, comment_text in db.execute(query).all():
+        result.setdefault(post_id, []).append({'user_id': user_id, 'comment': comment_text})
+
+    return result
+
+
+def _latest_comments_query(post_ids: List[int], limit: int, *columns):
+    row_number = func.row_number().over(
+        partition_by=Comment.post_id,
+        order_by=(Comment.created_at.desc(), Comment.id.desc()),
+    ).label('row_number')
+
+    ranked = select(Comment.id, row_number).where(Comment.post_id.in_(post_ids)).subquery()
+    return (
+        select(*columns)
+        .join(ranked, Comment.id == ranked.c.id)
+        .where(ranked.c.row_number <= limit)
+        .order_by(Comment.post_id, ranked.c.row_number)
+    )
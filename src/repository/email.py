@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from src.database.models import OutgoingEmail
+
+
+async def enqueue_email(db: Session, recipient: str, subject: str, template: str, context: dict) -> OutgoingEmail:
+    """
+    Function to add an email to the outbox.
+
+    :param db: Session: Connection session to database
+    :param recipient: str: Email address of the recipient
+    :param subject: str: Subject of the email
+    :param template: str: Name of the template the body is rendered from
+    :param context: dict: Template variables
+    :return: OutgoingEmail
+    """
+    email = OutgoingEmail(recipient=recipient, subject=subject, template=template, context=context, attempts=0, next_attempt_at=datetime.now())
+    db.add(email)
+    db.commit()
+    return email
+
+
+async def get_due_emails(db: Session, limit: int) -> List[OutgoingEmail]:
+    """
+    Function to get queued emails that are due, oldest first.
+
+    Rows are locked so that other workers skip them.
+
+    :param db: Session: Connection session to database
+    :param limit: int: Maximum number of emails
+    :return: List[OutgoingEmail]
+    """
+    query = (
+        select(OutgoingEmail)
+        .where(OutgoingEmail.next_attempt_at <= datetime.now())
+        .order_by(OutgoingEmail.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return list(db.scalars(query).all())
+
+
+async def complete_emails(db: Session, emails: List[OutgoingEmail], errors: Dict[int, str], backoff: float) -> None:
+    """
+    Function to remove processed emails and reschedule failed ones.
+
+    A failed email is retried after backoff * 2 ** attempts seconds.
+
+    :param db: Session: Connection session to database
+    :param emails: List[OutgoingEmail]: Processed emails
+    :param errors: Dict[int, str]: Error of every email id that was not sent
+    :param backoff: float: Delay before the first retry in seconds
+    :return: None
+    """
+    done = [email.id for email in emails if email.id not in errors]
+    if done:
+        db.execute(delete(OutgoingEmail).where(OutgoingEmail.id.in_(done)).execution_options(synchronize_session=False))
+
+    now = datetime.now()
+    for email in emails:
+        if email.id in errors:
+            email.last_error = errors[email.id]
+            email.next_attempt_at = now + timedelta(seconds=backoff * 2 ** email.attempts)
+            email.attempts += 1
+
+    db.commit()
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from src.database.models import MediaDeletion, Post
+
+
+async def enqueue_media_deletion(db: Session, *public_ids: str) -> None:
+    """
+    Function to add media to the deletion outbox.
+
+    It is called by delete functions before their commit, so the media is queued
+    in the same transaction that removes its last reference. Ids already queued are skipped.
+
+    :param db: Session: Connection session to database
+    :param public_ids: str: Public ids of the media on Cloudinary
+    :return: None
+    """
+    public_ids = set(public_ids)
+    if not public_ids:
+        return
+
+    queued = set(db.scalars(select(MediaDeletion.public_id).where(MediaDeletion.public_id.in_(public_ids))).all())
+    db.add_all([MediaDeletion(public_id=public_id, attempts=0, next_attempt_at=datetime.now()) for public_id in public_ids - queued])
+
+
+async def get_due_media_deletions(db: Session, limit: int) -> List[MediaDeletion]:
+    """
+    Function to get queued deletions that are due, oldest first.
+
+    Rows are locked so that other workers skip them.
+
+    :param db: Session: Connection session to database
+    :param limit: int: Maximum number of deletions
+    :return: List[MediaDeletion]
+    """
+    query = (
+        select(MediaDeletion)
+        .where(MediaDeletion.next_attempt_at <= datetime.now())
+        .order_by(MediaDeletion.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return list(db.scalars(query).all())
+
+
+async def complete_media_deletions(db: Session, deletions: List[MediaDeletion], errors: Dict[str, str], backoff: float) -> None:
+    """
+    Function to remove processed deletions and reschedule failed ones.
+
+    A failed deletion is retried after backoff * 2 ** attempts seconds.
+
+    :param db: Session: Connection session to database
+    :param deletions: List[MediaDeletion]: Processed deletions
+    :param errors: Dict[str, str]: Error of every public id that was not deleted
+    :param backoff: float: Delay before the first retry in seconds
+    :return: None
+    """
+    done = [deletion.id for deletion in deletions if deletion.public_id not in errors]
+    if done:
+        db.execute(delete(MediaDeletion).where(MediaDeletion.id.in_(done)).execution_options(synchronize_session=False))
+
+    now = datetime.now()
+    for deletion in deletions:
+        if deletion.public_id in errors:
+            deletion.last_error = errors[deletion.public_id]
+            deletion.next_attempt_at = now + timedelta(seconds=backoff * 2 ** deletion.attempts)
+            deletion.attempts += 1
+
+    db.commit()
+
+
+async def get_referenced_public_ids(db: Session, public_ids: List[str]) -> Set[str]:
+    """
+    Function to get which public ids still belong to a post or are already queued.
+
+    :param db: Session: Connection session to database
+    :param public_ids: List[str]: Public ids to check
+    :return: Set[str]
+    """
+    if not public_ids:
+        return set()
+
+    posts = db.scalars(select(Post.public_id).where(Post.public_id.in_(public_ids))).all()
+    queued = db.scalars(select(MediaDeletion.public_id).where(MediaDeletion.public_id.in_(public_ids))).all()
+    return set(posts) | set(queued)
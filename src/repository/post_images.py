@@ -0,0 +1,80 @@
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from src.database.db import read_only
+from src.database.models import Post, PostImage
+from src.repository.post_versions import bump_post_version
+from src.repository.read_models import ImageRecord
+from src.services import events
+
+
+async def add_post_image(
+    db: Session,
+    post_id: int,
+    width: int,
+    height: int,
+    orientation: int,
+    phash: str,
+    thumbnails: List[dict],
+) -> PostImage:
+    """
+    Function to save image metadata and thumbnails of post.
+
+    :param db: Session: Connection session to database
+    :param post_id: int: id of the post
+    :param width: int: Width of the original image after EXIF orientation
+    :param height: int: Height of the original image after EXIF orientation
+    :param orientation: int: EXIF orientation tag of the original image
+    :param phash: str: Perceptual hash in hex
+    :param thumbnails: List[dict]: {'width', 'format', 'url'} of every thumbnail
+    :return: PostImage
+    """
+    image = PostImage(
+        post_id=post_id,
+        width=width,
+        height=height,
+        orientation=orientation,
+        phash=phash,
+        thumbnails=thumbnails,
+    )
+    db.add(image)
+    await bump_post_version(db, post_id)
+    db.commit()
+    db.refresh(image)
+    await events.emit(events.POST_CHANGED, post_id=post_id)
+
+    return image
+
+
+@read_only
+async def get_images_for_posts(post_ids: List[int], db: Session) -> Dict[int, ImageRecord]:
+    """
+    Function to get image metadata of several posts in one query.
+
+    :param post_ids: List[int]: ids of the posts
+    :param db: Session: Connection session to database
+    :return: Dict[int, ImageRecord]: Image of every post that has been ingested
+    """
+    if not post_ids:
+        return {}
+
+    query = select(PostImage.post_id, *ImageRecord.columns).where(PostImage.post_id.in_(post_ids))
+    return {post_id: ImageRecord(*row) for post_id, *row in db.execute(query).all()}
+
+
+async def get_post_hashes(db: Session) -> List[Row]:
+    """
+    Function to get perceptual hashes of all post images.
+
+    :param db: Session: Connection session to database
+    :return: List[Row]: (post_id, user_id, phash) rows
+    """
+    query = (
+        select(PostImage.post_id, Post.user_id, PostImage.phash)
+        .join(Post, Post.id == PostImage.post_id)
+        .where(PostImage.phash.is_not(None))
+    )
+    return db.execute(query).all()
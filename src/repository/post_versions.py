@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from src.database.models import Post
+
+
+async def bump_post_version(db: Session, *post_ids: int) -> None:
+    """
+    Function to increment version and updated_at of posts.
+
+    It is called by write functions before their commit, so the bump is part of
+    the same transaction as the change itself.
+
+    :param db: Session: Connection session to database
+    :param post_ids: int: ids of the changed posts
+    :return: None
+    """
+    if not post_ids:
+        return
+
+    db.execute(
+        update(Post)
+        .where(Post.id.in_(post_ids))
+        .values(version=Post.version + 1, updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_post_version(post_id: int, db: Session) -> Row | None:
+    """
+    Function to get version and updated_at of post without loading it.
+
+    :param post_id: int: id of the post
+    :param db: Session: Connection session to database
+    :return: Row | None: (version, updated_at)
+    """
+    return db.execute(select(Post.version, Post.updated_at).where(Post.id == post_id)).first()
@@ -2,14 +2,18 @@ from datetime import datetime
 from typing import List
 
 from fastapi import HTTPException, status
-import cloudinary.uploader
-from sqlalchemy import Column, func, desc
+from sqlalchemy import Column, func, desc, exists, insert, select
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 
-from src.database.models import Post, User, Tag, TransformedPost, PostRating
-from src.schemas.comments import CommentByUser
-from src.schemas.posts import PostProfile, PostsByFilter
-from src.repository import rating as repository_rating
+from src.database.db import read_only
+from src.database.models import Post, User, Tag, TransformedPost, PostRating, post_tag
+from src.repository import comments as repository_comments
+from src.repository import post_images as repository_post_images
+from src.repository.media import enqueue_media_deletion
+from src.repository.post_versions import bump_post_version
+from src.repository.read_models import PostRecord, TagRecord
+from src.services import events
 
 
 async def add_post(post_url: str, public_id: str, description: str, user: User, db: Session) -> Post:
@@ -35,14 +39,41 @@ async def add_post(post_url: str, public_id: str, description: str, user: User,
     db.add(post)
     db.commit()
     db.refresh(post)
+    await events.emit(events.POST_CHANGED, post_id=post.id, user_id=user.id)
     
     return post
 
 
+async def add_posts(rows: List[dict], user: User, db: Session) -> List[PostRecord]:
+    """
+    Function to add several posts with a single INSERT ... RETURNING.
+
+    :param rows: List[dict]: post_url, public_id and description of every post
+    :param user: User: Author of the posts
+    :param db: Session: Connection session to database
+    :return: List[PostRecord]: Created posts in the order of rows
+    """
+    if not rows:
+        return []
+
+    now = datetime.now()
+    values = [{**row, 'user_id': user.id, 'created_at': now, 'updated_at': now} for row in rows]
+    query = insert(Post).returning(*PostRecord.columns, sort_by_parameter_order=True)
+    posts = [PostRecord(*row) for row in db.execute(query, values).all()]
+    db.commit()
+
+    for post in posts:
+        await events.emit(events.POST_CHANGED, post_id=post.id, user_id=user.id)
+    return posts
+
+
 async def delete_post(post_id: int, db: Session) -> Post | None:
     """
     Function to delete post.
 
+    The image is queued for deletion from Cloudinary in the same transaction
+    and removed later by the media deletion worker.
+
     :param post_id: int: id of the post
     :param db: Session: Connection session to database
     :return: Post | None
@@ -53,10 +84,12 @@ async def delete_post(post_id: int, db: Session) -> Post | None:
         .first()
     )
     if post:
-        cloudinary.uploader.destroy(post.public_id)
+        await enqueue_media_deletion(db, post.public_id)
         post.tags = []
         db.delete(post)
         db.commit()
+        await events.emit(events.POST_CHANGED, post_id=post_id, user_id=post.user_id)
+        await events.emit(events.COMMENTS_CHANGED, post_id=post_id)
     return post
 
 
@@ -78,26 +111,49 @@ async def edit_description(post_id: int, description: str, db: Session) -> Post
         post.description = description
         post.tags = post.tags
         post.updated_at = datetime.now()
+        await bump_post_version(db, post_id)
         db.commit()
+        await events.emit(events.POST_CHANGED, post_id=post_id)
     return post
 
 
-async def get_user_posts(user_id, db: Session) -> List[Post]:
+@read_only
+async def get_user_posts(user_id, db: Session) -> List[PostRecord]:
     """
     Function to get current user's posts.
 
+    Posts, their tags and images are read with column selects into frozen
+    records, no ORM instances are created.
+
     :param user_id: int: Post author id
     :param db: Session: Connection session to database
-    :return: List[Post]
+    :return: List[PostRecord]
     """
-    result =  db.query(Post).filter(Post.user_id == user_id).all()
-    return result
+    rows = db.execute(select(*PostRecord.columns).where(Post.user_id == user_id).order_by(Post.id)).all()
+    if not rows:
+        return []
+
+    tags = {}
+    query = (
+        select(post_tag.c.post, *TagRecord.columns)
+        .join(Tag, Tag.id == post_tag.c.tag)
+        .where(post_tag.c.post.in_([row[0] for row in rows]))
+    )
+    for post_id, *tag in db.execute(query).all():
+        tags.setdefault(post_id, []).append(TagRecord(*tag))
+
+    images = await repository_post_images.get_images_for_posts([row[0] for row in rows], db)
 
+    return [PostRecord(*row, tags=tuple(tags.get(row[0], ())), image=images.get(row[0])) for row in rows]
 
 
 async def get_post(post_id: int, db: Session) -> Post | None:
     """
-    Function to get post.
+    Function to get post from the primary.
+
+    Used before changing the post, to check a post that was just written,
+    where a lagging replica could miss it, and for the post response, which
+    is cached and sent under the version read from the primary.
 
     :param post_id: int: id of the post
     :param db: Session: Connection session to database
@@ -110,6 +166,28 @@ async def get_post(post_id: int, db: Session) -> Post | None:
     )
 
 
+async def post_exists(post_id: int, db: Session) -> bool:
+    """
+    Function to check that post exists without loading it.
+
+    :param post_id: int: id of the post
+    :param db: Session: Connection session to database
+    :return: bool
+    """
+    return db.query(exists().where(Post.id == post_id)).scalar()
+
+
+async def get_post_ids(db: Session) -> List[int]:
+    """
+    Function to get ids of all posts.
+
+    :param db: Session: Connection session to database
+    :return: List[int]
+    """
+    return list(db.scalars(select(Post.id)).all())
+
+
+@read_only
 async def get_post_url(post_id: int, db: Session) -> Column[str] | None:
     """
     Function to get post url.
@@ -118,11 +196,30 @@ async def get_post_url(post_id: int, db: Session) -> Column[str] | None:
     :param db: Session: Connection session to database
     :return: Column[str] | None: Url of the post 
     """
-    result = db.query(Post).filter(Post.id == post_id).first()
-    if result is None:
-        return None
-    
-    return result.post_url
+    return db.query(Post.post_url).filter(Post.id == post_id).scalar()
+
+
+async def get_post_owner(post_id: int, db: Session) -> Row | None:
+    """
+    Function to get the author of post without loading the post.
+
+    :param post_id: int: id of the post
+    :param db: Session: Connection session to database
+    :return: Row | None: (user_id,) row, None if the post does not exist
+    """
+    return db.query(Post.user_id).filter(Post.id == post_id).first()
+
+
+@read_only
+async def get_post_average_rating(post_id: int, db: Session) -> Row | None:
+    """
+    Function to get the average rating of post without loading the post.
+
+    :param post_id: int: id of the post
+    :param db: Session: Connection session to database
+    :return: Row | None: (average_rating,) row, None if the post does not exist
+    """
+    return db.query(Post.average_rating).filter(Post.id == post_id).first()
 
 
 async def add_tag_to_post(post: Post, tag: Tag, db: Session) -> Post:
@@ -145,8 +242,10 @@ async def add_tag_to_post(post: Post, tag: Tag, db: Session) -> Post:
 
     post.tags.append(tag)
     post.updated_at = datetime.now()
+    await bump_post_version(db, post.id)
     db.commit()
     db.refresh(post)
+    await events.emit(events.POST_CHANGED, post_id=post.id)
     return post 
 
 
@@ -201,6 +300,7 @@ async def add_transformed_post(transformed_post_url: str, post_id: int, db: Sess
     return transformed_post
 
 
+@read_only
 async def get_transformed_post_url(transformed_post_id: int, db: Session) -> Column[str] | None:
     """
     Function to get transformed post url.
@@ -209,35 +309,73 @@ async def get_transformed_post_url(transformed_post_id: int, db: Session) -> Col
     :param db: Session: Connection session to database
     :return: Column[str] | None: Url of the transformed post 
     """
-    result = db.query(TransformedPost).filter(TransformedPost.id == transformed_post_id).first()
-    if result is None:
-        return None
-    
-    return result.transformed_post_url
+    return db.query(TransformedPost.transformed_post_url).filter(TransformedPost.id == transformed_post_id).scalar()
 
 
-async def get_all_posts(
-    current_user: User,
+@read_only
+async def search_posts_rows(
     db: Session,
     keyword: str = None,
     tag: str = None,
     min_rating: float = None,
     max_rating: float = None
-):
+) -> dict:
     """
-    Search all posts in the database based on the provided filters
-    such as keyword, tag, minimum and maximum rating.
+    Search posts by keyword, tag and rating, building the result from plain SQL rows.
+
+    No ORM instances or Pydantic models are created: posts, ratings, tags and
+    comments are loaded with one column query each and assembled into dicts
+    shaped like PostsByFilter, ready to be encoded as JSON.
 
-    :param current_user: User: The user making the request.
     :param db: Session: Database session.
     :param keyword: str, optional: Keyword to filter posts by description.
     :param tag: str, optional: Tag to filter posts.
     :param min_rating: float, optional: Minimum rating to filter posts.
     :param max_rating: float, optional: Maximum rating to filter posts.
-    :return: PostsByFilter: Response containing the list of filtered posts.
+    :return: dict: {'posts': [...]} with PostProfile fields
     """
-    query = db.query(Post)
-    
+    query = _filter_posts(db.query(Post.id, Post.post_url, Post.description), keyword, tag, min_rating, max_rating)
+    rows = query.all()
+    post_ids = [row[0] for row in rows]
+
+    if not post_ids:
+        return {'posts': []}
+
+    ratings = dict(db.execute(
+        select(PostRating.post_id, func.avg(PostRating.rating))
+        .where(PostRating.post_id.in_(post_ids))
+        .group_by(PostRating.post_id)
+    ).all())
+
+    tags = {}
+    for post_id, tag_name in db.execute(
+        select(post_tag.c.post, Tag.tag).join(Tag, Tag.id == post_tag.c.tag).where(post_tag.c.post.in_(post_ids))
+    ).all():
+        tags.setdefault(post_id, []).append(tag_name)
+
+    comments_count = await repository_comments.count_comments_for_posts(post_ids, db)
+    latest_comments = await repository_comments.get_latest_comment_rows_for_posts(post_ids, db)
+    images = await repository_post_images.get_images_for_posts(post_ids, db)
+
+    posts = []
+    for post_id, post_url, description in rows:
+        rating = ratings.get(post_id)
+        image = images.get(post_id)
+        posts.append({
+            'id': post_id,
+            'url': post_url,
+            'description': description,
+            'average_rating': float(rating) if rating is not None else None,
+            'tags': tags.get(post_id, []),
+            'comments_count': comments_count.get(post_id, 0),
+            'comments': latest_comments.get(post_id, []),
+            'image': {'width': image.width, 'height': image.height, 'thumbnails': image.thumbnails} if image else None,
+        })
+
+    return {'posts': posts}
+
+
+def _filter_posts(query, keyword: str = None, tag: str = None, min_rating: float = None, max_rating: float = None):
     if keyword:
         query = query.filter(Post.description.ilike(f"%{keyword}%"))
     
@@ -253,33 +391,4 @@ async def get_all_posts(
     if max_rating is not None:
         query = query.group_by(Post.id).having(func.avg(PostRating.rating) <= max_rating)
 
-    query = query.order_by(desc(Post.created_at))
-    result = query.all()
-    posts = []
-    
-    for post in result:
-        tags = []
-        comments = []
-
-        for comment in post.comments:
-            new_comment = CommentByUser(user_id=comment.user_id, comment=comment.comment_text)
-            comments.append(new_comment)
-
-        for tag in post.tags:
-            new_tag = tag.tag
-            tags.append(new_tag)
-
-        rating = await repository_rating.calculate_average_rating(post.id, db)
-        
-        new_post = PostProfile(
-            id=post.id,
-            url=post.post_url,
-            description=post.description,
-            average_rating=rating,
-            tags=tags,
-            comments=comments,
-        )
-        posts.append(new_post)
-
-    all_posts = PostsByFilter(posts=posts)
-    return all_posts
\ No newline at end of file
+    return query.order_by(desc(Post.created_at))
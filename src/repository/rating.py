@@ -5,7 +5,11 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, func, select
 from fastapi import HTTPException, status
 
+from src.database.db import read_only
 from src.database.models import PostRating, User, Post
+from src.repository.post_versions import bump_post_version
+from src.repository.read_models import RatingRecord
+from src.services import events
 
 
 async def create_rating(db: Session, post_id: int, rating: int, user: User) -> PostRating:
@@ -33,6 +37,7 @@ async def create_rating(db: Session, post_id: int, rating: int, user: User) -> P
 
     created_rating = PostRating(post_id=post_id, rating=rating, user_id=user.id)
     db.add(created_rating)
+    await bump_post_version(db, post_id)
     db.commit()
     db.refresh(created_rating)
 
@@ -41,6 +46,7 @@ async def create_rating(db: Session, post_id: int, rating: int, user: User) -> P
         post.average_rating = average_rating
         db.commit()
 
+    await events.emit(events.POST_CHANGED, post_id=post_id)
     return created_rating
     
 
@@ -74,6 +80,7 @@ async def delete_rating(post_id: int, user_id: int, db: Session) -> PostRating:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Rating not found')
     
     db.delete(rating)
+    await bump_post_version(db, post_id)
     db.commit()
 
     post = db.query(Post).filter(Post.id == post_id).first()
@@ -84,18 +91,21 @@ async def delete_rating(post_id: int, user_id: int, db: Session) -> PostRating:
         post.average_rating = average_rating
         db.commit()
 
+    await events.emit(events.POST_CHANGED, post_id=post_id)
     return rating
 
 
-async def get_user_ratings(user_id: int, db: Session) -> List[PostRating]:
+@read_only
+async def get_user_ratings(user_id: int, db: Session) -> List[RatingRecord]:
     """
     Function to get ratings given by a specific user.
 
     :param user_id: int: id of the user who gave ratings
     :param db: Session: Connection session to database
-    :return: List[PostRating]: List of ratings left by the user
+    :return: List[RatingRecord]: List of ratings left by the user
     """
-    result = db.query(PostRating).filter(PostRating.user_id == user_id).all()
+    query = select(*RatingRecord.columns).where(PostRating.user_id == user_id)
+    result = [RatingRecord(*row) for row in db.execute(query).all()]
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Ratings not found')
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from src.database.models import Comment, Post, PostImage, PostRating, Tag
+
+
+@dataclass(frozen=True, slots=True)
+class TagRecord:
+    id: int
+    tag: str
+
+    columns = (Tag.id, Tag.tag)
+
+
+@dataclass(frozen=True, slots=True)
+class ImageRecord:
+    width: int
+    height: int
+    thumbnails: list[dict]
+
+    columns = (PostImage.width, PostImage.height, PostImage.thumbnails)
+
+
+@dataclass(frozen=True, slots=True)
+class PostRecord:
+    id: int
+    post_url: str
+    user_id: int
+    created_at: datetime
+    updated_at: datetime | None
+    description: str
+    average_rating: float
+    tags: tuple[TagRecord, ...] = ()
+    image: ImageRecord | None = None
+
+    columns = (Post.id, Post.post_url, Post.user_id, Post.created_at, Post.updated_at, Post.description, Post.average_rating)
+
+
+@dataclass(frozen=True, slots=True)
+class CommentRecord:
+    id: int
+    comment_text: str
+    created_at: datetime
+    updated_at: datetime | None
+    post_id: int | None
+    user_id: int
+
+    columns = (Comment.id, Comment.comment_text, Comment.created_at, Comment.updated_at, Comment.post_id, Comment.user_id)
+
+
+@dataclass(frozen=True, slots=True)
+class RatingRecord:
+    id: int
+    post_id: int
+    rating: int
+    user_id: int
+
+    columns = (PostRating.id, PostRating.post_id, PostRating.rating, PostRating.user_id)
@@ -1,10 +1,14 @@
 from datetime import datetime
+from typing import List
 
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
-from src.database.models import Tag, Post
+from src.database.db import read_only
+from src.database.models import Tag, Post, post_tag
+from src.repository.post_versions import bump_post_version
 from src.schemas.tags import TagModel
+from src.services import events
 
 
 async def create_tag(db: Session, tag_data: TagModel) -> Tag:
@@ -61,10 +65,35 @@ async def get_post_tags(post: Post, db: Session) -> list:
     return result
 
 
+@read_only
+async def get_tags_for_post(post_id: int, db: Session) -> List[Tag]:
+    """
+    Function to get post tags by post id without loading the post.
+
+    :param post_id: int: id of the post
+    :param db: Session: Connection session to database
+    :return: List[Tag]
+    """
+    return db.query(Tag).join(post_tag, post_tag.c.tag == Tag.id).filter(post_tag.c.post == post_id).all()
+
+
+async def get_tagged_post_ids(db: Session, tag_id: int) -> List[int]:
+    """
+    Function to get ids of the posts that have the tag.
+
+    :param db: Session: Connection session to database
+    :param tag_id: int: id of the tag
+    :return: List[int]
+    """
+    return [row[0] for row in db.query(post_tag.c.post).filter(post_tag.c.tag == tag_id).order_by(post_tag.c.post).all()]
+
+
 async def update_tag(db: Session, tag_id: int, tag_data: TagModel) -> Tag:
     """
     Function to update tag.
 
+    Posts embed the names of their tags, so every post with the tag gets a new version.
+
     :param db: Session: Connection session to database
     :param tag_id: int: id of the tag
     :param tag_data: TagModel: description of the tag
@@ -83,10 +112,15 @@ async def update_tag(db: Session, tag_id: int, tag_data: TagModel) -> Tag:
     if len(tag_data.tag) == 0:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Tag length cannot be 0')
     
+    old_name = tag.tag
     tag.tag = tag_data.tag
     tag.updated_at = datetime.now()
+    post_ids = await get_tagged_post_ids(db, tag_id)
+    await bump_post_version(db, *post_ids)
     db.commit()
     db.refresh(tag)
+    await events.emit(events.TAG_CHANGED, tag=old_name, post_ids=post_ids)
+    await events.emit(events.TAG_CHANGED, tag=tag.tag, post_ids=post_ids)
     return tag
 
 
@@ -94,6 +128,8 @@ async def delete_tag(db: Session, tag_id: int) -> Tag:
     """
     Function to delete tag.
 
+    Every post that had the tag gets a new version, as in update_tag.
+
     :param db: Session: Connection session to database
     :param tag_id: int: id of tag
     :return: Tag
@@ -102,6 +138,9 @@ async def delete_tag(db: Session, tag_id: int) -> Tag:
     if not tag:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found")
 
+    post_ids = await get_tagged_post_ids(db, tag_id)
     db.delete(tag)
+    await bump_post_version(db, *post_ids)
     db.commit()
+    await events.emit(events.TAG_CHANGED, tag=tag.tag, post_ids=post_ids)
     return tag
@@ -1,12 +1,13 @@
 from datetime import datetime
 
-from libgravatar import Gravatar
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
 
+from src.database.db import read_only
 from src.database.models import User, UserRole, Post, Comment, BlacklistToken
 from src.schemas.users import UserModel, UserProfile
+from src.services import events
 
 
 async def get_user_by_email(email: str, db: Session) -> User:
@@ -31,17 +32,9 @@ async def create_user(body: UserModel, db: Session) -> User:
     :param db: Session: Connection to the database
     :return: User object
     """
-    avatar = None
-
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as e:
-        print(e)
-
     check_users_exist = db.query(User).first()
         
-    new_user = User(**body.model_dump(), avatar=avatar)
+    new_user = User(**body.model_dump())
 
     if not check_users_exist:
         new_user.user_role = UserRole.admin
@@ -65,19 +58,36 @@ async def update_token(user: User, token: str | None, db: Session) -> None:
     db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def update_password(user: User, password: str, db: Session) -> None:
     """
-    The confirmed_email function takes in an email and a database session,
-    and sets the confirmed field of the user with that email to True.
+    The update_password function stores a new password hash for the user.
 
-    :param email: str: Email of the user we want to confirm
+    :param user: User: User whose password is changed
+    :param password: str: Hash of the new password
     :param db: Session: Connection to the database
     :return: None
     """
-    user = await get_user_by_email(email, db)
-    user.confirmed = True
+    user.password = password
+    db.commit()
+
+
+async def confirmed_email(email: str, db: Session) -> int | None:
+    """
+    The confirmed_email function sets the confirmed field of the user with that email to True
+    with one conditional update.
+
+    :param email: str: Email of the user we want to confirm
+    :param db: Session: Connection to the database
+    :return: int | None: Id of the confirmed user, None if there is no unconfirmed user with that email
+    """
+    query = update(User).where(User.email == email, User.confirmed.is_not(True)).values(confirmed=True).returning(User.id)
+    user_id = db.execute(query).scalar_one_or_none()
     db.commit()
 
+    if user_id is not None:
+        await events.emit(events.USER_CHANGED, user_id=user_id)
+    return user_id
+
 
 async def update_avatar_url(email: str, url: str | None, db: Session) -> User:
     """
@@ -91,9 +101,11 @@ async def update_avatar_url(email: str, url: str | None, db: Session) -> User:
     user = await get_user_by_email(email, db)
     user.avatar = url
     db.commit()
+    await events.emit(events.USER_CHANGED, user_id=user.id)
     return user
 
 
+@read_only
 async def get_user_by_username(username: str, db: Session) -> User | None:
     """
     Function to get user by username.
@@ -137,6 +149,7 @@ async def change_role(email: str, role: UserRole, db: Session) -> User | None:
     if user:
         user.user_role = role
         db.commit()
+        await events.emit(events.USER_CHANGED, user_id=user.id)
         return user
     return None
 
@@ -153,6 +166,7 @@ async def ban_user(email: str, db: Session) -> User | None:
     if user:
         user.is_active = False
         db.commit()
+        await events.emit(events.USER_CHANGED, user_id=user.id)
         return user
     return None
         
@@ -169,10 +183,12 @@ async def unban_user(email: str, db: Session) -> User | None:
     if user:
         user.is_active = True
         db.commit()
+        await events.emit(events.USER_CHANGED, user_id=user.id)
         return user
     return None
 
 
+@read_only
 async def get_user_profile(user: User, db: Session) -> UserProfile | None:
     """
     Function to get user profile.
@@ -1,20 +1,31 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from uuid import uuid4
+
+from fastapi import APIRouter, HTTPException, Depends, Form, status, Security, Request, Response
+from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
+from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.schemas.users import UserModel, UserResponse, TokenModel, RequestEmail
-from src.services.email import send_email
+from src.services.email import send_email, send_reset_password_email
+from src.services.login_guard import login_guard
+from src.services.mail_templates import TEMPLATE_FOLDER
+from src.services.rate_limits import limit_password_reset
+from src.services.refresh_tokens import REUSED, ROTATED, refresh_tokens
+from src.services.token_epochs import token_epochs
+from src.services.tokens import token_keys, verified_tokens
 
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 security = HTTPBearer()
+templates = Jinja2Templates(directory=TEMPLATE_FOLDER)
 
 
 @router.post('/signup', response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, bt: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, request: Request, db: Session = Depends(get_db)):
 
     """
     The signup function creates a new user in the database.
@@ -22,7 +33,6 @@ async def signup(body: UserModel, bt: BackgroundTasks, request: Request, db: Ses
     The password is hashed using Argon2 and stored as such.
 
     :param body: UserModel: Information to create a user
-    :param bt: BackgroundTasks: Background task to run
     :param request: Request: The base url of the request
     :param db: Session: Connection to the database
     :return: dict: A dictionary with the user and a detail message
@@ -34,24 +44,32 @@ async def signup(body: UserModel, bt: BackgroundTasks, request: Request, db: Ses
     
     body.password = auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
-    bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    await login_guard.forget_unknown(new_user.email)
+    await send_email(new_user.email, new_user.username, str(request.base_url), db)
 
     return {'user': new_user, 'detail': 'User successfully created'}
 
 
 @router.post('/login', response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
 
     """
     The login function is used to authenticate a user.
+    Locked clients and accounts and unknown emails are refused by the login guard
+    before the database is queried or the password is hashed.
 
+    :param request: Request: HTTP request with the client address
     :param body: OAuth2PasswordRequestForm: The username and password 
     :param db: Session: Connection to the database
     :return: dict: A dictionary with the access_token, refresh_token and token type
     """
+    ip = request.client.host if request.client else 'unknown'
+    await login_guard.check(ip, body.username)
+
     user = await repository_users.get_user_by_email(body.username, db)
 
     if user is None:
+        await login_guard.failed(ip, body.username, unknown=True)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid email')
     
     if not user.is_active:
@@ -60,12 +78,15 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Email is not confirmed')
     
-    if not auth_service.verify_password(body.password, user.password):
+    if not await login_guard.verify_password(body.password, user.password):
+        await login_guard.failed(ip, body.username)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid password')
     
-    access_token = await auth_service.create_access_token(data={'sub': user.email})
-    refresh_token = await auth_service.create_refresh_token(data={'sub': user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    await login_guard.succeeded(body.username)
+    family_id = uuid4().hex
+    access_token = await auth_service.create_access_token(data={**await auth_service.user_claims(user), 'fid': family_id})
+    refresh_token = await auth_service.create_refresh_token(data={'sub': user.email, 'fid': family_id})
+    await refresh_tokens.start(family_id, user.email, refresh_token)
     return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
    
 
@@ -75,22 +96,42 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
     """
     The refresh_token function is used to refresh the access token.
     The function takes in a refresh token and returns an access token, a new refresh token, and the type of authorization.
+    The new access token carries the current role of the user; banned users get 403.
 
     :param credentials: HTTPAuthorizationCredentials: HTTP authorization credentials that contain a refresh token
     :param db: Session: Connection to the database
     :return: dict: A new access_token and refresh_token for the user
     """
     token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
+    payload = await auth_service.decode_refresh_token(token)
+    email = payload['sub']
+    family_id = payload.get('fid')
+
     user = await repository_users.get_user_by_email(email, db)
-    
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+    if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid refresh token')
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Access denied: User is banned')
+
+    if family_id is None:
+        # Token issued before token families: accept it once if it is the one stored on the user.
+        if user.refresh_token != token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid refresh token')
+        await repository_users.update_token(user, None, db)
+
+        family_id = uuid4().hex
+        refresh_token = await auth_service.create_refresh_token(data={'sub': email, 'fid': family_id})
+        await refresh_tokens.start(family_id, email, refresh_token)
+    else:
+        refresh_token = await auth_service.create_refresh_token(data={'sub': email, 'fid': family_id})
+        result = await refresh_tokens.rotate(family_id, email, token, refresh_token)
 
-    access_token = await auth_service.create_access_token(data={'sub': email})
-    refresh_token = await auth_service.create_refresh_token(data={'sub': email})
-    await repository_users.update_token(user, refresh_token, db)
+        if result == REUSED:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Refresh token was already used, please log in again')
+        if result != ROTATED:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid refresh token')
+
+    access_token = await auth_service.create_access_token(data={**await auth_service.user_claims(user), 'fid': family_id})
     return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
     
 
@@ -105,26 +146,35 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
     :return: dict: A message if the email is already confirmed or confirms the email
     """
     email = await auth_service.get_email_from_token(token)
-    user = await repository_users.get_user_by_email(email, db)
 
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Verification error')
-    
-    if user.confirmed:
+    # A confirmation link that was already used is answered without touching the database.
+    if not await auth_service.claim_email_token(token):
         return {'message': 'Your email is already confirmed'}
-    
-    await repository_users.confirmed_email(email, db)
-    return {'message': 'Email confirmed'}
+
+    try:
+        user_id = await repository_users.confirmed_email(email, db)
+        exists = user_id is not None or await repository_users.get_user_by_email(email, db) is not None
+    except Exception:
+        await auth_service.release_email_token(token)
+        raise
+
+    # The claim is only kept for a user that exists, otherwise every replay would look confirmed.
+    if not exists:
+        await auth_service.release_email_token(token)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Verification error')
+
+    if user_id is not None:
+        return {'message': 'Email confirmed'}
+    return {'message': 'Your email is already confirmed'}
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: Session = Depends(get_db)):
 
     """
     The request_email function is used to send a confirmation email to the user.
 
     :param body: RequestEmail: Email of the user we want to confirm
-    :param background_tasks: BackgroundTasks: Background task to run
     :param request: Request: The base url of the request
     :param db: Session: Connection to the database
     :return: dict: A message that tells the user to check their email for confirmation
@@ -135,11 +185,75 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
         return {'message': 'Your email is already confirmed'}
     
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, str(request.base_url))
+        await send_email(user.email, user.username, str(request.base_url), db)
 
     return {'message': 'Check your email for confirmation.'}
 
 
+@router.post('/request_reset_password')
+async def request_reset_password(body: RequestEmail, request: Request, db: Session = Depends(get_db)):
+
+    """
+    The request_reset_password function sends a password reset link to the user.
+    The answer is the same whether the email belongs to an account or not.
+    Requests are limited per client IP and per email before anything is looked up.
+
+    :param body: RequestEmail: Email of the user
+    :param request: Request: The base url and the client address of the request
+    :param db: Session: Connection to the database
+    :return: dict: A message that tells the user to check their email
+    """
+    await limit_password_reset(request.client.host if request.client else 'unknown', body.email)
+
+    user = await repository_users.get_user_by_email(body.email, db)
+
+    if user and user.is_active:
+        await send_reset_password_email(user, str(request.base_url), db)
+
+    return {'message': 'If the account exists, a password reset link was sent to its email.'}
+
+
+@router.get('/reset_password/{token}', response_class=HTMLResponse)
+async def reset_password_form(token: str, request: Request, db: Session = Depends(get_db)):
+
+    """
+    The reset_password_form function shows the form the reset link in the email opens.
+
+    :param token: str: Reset token
+    :param request: Request: HTTP request
+    :param db: Session: Connection to the database
+    :return: HTMLResponse: Form that posts the new password to the same address
+    """
+    user = await auth_service.get_user_from_reset_token(token, db)
+    return templates.TemplateResponse(
+        request,
+        'reset_password_form.html',
+        {'username': user.username, 'action': request.url.path},
+    )
+
+
+@router.post('/reset_password/{token}')
+async def reset_password(token: str, password: str = Form(min_length=6, max_length=8), db: Session = Depends(get_db)):
+
+    """
+    The reset_password function sets a new password with a reset token.
+    The token stops working once the password changed, and the sessions of the user are ended.
+
+    :param token: str: Reset token
+    :param password: str: New password
+    :param db: Session: Connection to the database
+    :return: dict: A message that the password was changed
+    """
+    user = await auth_service.get_user_from_reset_token(token, db)
+
+    async with token_epochs.bumped(user.id):
+        await refresh_tokens.revoke_all(user.email)
+        await repository_users.update_password(user, auth_service.get_password_hash(password), db)
+    await login_guard.succeeded(user.email)
+
+    return {'message': 'Password changed, please log in again'}
+
+
 @router.post("/logout")
 async def logout(credentials: HTTPAuthorizationCredentials = Security(security),
                  db: Session = Depends(get_db),
@@ -156,5 +270,22 @@ async def logout(credentials: HTTPAuthorizationCredentials = Security(security),
     token = credentials.credentials
 
     await repository_users.add_to_blacklist(token, db)
+
+    claims = verified_tokens.verify(token)
+    await token_epochs.revoke(token, claims['exp'])
+    family_id = claims.get('fid')
+    if family_id:
+        await refresh_tokens.revoke(family_id, current_user.email)
     return {"message": "User is logout"}
-                     
+
+
+@router.get('/jwks.json')
+async def jwks(response: Response):
+    """
+    Public keys that verify access tokens, in JWKS format.
+
+    :param response: Response: HTTP response
+    :return: dict: Key set
+    """
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return token_keys.jwks()
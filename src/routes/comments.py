@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from src.database.models import UserRole
 from src.repository import comments as comments_repository
 from src.database.db import get_db
 from src.schemas.comments import CommentModel, CommentResponse
 from src.services.auth import auth_service
-from src.repository import posts as posts_repository
+from src.services.comments import comment_service
+from src.services.roles import Permission, can
 
 
 router = APIRouter(prefix="/comments", tags=["comments"])
@@ -22,11 +23,13 @@ async def create_comment_for_post(post_id: int, comment_data: CommentModel, db:
     :param user: User: The currently authenticated user
     :return: Comment
     """
-    post = await posts_repository.get_post(post_id, db)
-    if not post:
+    if not await comment_service.post_exists(post_id, db):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found") 
     
-    comment = await comments_repository.create_comment(db, post_id, comment_data, user)
+    try:
+        comment = await comment_service.create_comment(db, post_id, comment_data, user)
+    except SQLAlchemyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
 
     if not comment:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to create comment")
@@ -79,7 +82,7 @@ async def delete_existing_comment(comment_id: int, db: Session = Depends(get_db)
     :param user: User: The currently authenticated user
     :return: Comment
     """
-    if user.user_role != UserRole.moderator and user.user_role != UserRole.admin:
+    if not can(user, Permission.delete_comments):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to delete this comment")
     
     comment = await comments_repository.delete_comment(db, comment_id)
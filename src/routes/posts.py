@@ -1,29 +1,48 @@
 from typing import List
 
-from fastapi import APIRouter, Request, Depends, HTTPException, UploadFile, File, status, Query
+from fastapi import APIRouter, BackgroundTasks, Request, Response, Depends, HTTPException, UploadFile, File, Form, Header, status, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
 from src.repository import posts as posts_repository
-from src.schemas.posts import PostResponse, PostsByFilter
+from src.schemas.posts import BatchPostResponse, PostResponse, PostsByFilter, UploadResponse
 from src.services.auth import auth_service
 from src.services.posts import post_service
-from src.database.models import UserRole, User
+from src.services.comments import comment_service
+from src.services.duplicates import duplicate_index
+from src.database.models import User
 from src.services.qrcode_creation import generate_qrcode
 from src.repository import comments as comments_repository
 from src.schemas.comments import CommentResponse
 from src.repository import tags as tags_repository
 from src.schemas.tags import TagResponse
 from src.schemas.rating import AverageRatingResponse
+from src.services.pagination import encode_cursor, decode_cursor
+from src.conf.config import settings
+from src.services.cache import cached
+from src.services.post_versions import conditional_post
+from src.services.responses import FastJSONResponse
+from src.services.uploads import upload_store
+from src.services.rate_limits import RateLimit
+from src.services.roles import Permission, can
 
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
-@router.post("/", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
+
+async def count_files(request: Request) -> int:
+    # FastAPI has already parsed the form, request.form() returns it from the request.
+    form = await request.form()
+    return max(1, len(form.getlist("files")))
+
+
+@router.post("/", response_model=PostResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(RateLimit("uploads"))])
 async def add_post(
     request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     description: str = "",
     db: Session = Depends(get_db),
@@ -32,22 +51,162 @@ async def add_post(
     """
     Function to add new post.
 
+    Thumbnails and image metadata are generated in the background after the response.
+    If the user has already posted the same image, that post is returned with
+    status 200 and nothing is uploaded. Files over the size or dimension limits of
+    the user role are rejected with 413, files that are not images with 415.
+
     :param request: Request: HTTP request
+    :param response: Response: HTTP response
+    :param background_tasks: BackgroundTasks: Tasks run after the response is sent
     :param file: UploadFile: Upload image file
     :param description: str: Description of post
     :param db: Session: Connection to the database
     :param user: User: The currently authenticated user
     :return: Post
     """
-    post_info = await post_service.upload_post(file=file)
+    post, created = await post_service.create_post(file, description, user, db, background_tasks)
+
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return post
+
+
+@router.post("/batch", response_model=BatchPostResponse, dependencies=[Depends(RateLimit("uploads", cost=count_files))])
+async def add_posts(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    descriptions: List[str] = Form([]),
+    db: Session = Depends(get_db),
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Function to add several posts at once, e.g. an album.
+
+    Files are uploaded concurrently and all posts are created with one insert.
+    Every file gets its own result: 201 with the new post, 200 with an existing post
+    of the same image, or the error status and detail of that file.
+
+    :param request: Request: HTTP request
+    :param background_tasks: BackgroundTasks: Tasks run after the response is sent
+    :param files: List[UploadFile]: Upload image files
+    :param descriptions: List[str]: Descriptions of the posts in the order of files
+    :param db: Session: Connection to the database
+    :param user: User: The currently authenticated user
+    :return: BatchPostResponse
+    """
+    if len(files) > settings.posts_batch_max_files:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"You cannot add more than {settings.posts_batch_max_files} posts at once")
 
-    return await posts_repository.add_post(
-        post_url=post_info["url"],
-        public_id=post_info["public_id"],
-        description=description,
-        user=user,
-        db=db,
-    )
+    results = await post_service.create_posts(files, descriptions, user, db, background_tasks)
+    return {"posts": results}
+
+
+@router.post("/uploads", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    request: Request,
+    response: Response,
+    length: int = Query(gt=0),
+    description: str = "",
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Function to start a resumable upload of a post image.
+
+    The file is then sent with PATCH /posts/uploads/{upload_id} in chunks of any size
+    and the post is created with POST /posts/uploads/{upload_id}/finish.
+
+    :param request: Request: HTTP request
+    :param response: Response: HTTP response
+    :param length: int: Size of the whole file in bytes
+    :param description: str: Description of post
+    :param user: User: The currently authenticated user
+    :return: UploadResponse
+    """
+    session = await upload_store.create(length, description, user)
+    response.headers["Location"] = f"{request.url.path}/{session.id}"
+    response.headers["Upload-Offset"] = "0"
+    return session
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadResponse)
+async def get_upload(
+    upload_id: str,
+    response: Response,
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Function to get how many bytes of the upload were received, to resume it after a dropped connection.
+
+    :param upload_id: str: Upload id
+    :param response: Response: HTTP response
+    :param user: User: The currently authenticated user
+    :return: UploadResponse
+    """
+    session = await upload_store.get(upload_id, user)
+    response.headers["Upload-Offset"] = str(session.offset)
+    return session
+
+
+@router.patch("/uploads/{upload_id}", response_model=UploadResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(ge=0),
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Function to send a chunk of the upload.
+
+    The request body is the chunk and the Upload-Offset header its position in the file.
+    Resending a chunk that was already received is harmless; a chunk past the
+    received part is refused with 409 and the expected Upload-Offset.
+
+    :param upload_id: str: Upload id
+    :param request: Request: HTTP request
+    :param response: Response: HTTP response
+    :param upload_offset: int: Position of the chunk in the file
+    :param user: User: The currently authenticated user
+    :return: UploadResponse
+    """
+    session = await upload_store.append(upload_id, upload_offset, request.stream(), user)
+    response.headers["Upload-Offset"] = str(session.offset)
+    return session
+
+
+@router.post(
+    "/uploads/{upload_id}/finish",
+    response_model=PostResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(RateLimit("uploads"))],
+)
+async def finish_upload(
+    upload_id: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Function to create a post from a fully received upload.
+
+    :param upload_id: str: Upload id
+    :param response: Response: HTTP response
+    :param background_tasks: BackgroundTasks: Tasks run after the response is sent
+    :param db: Session: Connection to the database
+    :param user: User: The currently authenticated user
+    :return: Post
+    """
+    async with upload_store.complete(upload_id, user) as (session, path):
+        with open(path, "rb") as f:
+            file = UploadFile(f, size=session.length, filename=session.id)
+            post, created = await post_service.create_post(file, session.description, user, db, background_tasks)
+
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return post
 
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -66,15 +225,17 @@ async def delete_post(
     :param user: User: The currently authenticated user
     :return: Post
     """
-    post = await posts_repository.get_post(post_id, db)
+    owner = await posts_repository.get_post_owner(post_id, db)
 
-    if not post:
+    if not owner:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
     
-    if post.user_id != user.id and user.user_role != UserRole.admin:
+    if owner.user_id != user.id and not can(user, Permission.edit_any_post):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to delete this post")
     
     await posts_repository.delete_post(post_id=post_id, db=db)
+    comment_service.forget_post(post_id)
+    duplicate_index.remove(post_id)
 
 
 @router.patch("/{post_id}", response_model=PostResponse)
@@ -95,12 +256,12 @@ async def edit_description(
     :param user: User: The currently authenticated user
     :return: Post
     """
-    post = await posts_repository.get_post(post_id, db)
+    owner = await posts_repository.get_post_owner(post_id, db)
     
-    if not post:
+    if not owner:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
     
-    if post.user_id != user.id and user.user_role != UserRole.admin:
+    if owner.user_id != user.id and not can(user, Permission.edit_any_post):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to edit this post")
     
     edited_post = await posts_repository.edit_description(post_id=post_id, description=description, db=db)
@@ -108,6 +269,8 @@ async def edit_description(
 
 
 @router.get("/{post_id}", response_model=PostResponse)
+@conditional_post
+@cached(PostResponse, "post:{post_id}", "posts")
 async def get_post(
     request: Request,
     post_id: int,
@@ -149,7 +312,7 @@ async def get_post_qrcode(post_id: int, db: Session = Depends(get_db), user: Use
     return StreamingResponse(qr_code_buffer, media_type="image/png")
 
 
-@router.get("/", response_model=PostsByFilter) 
+@router.get("/", response_model=PostsByFilter, dependencies=[Depends(RateLimit("search"))])
 async def search_posts(
     current_user: User = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db),
@@ -171,30 +334,62 @@ async def search_posts(
     :return: PostsByFilter
     """
     try:
-        all_posts = await posts_repository.get_all_posts(current_user, db, keyword, tag, min_rating, max_rating)
-        return all_posts
+        all_posts = await posts_repository.search_posts_rows(db, keyword, tag, min_rating, max_rating)
+        return FastJSONResponse(all_posts)
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=str(e))    
 
 
 @router.get("/{post_id}/comments", response_model=List[CommentResponse])
-async def read_comment_for_post(post_id: int, db: Session = Depends(get_db), user=Depends(auth_service.get_current_user)):
+@cached(List[CommentResponse], "post:{post_id}:comments", headers=["X-Next-Cursor"])
+async def read_comment_for_post(
+    post_id: int,
+    response: Response,
+    cursor: str = Query(default=None),
+    limit: int = Query(default=settings.comments_page_size, ge=1, le=500),
+    stream: bool = Query(default=False),
+    db: Session = Depends(get_db),
+    user=Depends(auth_service.get_current_user),
+):
     """
-    Function to read comment to post.
+    Function to read comments to post.
+
+    Comments are returned page by page, the cursor of the next page is sent in
+    the X-Next-Cursor header. With stream=true the whole thread is sent as NDJSON.
 
     :param post_id: int: Post id
+    :param response: Response: HTTP response
+    :param cursor: str, optional: Cursor from the X-Next-Cursor header of the previous page
+    :param limit: int: Maximum number of comments in the page
+    :param stream: bool: Stream all comments as NDJSON
     :param db: Session: Connection to the database
     :param user: User: The currently authenticated user
-    :return: Comment
+    :return: List[CommentResponse] | StreamingResponse
     """
-    comments = await comments_repository.get_comments_for_post(post_id, db)
+    if stream:
+        # The stream starts with status 200, so a missing post is reported before it.
+        if not await comment_service.post_exists(post_id, db):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+
+        async def comments_ndjson():
+            async for comment in comments_repository.iter_comments_for_post(post_id, db, page_size=limit):
+                yield CommentResponse.model_validate(comment).model_dump_json() + "\n"
+
+        return StreamingResponse(comments_ndjson(), media_type="application/x-ndjson")
+
+    after = decode_cursor(cursor) if cursor else None
+    comments = await comments_repository.get_comments_for_post(post_id, db, limit=limit, after=after)
 
-    if not comments:
+    if not comments and after is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comments not found")
+
+    if len(comments) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(comments[-1].created_at, comments[-1].id)
     return comments
 
 
 @router.get("/{post_id}/tags", response_model=List[TagResponse])
+@cached(List[TagResponse], "post:{post_id}", "posts")
 async def read_tags(post_id: int, db: Session = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
     Function to get tags for a specific post.
@@ -204,15 +399,16 @@ async def read_tags(post_id: int, db: Session = Depends(get_db), user: User = De
     :param user: User: The currently authenticated user
     :return: List[TagResponse]
     """
-    post = await posts_repository.get_post(post_id, db)
-    if not post:
+    if not await posts_repository.post_exists(post_id, db):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
     
-    tags = await tags_repository.get_post_tags(post, db)
+    tags = await tags_repository.get_tags_for_post(post_id, db)
     return tags
 
 
 @router.get('/{post_id}/rating', response_model=AverageRatingResponse)
+@conditional_post
+@cached(AverageRatingResponse, "post:{post_id}")
 async def get_post_rating(
     post_id: int,
     db: Session = Depends(get_db),
@@ -227,7 +423,7 @@ async def get_post_rating(
     :return: AverageRatingResponse
     """
     
-    post = await posts_repository.get_post(post_id, db)
-    if not post:
+    rating = await posts_repository.get_post_average_rating(post_id, db)
+    if not rating:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Post not found')
-    return post
+    return rating
@@ -7,7 +7,8 @@ from src.database.db import get_db
 from src.schemas.rating import RatingResponse
 from src.services.auth import auth_service
 from src.repository import rating as repository_rating
-from src.database.models import User, UserRole
+from src.database.models import User
+from src.services.roles import Permission, can
 
 
 router = APIRouter(prefix="/rating", tags=['rating'])
@@ -51,7 +52,7 @@ async def delete_rating(
     :param current_user: User: The currently authenticated user
     :return: RatingResponse
     """
-    if current_user.user_role != UserRole.moderator and current_user.user_role != UserRole.admin:
+    if not can(current_user, Permission.delete_ratings):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to delete rating")
     
     await repository_rating.delete_rating(post_id, user_id, db)
@@ -71,7 +72,7 @@ async def get_user_ratings(
     :param current_user: User: The currently authenticated user
     :return: List[RatingResponse]
     """
-    if user_id != current_user.id and current_user.user_role != UserRole.admin and current_user.user_role != UserRole.moderator:
+    if user_id != current_user.id and not can(current_user, Permission.view_ratings):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to view user ratings")
 
     result = await repository_rating.get_user_ratings(user_id, db)
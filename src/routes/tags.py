@@ -6,7 +6,9 @@ from src.repository import posts as posts_repository
 from src.database.db import get_db
 from src.schemas.tags import TagModel, TagResponse
 from src.services.auth import auth_service
-from src.database.models import User, UserRole
+from src.database.models import User
+from src.services.roles import Permission, can
+from src.services.cache import cached
 
 router = APIRouter(prefix='/tags', tags=["tags"])
 
@@ -29,6 +31,7 @@ async def create_new_tag(post_id: int, tag: TagModel, db: Session = Depends(get_
 
 
 @router.get("/{tag_name}", response_model=TagResponse)
+@cached(TagResponse, "tag:{tag_name}")
 async def read_tag(tag_name: str, db: Session = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
     Function to read tag.
@@ -55,7 +58,7 @@ async def update_existing_tag(tag_id: int, tag_data: TagModel, db: Session = Dep
     :param user: User: The currently authenticated user
     :return: Tag object
     """
-    if user.user_role != UserRole.admin and user.user_role != UserRole.moderator:
+    if not can(user, Permission.edit_tags):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to change tags")
 
     tag = await tags_repository.update_tag(db, tag_id, tag_data)
@@ -72,7 +75,7 @@ async def delete_existing_tag(tag_id: int, db: Session = Depends(get_db), user:
     :param user: User: The currently authenticated user
     :return: Tag object
     """
-    if user.user_role != UserRole.admin and user.user_role != UserRole.moderator:
+    if not can(user, Permission.edit_tags):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to delete tags")
 
     await tags_repository.delete_tag(db, tag_id)
@@ -8,10 +8,11 @@ from src.database.db import get_db
 from src.services.posts import post_service
 from src.services.auth import auth_service
 from src.services.qrcode_creation import generate_qrcode
+from src.services.rate_limits import RateLimit
 from src.database.models import User
 
 
-router = APIRouter(prefix="/transformations", tags=["transformations"])
+router = APIRouter(prefix="/transformations", tags=["transformations"], dependencies=[Depends(RateLimit("transformations"))])
 
 @router.post("/resize/{post_id}", status_code=status.HTTP_201_CREATED)
 async def resize(
@@ -1,23 +1,24 @@
-import pickle
-
 import cloudinary
-import cloudinary.uploader
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Request
 from sqlalchemy.orm import Session
 
 from src.database.models import User, UserRole
 from src.services.auth import auth_service
-from src.services.roles import RoleAccess
+from src.services.roles import Permission, PermissionAccess, Principal, get_principal
 from src.schemas.users import UserDb, UserResponse, Action, UserProfile
 from src.database.db import get_db
 from src.conf.config import settings
 from src.repository import users as repositories_users
 from src.repository import posts as posts_repository
 from src.schemas.posts import PostResponse
+from src.services.avatars import avatar_service
+from src.services.cache import cached
+from src.services.refresh_tokens import refresh_tokens
+from src.services.token_epochs import token_epochs
 
 router = APIRouter(prefix='/users', tags=['users'])
 
-access_to_routes = RoleAccess([UserRole.admin, UserRole.moderator])
+access_to_routes = PermissionAccess(Permission.manage_users)
 
 cloudinary.config(
         cloud_name=settings.cloudinary_name,
@@ -28,16 +29,22 @@ cloudinary.config(
 
 
 @router.get('/me', response_model=UserDb)
-async def get_current_user(user: User = Depends(auth_service.get_current_user)):
+async def get_current_user(user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
     """
     The get_current_user function is a dependency that will be injected into the
         get_current_user endpoint. It uses the auth_service to retrieve the current user,
         and returns it if found.
+        The user of an access token only has the fields of its claims, so the profile
+        is read from the database.
 
     :param user: User: Current user
+    :param db: Session: The database session
     :return: The user object
     """
-    return user
+    profile = await repositories_users.get_user_by_email(user.email, db)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found')
+    return profile
 
 
 @router.patch('/me', response_model=UserDb)
@@ -50,15 +57,8 @@ async def update_avatar_user(file: UploadFile = File(...), user: User = Depends(
     :param db: Session: Connection to the database
     :return: User: The updated user
     """
-    public_id = f'FastApiApp/{user.email}'
-    res = cloudinary.uploader.upload(file.file, public_id=public_id, overwrite=True)
-    res_url = cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop='fill', version=res.get('version'))
-
-    user =  await repositories_users.update_avatar_url(user.email, res_url, db)
-
-    auth_service.cache.set(user.email, pickle.dumps(user))
-    auth_service.cache.expire(user.email, 300)
-    
+    avatar_url = await avatar_service.upload(file, user)
+    user = await repositories_users.update_avatar_url(user.email, avatar_url, db)
     return user
 
 
@@ -81,6 +81,7 @@ async def get_user_profile(username: str, db: Session = Depends(get_db)) -> User
     
 
 @router.get('/{user_id}', response_model=UserProfile)
+@cached(UserProfile, 'user:{user_id}')
 async def get_user_by_id(user_id: int, db: Session = Depends(get_db), user: User = Depends(auth_service.get_current_user)) -> User:
     """
     Function to get user profile.
@@ -99,14 +100,14 @@ async def get_user_by_id(user_id: int, db: Session = Depends(get_db), user: User
 
 
 @router.patch('/{user_id}', dependencies=[Depends(access_to_routes)], response_model=UserResponse)
-async def manage_user(user_id: int, action: Action, role: UserRole = UserRole.user, user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+async def manage_user(user_id: int, action: Action, role: UserRole = UserRole.user, principal: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     """
     Function to manage a user's role or ban status.
 
     :param user_id: int: id of the user to manage
     :param action: Action: The action to perform. This can be 'change_user_role', 'ban', or 'unban'
     :param role: UserRole, optional: The new role to assign to the user
-    :param user: User: The currently authenticated user
+    :param principal: Principal: The currently authenticated user and its permissions
     :param db: Session: The database session
     :return: UserResponse
 
@@ -118,23 +119,27 @@ async def manage_user(user_id: int, action: Action, role: UserRole = UserRole.us
 
     if action == Action.change_user_role:
 
-        if user.user_role == UserRole.admin:
+        if principal.can(Permission.change_roles):
 
             if role is None:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='You must specify a new role')
 
-            changed_user = await repositories_users.change_role(user_to_change.email, role, db)
+            async with token_epochs.bumped(user_to_change.id):
+                changed_user = await repositories_users.change_role(user_to_change.email, role, db)
             return {'user': changed_user, 'detail': f'User has been changed to {role}'}
         else:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You do not have permission')
 
     elif action == Action.ban:
 
-        if user.user_role == UserRole.admin or user.user_role == UserRole.moderator:
+        if principal.can(Permission.ban_users):
 
             if user_to_change.is_active:
 
-                changed_user = await repositories_users.ban_user(user_to_change.email, db)
+                # Sessions are revoked before the ban is committed, so a Redis failure leaves nothing half done.
+                async with token_epochs.bumped(user_to_change.id):
+                    await refresh_tokens.revoke_all(user_to_change.email)
+                    changed_user = await repositories_users.ban_user(user_to_change.email, db)
                 return {'user': changed_user, 'detail': 'User has been banned'}
             else: 
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='The user is already banned')
@@ -143,7 +148,7 @@ async def manage_user(user_id: int, action: Action, role: UserRole = UserRole.us
         
     elif action == Action.unban:
 
-        if user.user_role == UserRole.admin:
+        if principal.can(Permission.unban_users):
 
             if not user_to_change.is_active:
 
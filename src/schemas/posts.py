@@ -11,6 +11,21 @@ class PostModel(BaseModel):
     tags_text: Optional[str] = Field(None, max_length=25)
 
 
+class Thumbnail(BaseModel):
+    width: int
+    format: str
+    url: str
+
+
+class PostImageResponse(BaseModel):
+    width: int
+    height: int
+    thumbnails: List[Thumbnail] = []
+
+    class Config:
+        from_attributes = True
+
+
 class PostResponse(BaseModel):
 
     id: int
@@ -21,18 +36,39 @@ class PostResponse(BaseModel):
     description: str
     average_rating: float
     tags: List[Tag] = []
+    image: Optional[PostImageResponse] = None
 
     class Config:
         from_attributes = True
 
 
+class BatchPostResult(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    status_code: int
+    post: Optional[PostResponse] = None
+    detail: Optional[str] = None
+
+
+class BatchPostResponse(BaseModel):
+    posts: List[BatchPostResult]
+
+
+class UploadResponse(BaseModel):
+    id: str
+    offset: int
+    length: int
+
+
 class PostProfile(BaseModel):
     id: int
     url: str
     description: str | None
     average_rating: float | None
     tags: list[str] | None
+    comments_count: int = 0
     comments: list[CommentByUser] | None
+    image: PostImageResponse | None = None
 
 
 class PostsByFilter(BaseModel):
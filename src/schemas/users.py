@@ -1,9 +1,10 @@
 from datetime import datetime
 import enum
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, model_validator
 
 from src.database.models import UserRole
+from src.services.avatars import gravatar_url
 
 
 class UserModel(BaseModel):
@@ -18,12 +19,19 @@ class UserDb(BaseModel):
     email: EmailStr
     created_at: datetime
     updated_at: datetime
-    avatar: str
+    avatar: str | None = None
     user_role: UserRole
 
     class Config:
         from_attributes = True
 
+    @model_validator(mode='after')
+    def default_avatar(self):
+        # Users without an uploaded avatar get their Gravatar, built when the user is serialized.
+        if not self.avatar:
+            self.avatar = gravatar_url(self.email)
+        return self
+
 
 class UserResponse(BaseModel):
     user: UserDb
@@ -46,7 +54,7 @@ class UserProfile(BaseModel):
     username: str
     email: EmailStr
     confirmed: bool
-    avatar: str
+    avatar: str | None = None
     user_role: UserRole
     is_active: bool
     posts_number: int 
@@ -54,6 +62,12 @@ class UserProfile(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+    @model_validator(mode='after')
+    def default_avatar(self):
+        if not self.avatar:
+            self.avatar = gravatar_url(self.email)
+        return self
+
 
 class Action(enum.Enum):
     change_user_role: str = 'change_user_role'
@@ -1,26 +1,35 @@
 from datetime import datetime, timedelta
-import pickle
+import hashlib
+import logging
+from uuid import uuid4
 from typing import Optional
 
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError
 from passlib.context import CryptContext
 import redis
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
+from src.database.models import User, UserRole
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services.token_epochs import token_epochs
+from src.services.tokens import token_keys, verified_tokens
+
+
+logger = logging.getLogger(__name__)
 
 
 class Auth:
 
     pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-    SECRET_KEY = settings.secret_key_jwt
-    ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/auth/login')
     cache = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    async_cache = aioredis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -63,9 +72,30 @@ class Auth:
             expire = datetime.utcnow() + timedelta(minutes=15)
 
         to_encode.update({'iat': datetime.utcnow(), 'exp': expire, 'scope': 'access_token'})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_access_token = token_keys.sign(to_encode)
         return encoded_access_token
 
+    async def user_claims(self, user: User) -> dict:
+        """
+        The user_claims function returns the claims that describe the user in an access token.
+        Tokens with the epoch claim are checked against the epoch of the user in Redis
+        instead of the database; without Redis the claim is left out.
+
+        :param self: The instance of the class
+        :param user: User: The user the token is issued to
+        :return: dict: sub, uid, role, active and epoch claims
+        """
+        claims = {
+            'sub': user.email,
+            'uid': user.id,
+            'role': (user.user_role or UserRole.user).value,
+            'active': bool(user.is_active),
+        }
+        epoch = await token_epochs.current(user.id)
+        if epoch is not None:
+            claims['epoch'] = epoch
+        return claims
+
     async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
         """
         The create_refresh_token function creates a refresh token for the user.
@@ -80,44 +110,55 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=settings.refresh_token_ttl)
 
-        to_encode.update({'iat': datetime.utcnow(), 'exp': expire, 'scope': 'refresh_token'})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        # jti makes every refresh token unique, even two issued in the same second.
+        to_encode.update({'iat': datetime.utcnow(), 'exp': expire, 'scope': 'refresh_token', 'jti': uuid4().hex})
+        encoded_refresh_token = token_keys.sign(to_encode)
         return encoded_refresh_token
 
     async def decode_refresh_token(self, refresh_token: str):
         """
         The decode_refresh_token function is used to decode the refresh token.
-            It takes in a refresh_token as an argument and returns the email of the user if successful.
+            It takes in a refresh_token as an argument and returns its claims if successful.
             If it fails, it raises an HTTPException with status code 401 (Unauthorized) and detail message 'Could not validate credentials'.
 
         :param self: The instance of the class
         :param refresh_token: str: Refresh token 
-        :return: The email address of the user
+        :return: dict: Claims with the email of the user in sub and the token family in fid
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = token_keys.verify(refresh_token)
 
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the
             protected endpoints. It takes a token as an argument and returns the user
             object if it exists, otherwise it raises an exception.
+            The user and the token claims are kept in request.state, so the token is
+            resolved once per request however many dependencies ask for the user.
+            Tokens with uid, role, active and epoch claims are checked with one Redis
+            round trip for the epoch of the user and the revoked mark of the token;
+            the user is built from the claims without a database query. Older tokens,
+            or any token while Redis is unavailable, are checked in the database.
 
         :param self: The instance of the class
+        :param request: Request: HTTP request
         :param token: str: Token from the request header
         :param db: Connection to the database
         :return: The user object
         """
+        user = getattr(request.state, 'user', None)
+        if user is not None:
+            return user
+
         credentials_exception = HTTPException(  
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Could not validate credentials',
@@ -125,7 +166,7 @@ class Auth:
         )
 
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = verified_tokens.verify(token)
 
             if payload['scope'] == 'access_token':
                 email = payload['sub']
@@ -134,49 +175,72 @@ class Auth:
             else:
                 raise credentials_exception            
                 
-            token_blacklisted = await repository_users.is_blacklisted_token(token, db)
-            if token_blacklisted:
-                raise credentials_exception
-            user = await repository_users.get_user_by_email(email, db)
+            user = await self.user_from_claims(payload, token)
             if user is None:
-                raise credentials_exception
+                token_blacklisted = await repository_users.is_blacklisted_token(token, db)
+                if token_blacklisted:
+                    raise credentials_exception
+                user = await repository_users.get_user_by_email(email, db)
+                if user is None:
+                    raise credentials_exception
+
+            if not user.is_active:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Access denied: User is banned')
+            request.state.claims = payload
+            request.state.user = user
             return user
                         
         except JWTError:
             raise credentials_exception
 
-        user_hash = str(email)
-        user = self.cache.get(user_hash)
-
-        if user is None:
-            
-            user = await repository_users.get_user_by_email(email, db)
+    async def user_from_claims(self, payload: dict, token: str) -> Optional[User]:
+        """
+        The user_from_claims function builds the user from the claims of an access token
+        if the epoch of the token is still the epoch of the user.
+        The user is not loaded from the database and only has id, email, user_role and is_active.
 
-            if user is None:
-                raise credentials_exception
-            
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, 300)
-        else:
-            user = pickle.loads(user)
-            
-        return user
+        :param self: The instance of the class
+        :param payload: dict: Verified claims of the access token
+        :param token: str: Access token
+        :return: The user, None if the token has no epoch or Redis is unavailable
+        """
+        if 'epoch' not in payload or 'uid' not in payload:
+            return None
+
+        state = await token_epochs.check(payload['uid'], token)
+        if state is None:
+            return None
+
+        epoch, revoked = state
+        if revoked or epoch != payload['epoch']:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Could not validate credentials',
+                headers={'WWW-Authenticate': 'Bearer'},
+            )
+
+        return User(
+            id=payload['uid'],
+            email=payload['sub'],
+            user_role=UserRole(payload['role']),
+            is_active=payload['active'],
+        )
 
     def create_email_token(self, data: dict):
 
         """
         The create_email_token function takes in a dictionary of data and returns an encoded token.
-        The function first creates a copy of the data dictionary, then adds two keys to it: iat (issued at) and exp (expiration).
-        It then encodes the new dictionary using jwt.encode().
+        The function first creates a copy of the data dictionary, then adds iat (issued at), exp (expiration)
+        and the email_verification scope. It then signs the new dictionary with the active key of token_keys.
 
         :param self: The instance of the class
         :param data: dict: Data that will be encoded
         :return: A token that is encoded with the data passed in and a secret key
         """
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(days=7)
-        to_encode.update({'iat': datetime.utcnow(), 'exp': expire})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        expire = datetime.utcnow() + timedelta(seconds=settings.email_token_ttl)
+        to_encode.update({'iat': datetime.utcnow(), 'exp': expire, 'scope': 'email_verification'})
+        token = token_keys.sign(to_encode)
         return token
 
     async def get_email_from_token(self, token: str):
@@ -184,20 +248,107 @@ class Auth:
         """
         The get_email_from_token function takes a token as an argument and returns the email address associated with that token.
         The function uses the jwt library to decode the token, which is then used to return the email address.
+        Access, refresh and reset tokens are signed with the same keys, so only the email_verification scope is accepted.
 
         :param self: The instance of the class
         :param token: str: Token that is sent to the user's email
         :return: The email address of the user that is associated with the token
         """
+        invalid = HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='Invalid token for email verification')
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            email = payload['sub']
-            return email
-        
+            payload = token_keys.verify(token)
         except JWTError as e:
-            print(e)
-            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                                detail='Invalid token for email verification')
+            logger.info('Invalid email verification token: %s', e)
+            raise invalid
+
+        if payload.get('scope') != 'email_verification':
+            raise invalid
+        return payload['sub']
+
+    def password_fingerprint(self, user: User) -> str:
+        """
+        The password_fingerprint function returns a short digest of the password hash of the user.
+        Reset tokens carry it, so changing the password voids every reset link issued before.
+
+        :param self: The instance of the class
+        :param user: User: User
+        :return: str: Digest of the password hash
+        """
+        return hashlib.sha256((user.password or '').encode()).hexdigest()[:16]
+
+    def create_reset_token(self, user: User) -> str:
+        """
+        The create_reset_token function creates a token for the password reset link of the user.
+        It expires after reset_token_ttl seconds and can only be used once, because it is bound to the current password.
+
+        :param self: The instance of the class
+        :param user: User: User who asked for the reset
+        :return: str: Reset token
+        """
+        now = datetime.utcnow()
+        return token_keys.sign({
+            'sub': user.email,
+            'scope': 'reset_password',
+            'pwd': self.password_fingerprint(user),
+            'iat': now,
+            'exp': now + timedelta(seconds=settings.reset_token_ttl),
+        })
+
+    async def get_user_from_reset_token(self, token: str, db: Session) -> User:
+        """
+        The get_user_from_reset_token function returns the user a password reset token was issued to.
+        Expired tokens, tokens of another kind and tokens issued before the password last changed are refused.
+
+        :param self: The instance of the class
+        :param token: str: Token from the reset link
+        :param db: Session: Connection to the database
+        :return: User
+        """
+        invalid = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid or expired reset link')
+        try:
+            payload = token_keys.verify(token)
+        except JWTError:
+            raise invalid
+
+        if payload.get('scope') != 'reset_password':
+            raise invalid
+
+        user = await repository_users.get_user_by_email(payload['sub'], db)
+        if user is None or not user.is_active or payload.get('pwd') != self.password_fingerprint(user):
+            raise invalid
+        return user
+
+    def _email_token_key(self, token: str) -> str:
+        return 'email_token:' + hashlib.sha256(token.encode()).hexdigest()
+
+    async def claim_email_token(self, token: str) -> bool:
+        """
+        The claim_email_token function marks an email token as used.
+        It is called after the token signature was verified, so only genuine tokens are stored.
+        The mark expires together with the token.
+
+        :param self: The instance of the class
+        :param token: str: Token that is sent to the user's email
+        :return: bool: False if the token was already used, True if it is used now or Redis is unavailable
+        """
+        try:
+            claimed = await self.async_cache.set(self._email_token_key(token), 1, nx=True, ex=settings.email_token_ttl)
+        except RedisError:
+            return True
+        return bool(claimed)
+
+    async def release_email_token(self, token: str) -> None:
+        """
+        The release_email_token function lets an email token be used again, e.g. when confirming failed.
+
+        :param self: The instance of the class
+        :param token: str: Token that is sent to the user's email
+        :return: None
+        """
+        try:
+            await self.async_cache.delete(self._email_token_key(token))
+        except RedisError:
+            pass
 
 
 auth_service = Auth()
@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+from io import BytesIO
+
+import cloudinary
+import cloudinary.uploader
+from fastapi import UploadFile
+from PIL import Image, ImageOps
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.upload_guard import upload_guard
+
+
+GRAVATAR_URL = 'https://www.gravatar.com/avatar/{hash}'
+
+
+def gravatar_url(email: str) -> str:
+    """
+    Build the Gravatar URL of the email locally.
+
+    Gravatar addresses images by the md5 of the trimmed, lowercased email, so no
+    request to Gravatar is needed; the browser fetches the image when it is shown.
+
+    :param email: str: Email of the user
+    :return: str: Gravatar image URL
+    """
+    return GRAVATAR_URL.format(hash=hashlib.md5(email.strip().lower().encode()).hexdigest())
+
+
+def render_avatar(data: bytes, size: int, image_format: str) -> bytes:
+    """
+    Crop the image to a centered square and scale it to size x size.
+
+    :param data: bytes: Uploaded image
+    :param size: int: Side of the avatar in pixels
+    :param image_format: str: Pillow format of the result
+    :return: bytes: Encoded avatar
+    """
+    with Image.open(BytesIO(data)) as image:
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        avatar = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+
+    output = BytesIO()
+    avatar.save(output, format=image_format, quality=settings.avatar_quality)
+    return output.getvalue()
+
+
+class AvatarService:
+    """
+    Avatar pipeline: the upload is checked by the upload guard, cropped and scaled
+    to avatar_size locally in a worker thread and only the small result is sent
+    to Cloudinary. The URL carries the Cloudinary version, so every new avatar
+    gets a new URL and browsers and CDNs never serve the previous one.
+    """
+
+    def __init__(self, size: int = settings.avatar_size, image_format: str = settings.avatar_format):
+        self.size = size
+        self.image_format = image_format
+
+    def public_id(self, user: User) -> str:
+        return f'FastApiApp/{user.email}'
+
+    async def upload(self, file: UploadFile, user: User) -> str:
+        """
+        Resize the image and upload it as the avatar of the user.
+
+        :param file: UploadFile: Uploaded image
+        :param user: User: Owner of the avatar
+        :return: str: Versioned avatar URL
+        """
+        data = await upload_guard.check(file, user)
+        avatar = await asyncio.to_thread(render_avatar, data, self.size, self.image_format)
+
+        public_id = self.public_id(user)
+        result = await asyncio.to_thread(cloudinary.uploader.upload, avatar, public_id=public_id, overwrite=True, invalidate=True)
+        return cloudinary.CloudinaryImage(public_id).build_url(version=result.get('version'), format=result.get('format'))
+
+
+avatar_service = AvatarService()
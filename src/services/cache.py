@@ -0,0 +1,282 @@
+from collections import Counter, OrderedDict
+from functools import wraps
+import hashlib
+import inspect
+import json
+import time
+from typing import Any, Callable, Iterable
+
+from fastapi import Request, Response, status
+from pydantic import TypeAdapter
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.db import primary
+from src.services import events
+
+
+lookups: Counter = Counter()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of serialized values, such as JSON response bodies.
+
+    Entries live in a small in-process LRU (L1) with a short TTL and in Redis (L2).
+    Every entry is registered under one or more tags such as 'post:1'; invalidating
+    a tag drops all of its entries in both tiers. Other workers' L1 entries expire
+    after cache_l1_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        key_prefix: str = 'response_cache',
+        ttl: int = settings.cache_ttl,
+        l1_ttl: int = settings.cache_l1_ttl,
+        l1_size: int = settings.cache_l1_size,
+    ):
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.l1_ttl = l1_ttl
+        self.l1_size = l1_size
+        self.l1: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self.l1_tags: dict[str, set[str]] = {}
+        self.redis = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+        self.redis_retry_at = 0.0
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self.redis_retry_at
+
+    def _redis_failed(self) -> None:
+        # Skip Redis for a while instead of paying a connection timeout on every request.
+        self.redis_retry_at = time.monotonic() + 5
+
+    def _tag_key(self, tag: str) -> str:
+        return f'{self.key_prefix}:tag:{tag}'
+
+    async def get(self, key: str) -> bytes | None:
+        """
+        Get cached value from L1, then from Redis.
+
+        :param key: str: Cache key
+        :return: bytes | None
+        """
+        entry = self.l1.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self.l1.move_to_end(key)
+                lookups['l1_hit'] += 1
+                return value
+            del self.l1[key]
+
+        if not self._redis_available():
+            lookups['miss'] += 1
+            return None
+
+        try:
+            value = await self.redis.get(f'{self.key_prefix}:{key}')
+        except RedisError:
+            self._redis_failed()
+            lookups['miss'] += 1
+            return None
+
+        if value is not None:
+            self._set_l1(key, value)
+            lookups['l2_hit'] += 1
+        else:
+            lookups['miss'] += 1
+        return value
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str]) -> None:
+        """
+        Store value in both tiers under the given tags.
+
+        :param key: str: Cache key
+        :param value: bytes: Serialized value
+        :param tags: Iterable[str]: Invalidation tags
+        :return: None
+        """
+        tags = list(tags)
+        self._set_l1(key, value)
+
+        for tag in tags:
+            self.l1_tags.setdefault(tag, set()).add(key)
+
+        if not self._redis_available():
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(f'{self.key_prefix}:{key}', value, ex=self.ttl)
+                for tag in tags:
+                    pipe.sadd(self._tag_key(tag), key)
+                    pipe.expire(self._tag_key(tag), self.ttl)
+                await pipe.execute()
+        except RedisError:
+            self._redis_failed()
+
+    async def invalidate(self, *tags: str) -> None:
+        """
+        Drop all entries registered under any of the tags.
+
+        :param tags: str: Invalidation tags
+        :return: None
+        """
+        for tag in tags:
+            for key in self.l1_tags.pop(tag, ()):
+                self.l1.pop(key, None)
+
+        if not self._redis_available():
+            return
+
+        try:
+            for tag in tags:
+                keys = await self.redis.smembers(self._tag_key(tag))
+                names = [f'{self.key_prefix}:{key.decode()}' for key in keys]
+                await self.redis.delete(self._tag_key(tag), *names)
+        except RedisError:
+            self._redis_failed()
+
+    def _set_l1(self, key: str, value: bytes) -> None:
+        self.l1[key] = (time.monotonic() + self.l1_ttl, value)
+        self.l1.move_to_end(key)
+
+        while len(self.l1) > self.l1_size:
+            self.l1.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+def make_etag(body: bytes) -> str:
+    """
+    Function to build a strong ETag for the response body.
+
+    :param body: bytes: Response body
+    :return: str: Quoted ETag
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Function to check If-None-Match request header against the ETag.
+
+    :param request: Request: HTTP request
+    :param etag: str: Current ETag of the resource
+    :return: bool
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [value.strip() for value in if_none_match.split(',')]
+
+
+def with_request_response(func: Callable) -> tuple[inspect.Signature, list[str]]:
+    """
+    Function to add request and response parameters to the endpoint signature.
+
+    FastAPI fills parameters from the signature, so a decorator that needs the
+    request can ask for it without changing the endpoint itself.
+
+    :param func: Callable: Endpoint
+    :return: tuple[inspect.Signature, list[str]]: New signature and names of the added parameters
+    """
+    signature = inspect.signature(func)
+    parameters = list(signature.parameters.values())
+    injected = []
+
+    for name, annotation in (('request', Request), ('response', Response)):
+        if name not in signature.parameters:
+            parameters.append(inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=annotation))
+            injected.append(name)
+
+    return signature.replace(parameters=parameters), injected
+
+
+def cached(response_model: Any, *tags: str, headers: Iterable[str] = ()) -> Callable:
+    """
+    Decorator to cache JSON response of a GET endpoint.
+
+    Tags are format strings filled with the endpoint arguments, e.g. 'post:{post_id}'.
+    The endpoint result is serialized with response_model once and stored as bytes;
+    hits skip the endpoint, the ORM queries and Pydantic serialization. Responses
+    carry a strong ETag and If-None-Match is answered with 304 Not Modified.
+    A miss is filled from the primary, so a lagging replica is never cached.
+
+    :param response_model: Any: Pydantic model or type the endpoint returns
+    :param tags: str: Invalidation tag templates
+    :param headers: Iterable[str]: Response headers set by the endpoint that are cached with the body
+    :return: Decorator for the endpoint
+    """
+    adapter = TypeAdapter(response_model)
+    kept_headers = [header.lower() for header in headers]
+
+    def decorator(func: Callable) -> Callable:
+        signature, injected = with_request_response(func)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs.pop('request') if 'request' in injected else kwargs['request']
+            response: Response = kwargs.pop('response') if 'response' in injected else kwargs['response']
+
+            if not settings.cache_enabled:
+                return await func(*args, **kwargs)
+
+            key = f'{request.url.path}?{request.url.query}'
+            raw = await response_cache.get(key)
+
+            if raw is None:
+                with primary(kwargs.get('db')):
+                    result = await func(*args, **kwargs)
+
+                    if isinstance(result, Response):
+                        return result
+
+                    body = adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+                meta = {name: value for name, value in response.headers.items() if name in kept_headers}
+                raw = json.dumps(meta).encode() + b'\n' + body
+                await response_cache.set(key, raw, [tag.format(**kwargs) for tag in tags])
+            else:
+                meta, body = raw.split(b'\n', 1)
+                meta = json.loads(meta)
+
+            etag = make_etag(body)
+            if etag_matches(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            return Response(content=body, media_type='application/json', headers={**meta, 'ETag': etag})
+
+        wrapper.__signature__ = signature
+        return wrapper
+
+    return decorator
+
+
+@events.subscribe(events.POST_CHANGED)
+async def invalidate_post(post_id: int, user_id: int | None = None) -> None:
+    tags = [f'post:{post_id}']
+    if user_id is not None:
+        tags.append(f'user:{user_id}')
+    await response_cache.invalidate(*tags)
+
+
+@events.subscribe(events.COMMENTS_CHANGED)
+async def invalidate_comments(post_id: int, user_id: int | None = None) -> None:
+    tags = [f'post:{post_id}:comments']
+    if user_id is not None:
+        tags.append(f'user:{user_id}')
+    await response_cache.invalidate(*tags)
+
+
+@events.subscribe(events.TAG_CHANGED)
+async def invalidate_tag(tag: str, post_ids: Iterable[int] = ()) -> None:
+    # Posts embed their tags, so renaming or deleting a tag drops every cached post.
+    await response_cache.invalidate(f'tag:{tag}', 'posts')
+
+
+@events.subscribe(events.USER_CHANGED)
+async def invalidate_user(user_id: int) -> None:
+    await response_cache.invalidate(f'user:{user_id}')
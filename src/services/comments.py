@@ -0,0 +1,248 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+import re
+from typing import Awaitable, Callable, List
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Comment, User
+from src.repository import comments as comments_repository
+from src.repository import posts as posts_repository
+from src.schemas.comments import CommentModel
+
+
+Moderator = Callable[[Comment], Awaitable[bool]]
+
+
+class ProfanityFilter:
+    """
+    Moderator that rejects comments containing any of the banned words.
+    """
+
+    def __init__(self, banned_words: List[str]):
+        words = '|'.join(re.escape(word) for word in banned_words if word)
+        self.pattern = re.compile(rf'\b({words})\b', re.IGNORECASE) if words else None
+
+    async def __call__(self, comment: Comment) -> bool:
+        if self.pattern is None:
+            return True
+        return self.pattern.search(comment.comment_text) is None
+
+
+@dataclass
+class PendingComment:
+    values: dict
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class CommentService:
+    """
+    Comment ingestion pipeline.
+
+    Comments are queued and written by a background worker in micro-batches of
+    comments_batch_size rows or comments_batch_interval_ms milliseconds, whichever
+    comes first. Each batch is one INSERT ... RETURNING, one version bump per
+distinct post and one commit, so a popular post has its row updated at most
+once per batch however many comments it gets.
+    Committed comments are passed to the moderators off the request path,
+    rejected ones are deleted.
+    """
+
+    def __init__(self, batch_size: int = settings.comments_batch_size, batch_interval_ms: int = settings.comments_batch_interval_ms):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval_ms / 1000
+        self.post_ids: set[int] = set()
+        self.moderators: List[Moderator] = []
+        self.queue: asyncio.Queue | None = None
+        self.worker: asyncio.Task | None = None
+        self.moderation_tasks: set[asyncio.Task] = set()
+
+    def add_moderator(self, moderator: Moderator) -> None:
+        """
+        Register an async moderator. It gets a committed comment and returns False to reject it.
+
+        :param moderator: Moderator: Async callable
+        :return: None
+        """
+        self.moderators.append(moderator)
+
+    async def start(self) -> None:
+        """
+        Load known post ids and start the batch writer.
+
+        :return: None
+        """
+        db = SessionLocal()
+        try:
+            self.post_ids = set(await posts_repository.get_post_ids(db))
+        finally:
+            db.close()
+
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Flush queued comments and stop the batch writer.
+
+        :return: None
+        """
+        if self.worker is None:
+            return
+
+        await self.queue.join()
+        self.worker.cancel()
+        self.worker = None
+        self.queue = None
+
+        if self.moderation_tasks:
+            await asyncio.gather(*self.moderation_tasks, return_exceptions=True)
+
+    def remember_post(self, post_id: int) -> None:
+        self.post_ids.add(post_id)
+
+    def forget_post(self, post_id: int) -> None:
+        self.post_ids.discard(post_id)
+
+    async def post_exists(self, post_id: int, db: Session) -> bool:
+        """
+        Check that post exists, using the cached id set and falling back to the database.
+
+        :param post_id: int: Post id
+        :param db: Session: Connection to the database
+        :return: bool
+        """
+        if post_id in self.post_ids:
+            return True
+
+        if await posts_repository.post_exists(post_id, db):
+            self.post_ids.add(post_id)
+            return True
+
+        return False
+
+    async def create_comment(self, db: Session, post_id: int, comment_data: CommentModel, user: User) -> Comment:
+        """
+        Queue comment for the next batch and wait until it is committed.
+
+        Without a running worker the comment is written directly.
+
+        :param db: Session: Connection to the database
+        :param post_id: int: Post id
+        :param comment_data: CommentModel: Text of comment
+        :param user: User: Author of the comment
+        :return: Comment
+        """
+        if len(comment_data.comment_text) == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Comment length cannot be 0')
+
+        if self.worker is None:
+            comment = await comments_repository.create_comment(db, post_id, comment_data, user)
+            self._moderate_later([comment])
+            return comment
+
+        pending = PendingComment(values={
+            'comment_text': comment_data.comment_text,
+            'created_at': datetime.now(),
+            'post_id': post_id,
+            'user_id': user.id,
+        })
+        await self.queue.put(pending)
+        return await pending.future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_interval
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _flush(self, batch: List[PendingComment]) -> None:
+        try:
+            comments = await self._insert([pending.values for pending in batch])
+        except SQLAlchemyError:
+            comments = None
+
+        if comments is None:
+            # One bad row (e.g. a post deleted by another worker) must not fail the whole batch.
+            comments = []
+            for pending in batch:
+                try:
+                    comments.extend(await self._insert([pending.values]))
+                except SQLAlchemyError as e:
+                    self.forget_post(pending.values['post_id'])
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                    comments.append(None)
+
+        for pending, comment in zip(batch, comments):
+            if comment is not None and not pending.future.done():
+                pending.future.set_result(comment)
+
+        self._moderate_later([comment for comment in comments if comment is not None])
+
+    @staticmethod
+    async def _insert(rows: List[dict]) -> List[Comment]:
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            return await comments_repository.create_comments(db, rows)
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _moderate_later(self, comments: List[Comment]) -> None:
+        if not self.moderators or not comments:
+            return
+
+        task = asyncio.create_task(self._moderate(comments))
+        self.moderation_tasks.add(task)
+        task.add_done_callback(self.moderation_tasks.discard)
+
+    async def _moderate(self, comments: List[Comment]) -> None:
+        rejected = []
+
+        for comment in comments:
+            verdicts = await asyncio.gather(*(moderator(comment) for moderator in self.moderators))
+            if not all(verdicts):
+                rejected.append(comment.id)
+
+        if not rejected:
+            return
+
+        db = SessionLocal()
+        try:
+            await comments_repository.delete_comments(db, rejected)
+        finally:
+            db.close()
+
+
+comment_service = CommentService()
+
+if settings.comments_banned_words:
+    comment_service.add_moderator(ProfanityFilter(settings.comments_banned_words))
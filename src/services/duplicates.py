@@ -0,0 +1,114 @@
+from typing import Dict, List, Tuple
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.repository import post_images as post_images_repository
+
+
+class HashIndex:
+    """
+    Multi-index hash table of 64-bit perceptual hashes for near-duplicate lookups.
+
+    Every hash is split into max_distance + 1 disjoint chunks and each chunk is
+    indexed in its own table. Two hashes within max_distance bits of each other
+    agree exactly on at least one chunk, so a lookup only compares the hashes
+    found in max_distance + 1 table buckets instead of scanning the whole index.
+    """
+
+    def __init__(self, max_distance: int = settings.duplicate_max_distance, bits: int = 64):
+        self.max_distance = max_distance
+        count = max_distance + 1
+        widths = [bits // count + (1 if i < bits % count else 0) for i in range(count)]
+
+        self.chunks: List[Tuple[int, int]] = []
+        shift = 0
+        for width in widths:
+            self.chunks.append((shift, (1 << width) - 1))
+            shift += width
+
+        self.tables: List[Dict[int, List[Tuple[int, int]]]] = [{} for _ in self.chunks]
+        self.entries: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, post_id: int, phash: str, user_id: int) -> None:
+        """
+        Index hash of the post image.
+
+        :param post_id: int: Post id
+        :param phash: str: Perceptual hash in hex
+        :param user_id: int: Author of the post
+        :return: None
+        """
+        self.remove(post_id)
+        value = int(phash, 16)
+        self.entries[post_id] = (value, user_id)
+
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table.setdefault((value >> shift) & mask, []).append((value, post_id))
+
+    def remove(self, post_id: int) -> None:
+        """
+        Remove the post from the index.
+
+        :param post_id: int: Post id
+        :return: None
+        """
+        entry = self.entries.pop(post_id, None)
+        if entry is None:
+            return
+
+        value = entry[0]
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            key = (value >> shift) & mask
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.remove((value, post_id))
+                if not bucket:
+                    del table[key]
+
+    def find(self, phash: str, user_id: int | None = None, max_distance: int | None = None) -> List[Tuple[int, int]]:
+        """
+        Find posts with a similar image.
+
+        :param phash: str: Perceptual hash in hex
+        :param user_id: int | None: Only posts of this user
+        :param max_distance: int | None: Hamming distance limit, at most the index max_distance
+        :return: List[Tuple[int, int]]: (distance, post_id) pairs, closest first
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        value = int(phash, 16)
+        found = {}
+
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            for other, post_id in table.get((value >> shift) & mask, ()):
+                distance = (value ^ other).bit_count()
+                if distance <= max_distance:
+                    found[post_id] = distance
+
+        return sorted(
+            (distance, post_id)
+            for post_id, distance in found.items()
+            if user_id is None or self.entries[post_id][1] == user_id
+        )
+
+    async def load(self) -> None:
+        """
+        Build the index from image hashes stored in the database.
+
+        :return: None
+        """
+        db = SessionLocal()
+        try:
+            rows = await post_images_repository.get_post_hashes(db)
+        finally:
+            db.close()
+
+        for post_id, user_id, phash in rows:
+            self.add(post_id, phash, user_id)
+
+
+duplicate_index = HashIndex()
@@ -1,52 +1,308 @@
-from pathlib import Path
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
+import logging
+import time
+from typing import AsyncIterator, Dict
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
 from pydantic import EmailStr
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 
-from src.services.auth import auth_service
 from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import OutgoingEmail, User
+from src.repository import email as email_repository
+from src.services.auth import auth_service
+from src.services.mail_templates import mail_templates
+
+
+logger = logging.getLogger(__name__)
 
+# Errors after which the connection is dropped and the email is retried on a new one.
+CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError, OSError)
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME='Contacts Systems',
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+deliveries: Counter = Counter()
 
 
-async def send_email(email: EmailStr, username: str, host: str):
-    
+def is_permanent(error: Exception) -> bool:
     """
-    The send_email function sends an email to the user with a link that they can click on to verify their email address.
+    Check whether the SMTP server refused the email for good (5xx reply).
 
-    :param email: EmailStr: User's email
-    :param username: str: User's username
-    :param host: str: Hostname of the server to the template
-    :return: A coroutine object
-    """
-    try:
-        token_verification = auth_service.create_email_token({'sub': email})
-        message = MessageSchema(
-            subject='Confirm your email',
-            recipients=[email],
-            template_body={'host': host, 'username': username, 'token': token_verification},
-            subtype=MessageType.html
+    Authentication failures are not permanent: they are a problem of our
+    credentials, not of the email.
+
+    :param error: Exception: Error raised while sending
+    :return: bool
+    """
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(refused.code >= 500 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code >= 500 and not isinstance(error, aiosmtplib.SMTPAuthenticationError)
+    return False
+
+
+class SMTPPool:
+    """
+    Fixed number of SMTP connections that stay open and authenticated between emails.
+
+    A connection is opened the first time it is taken and replaced after a
+    connection error.
+    """
+
+    def __init__(self, size: int, **options):
+        self.options = options
+        self.idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self.idle.put_nowait(None)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        smtp = await self.idle.get()
+        try:
+            if smtp is None or not smtp.is_connected:
+                smtp = aiosmtplib.SMTP(**self.options)
+                await smtp.connect()
+                deliveries['connections'] += 1
+            yield smtp
+        except CONNECTION_ERRORS:
+            if smtp is not None:
+                smtp.close()
+            smtp = None
+            raise
+        finally:
+            self.idle.put_nowait(smtp)
+
+    async def close(self) -> None:
+        """
+        Close the open connections.
+
+        :return: None
+        """
+        for _ in range(self.idle.qsize()):
+            smtp = self.idle.get_nowait()
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+            self.idle.put_nowait(None)
+
+
+class MailService:
+    """
+    Worker that empties the email outbox.
+
+    Routes only queue emails in email_outbox. Every mail_interval seconds the
+    worker takes up to mail_batch_size due emails, renders them and sends them
+    over a pool of mail_pool_size SMTP connections, at most mail_rate_per_second
+    emails per second. Failed emails are retried with exponential backoff up to
+    mail_max_attempts times; emails the server refused with a 5xx reply are not
+    retried. Results are counted in deliveries.
+    """
+
+    def __init__(
+        self,
+        hostname: str = settings.mail_server,
+        port: int = settings.mail_port,
+        username: str | None = settings.mail_username,
+        password: str | None = settings.mail_password,
+        use_tls: bool = settings.mail_ssl_tls,
+        start_tls: bool = settings.mail_starttls,
+        pool_size: int = settings.mail_pool_size,
+        batch_size: int = settings.mail_batch_size,
+        interval: float = settings.mail_interval,
+        rate: float = settings.mail_rate_per_second,
+        max_attempts: int = settings.mail_max_attempts,
+        backoff: float = settings.mail_backoff,
+    ):
+        self.pool = SMTPPool(
+            pool_size,
+            hostname=hostname,
+            port=port,
+            username=username,
+            password=password,
+            use_tls=use_tls,
+            start_tls=start_tls,
+            validate_certs=settings.mail_validate_certs,
+            timeout=settings.mail_timeout,
         )
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.next_slot = 0.0
+        self.task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """
+        Compile the email templates and start the worker.
+
+        :return: None
+        """
+        mail_templates.load()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the worker and close the SMTP connections.
+
+        :return: None
+        """
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.pool.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                sent = await self.process()
+            except Exception as e:
+                logger.warning('Sending emails failed: %s', e)
+                sent = 0
+            # A full batch means more emails are probably waiting.
+            if sent < self.batch_size:
+                await asyncio.sleep(self.interval)
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name='email_template.html')
+    def build_message(self, email: OutgoingEmail) -> EmailMessage:
+        """
+        Render the queued email into a MIME message.
 
-    except ConnectionErrors as err:
-        print(err)
+        :param email: OutgoingEmail: Queued email
+        :return: EmailMessage
+        """
+        message = EmailMessage()
+        message['From'] = formataddr((settings.mail_from_name, settings.mail_from))
+        message['To'] = email.recipient
+        message['Subject'] = email.subject
+        message.set_content(mail_templates.render(email.template, email.context), subtype='html')
+        return message
 
+    async def _throttle(self) -> None:
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
 
+    async def _send(self, message: EmailMessage) -> None:
+        await self._throttle()
+        try:
+            async with self.pool.connection() as smtp:
+                await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # The server closed an idle connection, send once more over a new one.
+            async with self.pool.connection() as smtp:
+                await smtp.send_message(message)
 
+    async def send_batch(self, messages: Dict[int, EmailMessage]) -> Dict[int, Exception]:
+        """
+        Send the messages concurrently over the connection pool.
+
+        :param messages: Dict[int, EmailMessage]: Messages by email id
+        :return: Dict[int, Exception]: Error of every message that was not sent
+        """
+        ids = list(messages)
+        results = await asyncio.gather(*(self._send(messages[email_id]) for email_id in ids), return_exceptions=True)
+        return {email_id: result for email_id, result in zip(ids, results) if isinstance(result, Exception)}
+
+    async def process(self) -> int:
+        """
+        Send one batch of due emails.
+
+        :return: int: Number of processed emails
+        """
+        db = SessionLocal()
+        try:
+            emails = await email_repository.get_due_emails(db, self.batch_size)
+            if not emails:
+                db.commit()
+                return 0
+
+            messages = {}
+            errors: Dict[int, Exception] = {}
+            for email in emails:
+                try:
+                    messages[email.id] = self.build_message(email)
+                except Exception as e:
+                    errors[email.id] = e
+
+            errors.update(await self.send_batch(messages))
+            deliveries['sent'] += len(emails) - len(errors)
+
+            failed = {}
+            for email in emails:
+                error = errors.get(email.id)
+                if error is None:
+                    continue
+                if email.id not in messages or is_permanent(error) or email.attempts + 1 >= self.max_attempts:
+                    logger.error('Giving up sending email %s to %s: %s', email.id, email.recipient, error)
+                    deliveries['failed'] += 1
+                else:
+                    failed[email.id] = str(error) or type(error).__name__
+                    deliveries['retried'] += 1
+
+            # Emails given up on are removed like sent ones.
+            await email_repository.complete_emails(db, emails, failed, self.backoff)
+            return len(emails)
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+mail_service = MailService()
+
+
+async def queue_email(recipient: EmailStr, template: str, context: dict, db: Session) -> None:
+    """
+    The queue_email function adds an email rendered from one of the templates to the outbox.
+
+    :param recipient: EmailStr: Email of the recipient
+    :param template: str: Template name, e.g. 'reset_password.html'
+    :param context: dict: Template variables
+    :param db: Session: Connection to the database
+    :return: None
+    """
+    await email_repository.enqueue_email(
+        db,
+        recipient=recipient,
+        subject=mail_templates.subject(template, context),
+        template=template,
+        context=context,
+    )
+
+
+async def send_email(email: EmailStr, username: str, host: str, db: Session) -> None:
+    """
+    The send_email function queues an email to the user with a link that they can click on to verify their email address.
+
+    :param email: EmailStr: User's email
+    :param username: str: User's username
+    :param host: str: Hostname of the server to the template
+    :param db: Session: Connection to the database
+    :return: None
+    """
+    token_verification = auth_service.create_email_token({'sub': email})
+    await queue_email(email, 'email_template.html', {'host': host, 'username': username, 'token': token_verification}, db)
+
+
+async def send_reset_password_email(user: User, host: str, db: Session) -> None:
+    """
+    The send_reset_password_email function queues an email to the user with a link to choose a new password.
+
+    :param user: User: User who asked for the reset
+    :param host: str: Hostname of the server to the template
+    :param db: Session: Connection to the database
+    :return: None
+    """
+    token = auth_service.create_reset_token(user)
+    await queue_email(user.email, 'reset_password.html', {'host': host, 'username': user.username, 'token': token}, db)
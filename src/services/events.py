@@ -0,0 +1,40 @@
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+
+POST_CHANGED = 'post_changed'
+COMMENTS_CHANGED = 'comments_changed'
+TAG_CHANGED = 'tag_changed'
+USER_CHANGED = 'user_changed'
+
+Handler = Callable[..., Awaitable[None]]
+
+handlers: dict[str, list[Handler]] = defaultdict(list)
+
+
+def subscribe(event: str) -> Callable[[Handler], Handler]:
+    """
+    Decorator to register an async handler for the event.
+
+    :param event: str: Name of the event
+    :return: Decorator that registers the handler and returns it unchanged
+    """
+    def decorator(handler: Handler) -> Handler:
+        handlers[event].append(handler)
+        return handler
+
+    return decorator
+
+
+async def emit(event: str, **payload) -> None:
+    """
+    Function to notify all handlers of the event.
+
+    Repository write functions emit events after commit, so handlers see the new state.
+
+    :param event: str: Name of the event
+    :param payload: Event data passed to handlers as keyword arguments
+    :return: None
+    """
+    for handler in handlers[event]:
+        await handler(**payload)
@@ -0,0 +1,170 @@
+import asyncio
+from dataclasses import dataclass
+from io import BytesIO
+import logging
+import math
+from typing import List
+
+import cloudinary
+import cloudinary.uploader
+from PIL import Image, ImageOps
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.repository import post_images as post_images_repository
+
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION_TAG = 0x0112
+HASH_SIZE = 8
+HASH_SAMPLE = HASH_SIZE * 4
+
+# Orthonormal DCT-II basis for the lowest HASH_SIZE frequencies of a HASH_SAMPLE long signal.
+_DCT = [
+    [math.cos(math.pi * (2 * n + 1) * k / (2 * HASH_SAMPLE)) for n in range(HASH_SAMPLE)]
+    for k in range(HASH_SIZE)
+]
+
+
+@dataclass(frozen=True, slots=True)
+class ImageMetadata:
+    width: int
+    height: int
+    orientation: int
+    phash: str
+
+
+def phash(image: Image.Image) -> str:
+    """
+    Perceptual hash of the image as 16 hex digits.
+
+    The image is reduced to 32x32 grayscale, the low 8x8 frequencies of its DCT
+    are compared with their median, one bit per frequency. This is the
+    algorithm of imagehash.phash, but the stored hashes come from
+    extract_metadata, which hashes the EXIF-transposed image and decodes JPEGs
+    at a reduced scale, so they are only comparable with each other, not with
+    imagehash.phash of the same file.
+
+    :param image: Image.Image: Image
+    :return: str
+    """
+    pixels = list(image.convert('L').resize((HASH_SAMPLE, HASH_SAMPLE), Image.Resampling.LANCZOS).getdata())
+    rows = [pixels[i * HASH_SAMPLE:(i + 1) * HASH_SAMPLE] for i in range(HASH_SAMPLE)]
+
+    row_dct = [[sum(c * p for c, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    low = [
+        sum(basis[r] * row_dct[r][l] for r in range(HASH_SAMPLE))
+        for basis in _DCT
+        for l in range(HASH_SIZE)
+    ]
+
+    ordered = sorted(low)
+    median = (ordered[len(low) // 2 - 1] + ordered[len(low) // 2]) / 2
+    bits = 0
+    for value in low:
+        bits = (bits << 1) | (value > median)
+    return f'{bits:016x}'
+
+
+def extract_metadata(data: bytes) -> ImageMetadata:
+    """
+    Read dimensions, EXIF orientation and perceptual hash of an image.
+
+    Dimensions are reported as displayed, i.e. after applying the EXIF orientation.
+    JPEGs are decoded at a reduced scale for hashing.
+
+    :param data: bytes: Encoded image
+    :return: ImageMetadata
+    """
+    with Image.open(BytesIO(data)) as image:
+        orientation = image.getexif().get(ORIENTATION_TAG, 1)
+        width, height = image.size
+        if orientation in (5, 6, 7, 8):
+            width, height = height, width
+
+        image.draft('L', (HASH_SAMPLE * 2, HASH_SAMPLE * 2))
+        image = ImageOps.exif_transpose(image)
+        return ImageMetadata(width=width, height=height, orientation=orientation, phash=phash(image))
+
+
+class ImageService:
+    """
+    Post-upload image ingestion.
+
+    Metadata is read from the uploaded file by PostService.upload_post. After the
+    post is created, Cloudinary generates a responsive set of thumbnails
+    (image_thumbnail_widths x image_thumbnail_formats) in the background as eager
+    derivations of the uploaded original, and both are stored in post_images.
+    At most image_workers images are processed at once.
+    """
+
+    def __init__(
+        self,
+        widths: List[int] = settings.image_thumbnail_widths,
+        formats: List[str] = settings.image_thumbnail_formats,
+        workers: int = settings.image_workers,
+    ):
+        self.widths = widths
+        self.formats = formats
+        self.semaphore = asyncio.Semaphore(workers)
+
+    def create_thumbnails(self, public_id: str) -> List[dict]:
+        """
+        Generate thumbnails of the uploaded image on Cloudinary.
+
+        Images narrower than a thumbnail width are not upscaled.
+
+        :param public_id: str: Public id of the original
+        :return: List[dict]: {'width', 'format', 'url'} of every thumbnail
+        """
+        sizes = [(width, fmt) for fmt in self.formats for width in self.widths]
+        result = cloudinary.uploader.explicit(
+            public_id,
+            type='upload',
+            eager=[{'width': width, 'crop': 'limit', 'format': fmt} for width, fmt in sizes],
+        )
+        return [
+            {'width': width, 'format': fmt, 'url': eager['secure_url']}
+            for (width, fmt), eager in zip(sizes, result.get('eager', []))
+        ]
+
+    async def ingest(self, post_id: int, public_id: str, metadata: ImageMetadata) -> None:
+        """
+        Create thumbnails of a new post and save them with the image metadata.
+
+        Failures are logged; the post keeps working with its original url.
+
+        :param post_id: int: Post id
+        :param public_id: str: Public id of the original on Cloudinary
+        :param metadata: ImageMetadata: Metadata read from the uploaded file
+        :return: None
+        """
+        async with self.semaphore:
+            try:
+                thumbnails = await asyncio.to_thread(self.create_thumbnails, public_id)
+            except Exception as e:
+                logger.warning('Cannot create thumbnails of post %s: %s', post_id, e)
+                thumbnails = []
+
+        db = SessionLocal()
+        try:
+            await post_images_repository.add_post_image(
+                db,
+                post_id,
+                metadata.width,
+                metadata.height,
+                metadata.orientation,
+                metadata.phash,
+                thumbnails,
+            )
+        except SQLAlchemyError as e:
+            # The post may have been deleted while its image was processed.
+            db.rollback()
+            logger.warning('Cannot save image of post %s: %s', post_id, e)
+        finally:
+            db.close()
+
+
+image_service = ImageService()
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from uuid import uuid4
+
+from fastapi import HTTPException, status
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+
+
+logger = logging.getLogger(__name__)
+
+# Every scope is three keys: KEYS[i] failure window, KEYS[i + 1] strikes, KEYS[i + 2] lock.
+# ARGV[1] now in ms, ARGV[2] window in ms, ARGV[3] unique member, ARGV[4] first lockout in s,
+# ARGV[5] longest lockout in s, ARGV[6] strikes ttl in s, ARGV[7..] failure limit of every scope
+RECORD_FAILURE = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local longest = 0
+for i = 1, #KEYS, 3 do
+    local limit = tonumber(ARGV[7 + (i - 1) / 3])
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], 0, now - window)
+    redis.call('ZADD', KEYS[i], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[i], window)
+    if redis.call('ZCARD', KEYS[i]) >= limit then
+        local strikes = redis.call('INCR', KEYS[i + 1])
+        redis.call('EXPIRE', KEYS[i + 1], ARGV[6])
+        local lock = math.min(tonumber(ARGV[4]) * 2 ^ (strikes - 1), tonumber(ARGV[5]))
+        redis.call('SET', KEYS[i + 2], 1, 'EX', math.floor(lock))
+        redis.call('DEL', KEYS[i])
+        longest = math.max(longest, lock)
+    end
+end
+return math.floor(longest)
+"""
+
+
+class LoginGuard:
+    """
+    Checks that run before a login touches the database or bcrypt.
+
+    Failed logins are counted per client IP and per account in Redis sorted sets
+    over a sliding window of login_window seconds. Reaching the limit of a scope
+    locks it for login_lockout_base seconds, doubled on every further lockout
+    within login_strikes_ttl up to login_lockout_max. Emails that do not exist
+    are remembered for login_unknown_ttl seconds and refused without a query.
+    Password checks run in a thread, at most login_bcrypt_concurrency at a time
+    in this process. Without Redis only the bcrypt cap applies.
+    """
+
+    def __init__(
+        self,
+        key_prefix: str = 'login',
+        window: int = settings.login_window,
+        ip_limit: int = settings.login_ip_limit,
+        account_limit: int = settings.login_account_limit,
+        bcrypt_concurrency: int = settings.login_bcrypt_concurrency,
+    ):
+        self.key_prefix = key_prefix
+        self.window = window
+        self.ip_limit = ip_limit
+        self.account_limit = account_limit
+        self.bcrypt_slots = asyncio.Semaphore(bcrypt_concurrency)
+        self.redis = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+        self.record_failure = self.redis.register_script(RECORD_FAILURE)
+        self.redis_retry_at = 0.0
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self.redis_retry_at
+
+    def _redis_failed(self, error: RedisError) -> None:
+        logger.warning('Login guard skipped, Redis failed: %s', error)
+        self.redis_retry_at = time.monotonic() + 5
+
+    def _keys(self, scope: str, value: str) -> list[str]:
+        return [f'{self.key_prefix}:{scope}:{name}:{value}' for name in ('failures', 'strikes', 'lock')]
+
+    def _unknown_key(self, email: str) -> str:
+        # Emails are looked up case-sensitively, so the mark must not cover other spellings of a real account.
+        return f'{self.key_prefix}:unknown:{email}'
+
+    async def check(self, ip: str, email: str) -> None:
+        """
+        Refuse the login if the IP or the account is locked or the email is known not to exist.
+
+        :param ip: str: Client IP
+        :param email: str: Email from the login form
+        :return: None
+        """
+        if not self._redis_available():
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.exists(self._unknown_key(email))
+                pipe.ttl(self._keys('ip', ip)[2])
+                pipe.ttl(self._keys('account', email.lower())[2])
+                unknown, ip_lock, account_lock = await pipe.execute()
+        except RedisError as e:
+            self._redis_failed(e)
+            return
+
+        retry_after = max(ip_lock, account_lock)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail='Too many failed logins, try again later',
+                headers={'Retry-After': str(retry_after)},
+            )
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid email')
+
+    async def failed(self, ip: str, email: str, unknown: bool = False) -> int:
+        """
+        Count a failed login.
+
+        :param ip: str: Client IP
+        :param email: str: Email from the login form
+        :param unknown: bool: The email does not belong to any user
+        :return: int: Seconds of the lockout it caused, 0 if none
+        """
+        if not self._redis_available():
+            return 0
+
+        try:
+            if unknown:
+                await self.redis.set(self._unknown_key(email), 1, ex=settings.login_unknown_ttl)
+            lock = await self.record_failure(
+                keys=self._keys('ip', ip) + self._keys('account', email.lower()),
+                args=[
+                    int(time.time() * 1000),
+                    self.window * 1000,
+                    uuid4().hex,
+                    settings.login_lockout_base,
+                    settings.login_lockout_max,
+                    settings.login_strikes_ttl,
+                    self.ip_limit,
+                    self.account_limit,
+                ],
+            )
+        except RedisError as e:
+            self._redis_failed(e)
+            return 0
+
+        if lock:
+            logger.info('Login locked for %s s after failures from %s for %s', lock, ip, email)
+        return int(lock)
+
+    async def succeeded(self, email: str) -> None:
+        """
+        Reset the failures of the account after a successful login.
+
+        :param email: str: Email of the user
+        :return: None
+        """
+        if not self._redis_available():
+            return
+
+        try:
+            await self.redis.delete(*self._keys('account', email.lower())[:2])
+        except RedisError as e:
+            self._redis_failed(e)
+
+    async def forget_unknown(self, email: str) -> None:
+        """
+        Drop the unknown email mark, e.g. when a user signs up with the email.
+
+        :param email: str: Email
+        :return: None
+        """
+        if not self._redis_available():
+            return
+
+        try:
+            await self.redis.delete(self._unknown_key(email))
+        except RedisError as e:
+            self._redis_failed(e)
+
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Check the password in a worker thread under the bcrypt concurrency cap.
+
+        Waiting longer than login_bcrypt_timeout for a slot is answered with 503.
+
+        :param plain_password: str: Password from the login form
+        :param hashed_password: str: Stored password hash
+        :return: bool
+        """
+        try:
+            await asyncio.wait_for(self.bcrypt_slots.acquire(), settings.login_bcrypt_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Too many logins, try again later')
+
+        try:
+            return await asyncio.to_thread(auth_service.verify_password, plain_password, hashed_password)
+        finally:
+            self.bcrypt_slots.release()
+
+
+login_guard = LoginGuard()
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+from uuid import uuid4
+
+from jinja2 import Environment, FileSystemLoader, Template, meta, nodes, select_autoescape
+from markupsafe import escape
+
+
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+# Subject of every email template, rendered with the same variables as the body.
+SUBJECTS = {
+    'email_template.html': 'Confirm your email',
+    'reset_password.html': 'Reset your password',
+    'notification.html': '{{ title }}',
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Fragments:
+    """
+    Template split into static parts around its variables.
+
+    parts has one item more than names: the output is
+    parts[0] + value of names[0] + parts[1] + ... + parts[-1].
+    """
+
+    parts: List[str]
+    names: List[str]
+
+    def render(self, context: dict) -> str:
+        output = [self.parts[0]]
+        for name, part in zip(self.names, self.parts[1:]):
+            output.append(escape(context.get(name, '')))
+            output.append(part)
+        return ''.join(output)
+
+
+def is_plain(ast: nodes.Template) -> bool:
+    """
+    Check that the template only prints static text and variables as they are.
+
+    :param ast: nodes.Template: Parsed template
+    :return: bool
+    """
+    return all(
+        isinstance(node, nodes.Output) and all(isinstance(child, (nodes.TemplateData, nodes.Name)) for child in node.nodes)
+        for node in ast.body
+    )
+
+
+def split_template(template: Template, variables: set[str]) -> Fragments:
+    """
+    Pre-render the static parts of a plain template.
+
+    The template is rendered once with a unique marker in place of every variable
+    and the output is cut at the markers.
+
+    :param template: Template: Compiled template that passes is_plain
+    :param variables: set[str]: Variables used by the template
+    :return: Fragments
+    """
+    markers = {name: f'@@{uuid4().hex}@@' for name in variables}
+    output = template.render(markers)
+
+    positions = []
+    for name, marker in markers.items():
+        start = output.find(marker)
+        while start != -1:
+            positions.append((start, name))
+            start = output.find(marker, start + len(marker))
+    positions.sort()
+
+    parts, names, end = [], [], 0
+    for start, name in positions:
+        parts.append(output[end:start])
+        names.append(name)
+        end = start + len(markers[name])
+    parts.append(output[end:])
+    return Fragments(parts=parts, names=names)
+
+
+class MailTemplates:
+    """
+    Email templates compiled once.
+
+    load() compiles every template in SUBJECTS and pre-renders the static parts
+    of the bodies, so rendering an email only escapes and joins its per-user
+    variables. Bodies with filters, conditions or loops are rendered by Jinja.
+    """
+
+    def __init__(self, folder: Path = TEMPLATE_FOLDER, subjects: Dict[str, str] = SUBJECTS):
+        self.environment = Environment(loader=FileSystemLoader(folder), autoescape=select_autoescape(), auto_reload=False)
+        self.subject_environment = Environment(autoescape=False)
+        self.subjects = subjects
+        self.bodies: Dict[str, Template] = {}
+        self.fragments: Dict[str, Fragments | None] = {}
+        self.subject_templates: Dict[str, Template] = {}
+
+    def load(self) -> None:
+        """
+        Compile the templates and pre-render their static parts.
+
+        :return: None
+        """
+        for name, subject in self.subjects.items():
+            source = self.environment.loader.get_source(self.environment, name)[0]
+            ast = self.environment.parse(source)
+
+            body = self.environment.get_template(name)
+            self.bodies[name] = body
+            self.fragments[name] = split_template(body, meta.find_undeclared_variables(ast)) if is_plain(ast) else None
+            self.subject_templates[name] = self.subject_environment.from_string(subject)
+
+    def render(self, name: str, context: dict) -> str:
+        """
+        Render the body of an email.
+
+        :param name: str: Template name
+        :param context: dict: Template variables
+        :return: str: HTML body
+        """
+        if not self.bodies:
+            self.load()
+
+        fragments = self.fragments.get(name)
+        if fragments is not None:
+            return fragments.render(context)
+        if name in self.bodies:
+            return self.bodies[name].render(context)
+        return self.environment.get_template(name).render(context)
+
+    def subject(self, name: str, context: dict) -> str:
+        """
+        Render the subject of an email.
+
+        :param name: str: Template name
+        :param context: dict: Template variables
+        :return: str: Subject
+        """
+        if not self.bodies:
+            self.load()
+        return self.subject_templates[name].render(context)
+
+
+mail_templates = MailTemplates()
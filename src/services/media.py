@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import logging
+from typing import Dict, List
+
+import cloudinary.api
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.repository import media as media_repository
+
+
+logger = logging.getLogger(__name__)
+
+
+class MediaDeletionService:
+    """
+    Worker that empties the media deletion outbox.
+
+    Delete functions only queue public ids in media_deletions within their own
+    transaction. Every media_deletion_interval seconds the worker takes up to
+    media_deletion_batch_size due ids and removes them from Cloudinary with one
+    bulk delete_resources call, which also removes the eager derivatives
+    (thumbnails and transformations). Failed ids are retried with exponential
+    backoff up to media_deletion_max_attempts times.
+
+    Every media_reconcile_interval seconds uploads under media_prefix that no post
+    references are queued too, e.g. files of uploads whose post was never created.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.media_deletion_batch_size,
+        interval: float = settings.media_deletion_interval,
+        max_attempts: int = settings.media_deletion_max_attempts,
+        backoff: float = settings.media_deletion_backoff,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """
+        Start the deletion worker and the orphan reconciliation.
+
+        :return: None
+        """
+        self.tasks = [
+            asyncio.create_task(self._run(self.process, self.interval)),
+            asyncio.create_task(self._run(self.reconcile, settings.media_reconcile_interval)),
+        ]
+
+    async def stop(self) -> None:
+        """
+        Stop the background tasks.
+
+        :return: None
+        """
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _run(self, job, interval: float) -> None:
+        while True:
+            try:
+                await job()
+            except Exception as e:
+                logger.warning('%s failed: %s', job.__name__, e)
+            await asyncio.sleep(interval)
+
+    def _destroy(self, public_ids: List[str]) -> Dict[str, str]:
+        try:
+            result = cloudinary.api.delete_resources(public_ids, invalidate=True)
+        except Exception as e:
+            return {public_id: str(e) for public_id in public_ids}
+
+        deleted = result.get('deleted', {})
+        return {
+            public_id: deleted.get(public_id, 'missing from response')
+            for public_id in public_ids
+            if deleted.get(public_id) not in ('deleted', 'not_found')
+        }
+
+    async def process(self) -> int:
+        """
+        Delete one batch of due media.
+
+        :return: int: Number of deleted public ids
+        """
+        db = SessionLocal()
+        try:
+            deletions = await media_repository.get_due_media_deletions(db, self.batch_size)
+            if not deletions:
+                db.commit()
+                return 0
+
+            errors = await asyncio.to_thread(self._destroy, [deletion.public_id for deletion in deletions])
+
+            for deletion in deletions:
+                if deletion.public_id in errors and deletion.attempts + 1 >= self.max_attempts:
+                    logger.error('Giving up deleting %s: %s', deletion.public_id, errors.pop(deletion.public_id))
+
+            await media_repository.complete_media_deletions(db, deletions, errors, self.backoff)
+            return len(deletions) - len(errors)
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _list_uploads(self, older_than: datetime) -> List[str]:
+        public_ids = []
+        cursor = None
+
+        while True:
+            options = {'type': 'upload', 'prefix': settings.media_prefix, 'max_results': 500}
+            if cursor:
+                options['next_cursor'] = cursor
+            result = cloudinary.api.resources(**options)
+
+            for resource in result.get('resources', []):
+                created_at = datetime.fromisoformat(resource['created_at'].replace('Z', '+00:00'))
+                if created_at < older_than:
+                    public_ids.append(resource['public_id'])
+
+            cursor = result.get('next_cursor')
+            if not cursor:
+                return public_ids
+
+    async def reconcile(self) -> int:
+        """
+        Queue uploads that no post references.
+
+        Uploads younger than media_orphan_grace seconds are skipped, their post may
+        still be being created.
+
+        :return: int: Number of queued public ids
+        """
+        older_than = datetime.now(timezone.utc) - timedelta(seconds=settings.media_orphan_grace)
+        uploads = await asyncio.to_thread(self._list_uploads, older_than)
+
+        db = SessionLocal()
+        try:
+            orphans = []
+            for start in range(0, len(uploads), self.batch_size):
+                chunk = uploads[start:start + self.batch_size]
+                referenced = await media_repository.get_referenced_public_ids(db, chunk)
+                orphans.extend(public_id for public_id in chunk if public_id not in referenced)
+
+            await media_repository.enqueue_media_deletion(db, *orphans)
+            db.commit()
+        finally:
+            db.close()
+
+        if orphans:
+            logger.info('Queued %s orphaned uploads for deletion', len(orphans))
+        return len(orphans)
+
+
+media_service = MediaDeletionService()
@@ -0,0 +1,359 @@
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+import inspect
+from time import perf_counter
+from typing import Callable, Iterable
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+
+
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+
+# Queries and seconds spent in the database by the request being handled.
+request_stats: ContextVar[list | None] = ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    """
+    Observations counted in buckets by their upper bound, plus their sum and count.
+
+    counts[i] is the number of observations in (buckets[i - 1], buckets[i]], the
+    last item counts the ones above every bucket. Counts are cumulated only when
+    the histogram is rendered.
+    """
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets: list[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(names: Iterable[str], values: Iterable) -> str:
+    return ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+class Metrics:
+    """
+    Process metrics in the Prometheus text format.
+
+    Requests are observed by method, route template and status, so /api/posts/1
+    and /api/posts/2 share one series. Calls to Redis, Cloudinary and SMTP are
+    counted by service, operation and outcome. Counters kept by other services,
+    such as upload rejections, are registered with register_counter and read
+    when the metrics are rendered.
+
+    Updates are plain dict and list operations without locks. Most run on the
+    event loop; an increment from a worker thread racing another one can at
+    worst be lost, which metrics can afford.
+    """
+
+    def __init__(self, buckets: list[float] = settings.metrics_buckets):
+        self.buckets = sorted(buckets)
+        self.requests: dict[tuple[str, str, int], Histogram] = {}
+        self.request_queries: dict[str, Histogram] = {}
+        self.request_db_seconds: Counter = Counter()
+        self.background_queries: Counter = Counter()
+        self.background_db_seconds: Counter = Counter()
+        self.queries: Counter = Counter()
+        self.query_seconds: Counter = Counter()
+        self.calls: Counter = Counter()
+        self.call_seconds: Counter = Counter()
+        self.counters: list[tuple[str, str, Counter, tuple[str, ...]]] = []
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, queries: int, db_seconds: float) -> None:
+        """
+        Record a handled request.
+
+        :param method: str: HTTP method
+        :param route: str: Route template, e.g. /api/posts/{post_id}
+        :param status: int: Response status
+        :param seconds: float: Time until the response was sent
+        :param queries: int: Database queries run by the request
+        :param db_seconds: float: Time spent in those queries
+        :return: None
+        """
+        key = (method, route, status)
+        histogram = self.requests.get(key)
+        if histogram is None:
+            histogram = self.requests[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+        histogram = self.request_queries.get(route)
+        if histogram is None:
+            histogram = self.request_queries[route] = Histogram(QUERY_BUCKETS)
+        histogram.observe(queries)
+        self.request_db_seconds[route] += db_seconds
+
+    def observe_background(self, route: str, queries: int, db_seconds: float) -> None:
+        """
+        Record the database work of background tasks that ran after the response of a request.
+
+        :param route: str: Route template of the request
+        :param queries: int: Database queries run by the background tasks
+        :param db_seconds: float: Time spent in those queries
+        :return: None
+        """
+        self.background_queries[route] += queries
+        self.background_db_seconds[route] += db_seconds
+
+    def observe_query(self, statement: str, seconds: float) -> None:
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+        self.queries[operation] += 1
+        self.query_seconds[operation] += seconds
+
+        stats = request_stats.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += seconds
+
+    def observe_call(self, service: str, operation: str, seconds: float, failed: bool) -> None:
+        self.calls[(service, operation, 'error' if failed else 'ok')] += 1
+        self.call_seconds[(service, operation)] += seconds
+
+    def register_counter(self, name: str, help_text: str, counter: Counter, label_names: tuple[str, ...]) -> None:
+        """
+        Expose a Counter kept by another service.
+
+        :param name: str: Metric name
+        :param help_text: str: HELP text of the metric
+        :param counter: Counter: Counter keyed by a label value or a tuple of label values
+        :param label_names: tuple[str, ...]: Names of the labels in key order
+        :return: None
+        """
+        self.counters.append((name, help_text, counter, label_names))
+
+    def _histogram(self, lines: list[str], name: str, label_names: tuple[str, ...], series: dict) -> None:
+        for key, histogram in list(series.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            prefix = labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{prefix}}} {histogram.total}')
+            lines.append(f'{name}_count{{{prefix}}} {histogram.count}')
+
+    def _counter(self, lines: list[str], name: str, label_names: tuple[str, ...], counter: Counter) -> None:
+        for key, value in list(counter.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f'{name}{{{labels(label_names, key)}}} {value}')
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        :return: str
+        """
+        lines = []
+        families = [
+            ('http_request_duration_seconds', 'histogram', 'Time to handle a request',
+             lambda: self._histogram(lines, 'http_request_duration_seconds', ('method', 'route', 'status'), self.requests)),
+            ('http_request_db_queries', 'histogram', 'Database queries run by a request',
+             lambda: self._histogram(lines, 'http_request_db_queries', ('route',), self.request_queries)),
+            ('http_request_db_seconds_total', 'counter', 'Time requests spent in database queries',
+             lambda: self._counter(lines, 'http_request_db_seconds_total', ('route',), self.request_db_seconds)),
+            ('http_background_db_queries_total', 'counter', 'Database queries run by background tasks after the response',
+             lambda: self._counter(lines, 'http_background_db_queries_total', ('route',), self.background_queries)),
+            ('http_background_db_seconds_total', 'counter', 'Time background tasks spent in database queries',
+             lambda: self._counter(lines, 'http_background_db_seconds_total', ('route',), self.background_db_seconds)),
+            ('db_queries_total', 'counter', 'Database queries by statement type',
+             lambda: self._counter(lines, 'db_queries_total', ('operation',), self.queries)),
+            ('db_query_seconds_total', 'counter', 'Time spent in database queries by statement type',
+             lambda: self._counter(lines, 'db_query_seconds_total', ('operation',), self.query_seconds)),
+            ('external_calls_total', 'counter', 'Calls to Redis, Cloudinary and SMTP',
+             lambda: self._counter(lines, 'external_calls_total', ('service', 'operation', 'outcome'), self.calls)),
+            ('external_call_seconds_total', 'counter', 'Time spent in calls to Redis, Cloudinary and SMTP',
+             lambda: self._counter(lines, 'external_call_seconds_total', ('service', 'operation'), self.call_seconds)),
+        ]
+        for name, help_text, counter, label_names in self.counters:
+            families.append((name, 'counter', help_text,
+                             lambda name=name, counter=counter, label_names=label_names: self._counter(lines, name, label_names, counter)))
+
+        for name, kind, help_text, render in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            render()
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def timed(func: Callable, service: str, operation: str | Callable[..., str]) -> Callable:
+    """
+    Wrap a function or coroutine function so its calls are counted in metrics.
+
+    :param func: Callable: Function to wrap
+    :param service: str: Service label, e.g. redis
+    :param operation: str | Callable[..., str]: Operation label, or a function of the call arguments that returns it
+    :return: Callable: Wrapper
+    """
+    def name(args) -> str:
+        return operation if isinstance(operation, str) else operation(*args)
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = perf_counter()
+            failed = True
+            try:
+                result = await func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                metrics.observe_call(service, name(args), perf_counter() - start, failed)
+    else:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                metrics.observe_call(service, name(args), perf_counter() - start, failed)
+
+    wrapper.metrics_timed = True
+    return wrapper
+
+
+def patch(owner, attribute: str, service: str, operation: str | Callable[..., str]) -> None:
+    func = getattr(owner, attribute)
+    if not getattr(func, 'metrics_timed', False):
+        setattr(owner, attribute, timed(func, service, operation))
+
+
+def command_name(client, *args) -> str:
+    return str(args[0]).upper() if args else 'UNKNOWN'
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a failed query leaves nothing behind.
+    context.metrics_start = perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'metrics_start', None)
+    if start is not None:
+        metrics.observe_query(statement, perf_counter() - start)
+
+
+def instrument() -> None:
+    """
+    Install the metrics hooks: SQLAlchemy engine events and counting wrappers around
+    the Redis clients, the Cloudinary API functions and aiosmtplib. Safe to call twice.
+
+    Nothing is installed unless this is called, so with metrics_enabled off none
+    of these calls pay for metrics.
+
+    :return: None
+    """
+    import aiosmtplib
+    import cloudinary.api
+    import cloudinary.uploader
+    import redis
+    import redis.asyncio
+
+    from src.services import cache, email, upload_guard
+
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+    for client in (redis.Redis, redis.asyncio.Redis):
+        patch(client, 'execute_command', 'redis', command_name)
+    for pipeline in (redis.client.Pipeline, redis.asyncio.client.Pipeline):
+        patch(pipeline, 'execute', 'redis', 'PIPELINE')
+
+    for function in ('upload', 'explicit', 'destroy'):
+        patch(cloudinary.uploader, function, 'cloudinary', function)
+    for function in ('resources', 'delete_resources'):
+        patch(cloudinary.api, function, 'cloudinary', function)
+
+    patch(aiosmtplib.SMTP, 'connect', 'smtp', 'connect')
+    patch(aiosmtplib.SMTP, 'send_message', 'smtp', 'send_message')
+
+    if not metrics.counters:
+        metrics.register_counter('upload_rejections_total', 'Rejected uploads', upload_guard.rejections, ('reason', 'role'))
+        metrics.register_counter('email_deliveries_total', 'Email outbox results', email.deliveries, ('result',))
+        metrics.register_counter('response_cache_lookups_total', 'Response cache lookups', cache.lookups, ('result',))
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """
+    Metrics in the Prometheus text exposition format.
+
+    :param request: Request: HTTP request
+    :return: PlainTextResponse
+    """
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request until its response is sent and
+    counts the database queries it runs. Requests that match no route are
+    recorded under the route 'unmatched' to keep the number of series bounded.
+
+    The request is recorded when the last body message is sent. Background tasks
+    run after that within the same call, their queries are counted separately.
+    """
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        status_code = 500
+        stats = [0, 0.0]
+        sent = None
+        token = request_stats.set(stats)
+
+        def observe() -> tuple[int, float]:
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            self.registry.observe_request(scope['method'], route, status_code, perf_counter() - start, stats[0], stats[1])
+            return stats[0], stats[1]
+
+        async def send_with_status(message):
+            nonlocal status_code, sent
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False) and sent is None:
+                sent = observe()
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_stats.reset(token)
+            if sent is None:
+                observe()
+            elif stats[0] > sent[0]:
+                route = getattr(scope.get('route'), 'path', 'unmatched')
+                self.registry.observe_background(route, stats[0] - sent[0], stats[1] - sent[1])
@@ -0,0 +1,31 @@
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """
+    Function to encode a keyset pagination cursor.
+
+    :param created_at: datetime: Creation time of the last item on the page
+    :param item_id: int: id of the last item on the page
+    :return: str: Opaque url-safe cursor
+    """
+    raw = f'{created_at.isoformat()}|{item_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Function to decode a keyset pagination cursor.
+
+    :param cursor: str: Cursor returned by encode_cursor
+    :return: tuple[datetime, int]: Creation time and id of the last item seen
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
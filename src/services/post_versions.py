@@ -0,0 +1,140 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import wraps
+from typing import Callable, Iterable
+
+from fastapi import Request, Response, status
+from sqlalchemy.orm import Session
+
+from src.database.db import primary
+from src.repository.post_versions import get_post_version
+from src.services import events
+from src.services.cache import ResponseCache, etag_matches, with_request_response
+
+
+version_cache = ResponseCache(key_prefix='post_version')
+
+
+def as_utc(value: datetime) -> datetime:
+    """
+    Function to convert updated_at to an aware UTC datetime.
+
+    Posts store updated_at as a naive datetime.now() of the application, i.e. in
+    the local time of the server, so a naive value is converted from local time
+    rather than labelled as UTC.
+
+    :param value: datetime: Naive local or aware datetime
+    :return: datetime: Datetime in UTC
+    """
+    return value.astimezone(timezone.utc)
+
+
+async def get_version(post_id: int, db: Session) -> tuple[int, datetime] | None:
+    """
+    Function to get version and last modification time of post.
+
+    The pair is read from the cache; on a miss only the two columns are selected.
+
+    :param post_id: int: Post id
+    :param db: Session: Connection to the database
+    :return: tuple[int, datetime] | None: (version, updated_at in UTC)
+    """
+    key = str(post_id)
+    raw = await version_cache.get(key)
+
+    if raw is not None:
+        version, updated_at = raw.decode().split('|')
+        return int(version), as_utc(datetime.fromisoformat(updated_at))
+
+    row = await get_post_version(post_id, db)
+    if row is None:
+        return None
+
+    version, updated_at = row
+    updated_at = as_utc(updated_at) if updated_at else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    await version_cache.set(key, f'{version}|{updated_at.isoformat()}'.encode(), [f'post:{post_id}'])
+    return version, updated_at
+
+
+def not_modified_since(request: Request, updated_at: datetime) -> bool:
+    """
+    Function to check If-Modified-Since request header.
+
+    :param request: Request: HTTP request
+    :param updated_at: datetime: Last modification time of the resource in UTC
+    :return: bool
+    """
+    header = request.headers.get('if-modified-since')
+    if not header:
+        return False
+
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+
+    if since.tzinfo is None:
+        # A -0000 zone is parsed as naive, HTTP dates are always GMT.
+        since = since.replace(tzinfo=timezone.utc)
+
+    return updated_at.replace(microsecond=0) <= since
+
+
+def conditional_post(func: Callable) -> Callable:
+    """
+    Decorator to answer conditional GET requests of a post resource.
+
+    ETag and Last-Modified come from the post version counter. When the client
+    copy is current the endpoint is not called and 304 Not Modified is returned.
+    The version is read on the primary, so the endpoint reads there as well and
+    a lagging replica cannot send an old body under the new ETag.
+    The endpoint must take post_id and db parameters.
+
+    :param func: Callable: Endpoint
+    :return: Callable
+    """
+    signature, injected = with_request_response(func)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        request: Request = kwargs.pop('request') if 'request' in injected else kwargs['request']
+        response: Response = kwargs.pop('response') if 'response' in injected else kwargs['response']
+
+        current = await get_version(kwargs['post_id'], kwargs['db'])
+        if current is None:
+            return await func(*args, **kwargs)
+
+        version, updated_at = current
+        headers = {
+            'ETag': f'"post-{kwargs["post_id"]}-v{version}"',
+            'Last-Modified': format_datetime(updated_at, usegmt=True),
+        }
+
+        if request.headers.get('if-none-match'):
+            not_modified = etag_matches(request, headers['ETag'])
+        else:
+            not_modified = not_modified_since(request, updated_at)
+
+        if not_modified:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        with primary(kwargs['db']):
+            result = await func(*args, **kwargs)
+        target = result if isinstance(result, Response) else response
+        target.headers.update(headers)
+        return result
+
+    wrapper.__signature__ = signature
+    return wrapper
+
+
+@events.subscribe(events.POST_CHANGED)
+@events.subscribe(events.COMMENTS_CHANGED)
+async def invalidate_version(post_id: int, user_id: int | None = None) -> None:
+    await version_cache.invalidate(f'post:{post_id}')
+
+
+@events.subscribe(events.TAG_CHANGED)
+async def invalidate_tagged_versions(tag: str, post_ids: Iterable[int] = ()) -> None:
+    # Posts embed their tags, the versions of the posts that had the tag were bumped.
+    await version_cache.invalidate(*(f'post:{post_id}' for post_id in post_ids))
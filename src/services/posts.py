@@ -1,12 +1,25 @@
+import asyncio
+import logging
+from typing import List
 from uuid import uuid4
 import cloudinary
 import cloudinary.uploader
-from fastapi import HTTPException, status
+from fastapi import BackgroundTasks, HTTPException, status
+from PIL import UnidentifiedImageError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from src.conf.config import settings
-from src.database.models import User
-from src.repository.posts import get_post, add_transformed_post, get_transformed_post_by_url
+from src.database.models import Post, User
+from src.repository.media import enqueue_media_deletion
+from src.repository.posts import get_post, add_post, add_posts, post_exists, add_transformed_post, get_transformed_post_by_url
+from src.services.comments import comment_service
+from src.services.duplicates import duplicate_index
+from src.services.images import extract_metadata, image_service
+from src.services.upload_guard import upload_guard
+
+
+logger = logging.getLogger(__name__)
 
 
 class PostService:
@@ -19,12 +32,140 @@ class PostService:
     )
 
 
-    async def upload_post(self, file):
+    async def upload_post(self, file, user: User | None = None, check_duplicates: bool = True):
+        data = await upload_guard.check(file, user)
+
+        try:
+            metadata = await asyncio.to_thread(extract_metadata, data)
+        except (UnidentifiedImageError, OSError):
+            metadata = None
+
+        if metadata and user and check_duplicates and settings.duplicate_short_circuit:
+            duplicates = duplicate_index.find(metadata.phash, user_id=user.id, max_distance=settings.duplicate_short_circuit_distance)
+            if duplicates:
+                return {"duplicate_of": duplicates[0][1], "metadata": metadata}
+
         unique_filename = str(uuid4())
-        public_id = f"SomeFile/{unique_filename}"
-        r = cloudinary.uploader.upload(file.file, public_id=public_id, overwrite=True)
+        public_id = f"{settings.media_prefix}{unique_filename}"
+        r = await asyncio.to_thread(cloudinary.uploader.upload, file.file, public_id=public_id, overwrite=True)
         src_url = cloudinary.CloudinaryImage(public_id).build_url(version=r.get("version"))
-        return {"public_id": public_id, "url": src_url}
+        return {"public_id": public_id, "url": src_url, "metadata": metadata}
+
+
+    async def discard_uploads(self, public_ids: List[str], db: Session) -> None:
+        """
+        Queue uploaded images whose posts could not be created for deletion.
+
+        The failed transaction is rolled back first. If the outbox cannot be written
+        either, the images are left to the media reconciliation.
+
+        :param public_ids: List[str]: Public ids of the uploaded images
+        :param db: Session: Connection to the database
+        :return: None
+        """
+        db.rollback()
+        try:
+            await enqueue_media_deletion(db, *public_ids)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning("Could not queue %s orphaned uploads for deletion: %s", len(public_ids), e)
+
+
+    async def create_post(self, file, description: str, user: User, db: Session, background_tasks: BackgroundTasks) -> tuple[Post, bool]:
+        """
+        Upload the image and create a post for it.
+
+        :return: tuple[Post, bool]: The post and False when an existing post of the same image was returned
+        """
+        post_info = await self.upload_post(file=file, user=user)
+
+        if post_info.get("duplicate_of"):
+            duplicate = await get_post(post_info["duplicate_of"], db)
+            if duplicate:
+                return duplicate, False
+            duplicate_index.remove(post_info["duplicate_of"])
+            post_info = await self.upload_post(file=file, user=user, check_duplicates=False)
+
+        try:
+            post = await add_post(
+                post_url=post_info["url"],
+                public_id=post_info["public_id"],
+                description=description,
+                user=user,
+                db=db,
+            )
+        except Exception:
+            await self.discard_uploads([post_info["public_id"]], db)
+            raise
+        comment_service.remember_post(post.id)
+
+        metadata = post_info.get("metadata")
+        if metadata:
+            duplicate_index.add(post.id, metadata.phash, user.id)
+            background_tasks.add_task(image_service.ingest, post.id, post_info["public_id"], metadata)
+        return post, True
+
+
+    async def create_posts(self, files: List, descriptions: List[str], user: User, db: Session, background_tasks: BackgroundTasks) -> List[dict]:
+        """
+        Upload several images concurrently and create their posts with one insert.
+
+        At most posts_batch_concurrency uploads run at once. A failed file does not
+        fail the others. If the posts cannot be created, the uploaded images are
+        queued for deletion.
+
+        :return: List[dict]: index, filename, status_code and either post or detail of every file
+        """
+        semaphore = asyncio.Semaphore(settings.posts_batch_concurrency)
+
+        async def upload(file):
+            async with semaphore:
+                post_info = await self.upload_post(file=file, user=user)
+                if post_info.get("duplicate_of") and not await post_exists(post_info["duplicate_of"], db):
+                    duplicate_index.remove(post_info["duplicate_of"])
+                    post_info = await self.upload_post(file=file, user=user, check_duplicates=False)
+                return post_info
+
+        uploads = await asyncio.gather(*(upload(file) for file in files), return_exceptions=True)
+
+        results = []
+        created = []
+        for index, (file, post_info) in enumerate(zip(files, uploads)):
+            result = {"index": index, "filename": file.filename}
+            results.append(result)
+
+            if isinstance(post_info, HTTPException):
+                result.update(status_code=post_info.status_code, detail=post_info.detail)
+            elif isinstance(post_info, Exception):
+                logger.warning("Upload of %s failed: %s", file.filename, post_info)
+                result.update(status_code=status.HTTP_502_BAD_GATEWAY, detail="Upload failed")
+            elif post_info.get("duplicate_of"):
+                result.update(status_code=status.HTTP_200_OK, post=await get_post(post_info["duplicate_of"], db))
+            else:
+                result.update(status_code=status.HTTP_201_CREATED)
+                created.append((result, post_info, descriptions[index] if index < len(descriptions) else ""))
+
+        rows = [
+            {"post_url": post_info["url"], "public_id": post_info["public_id"], "description": description}
+            for _, post_info, description in created
+        ]
+        try:
+            posts = await add_posts(rows, user, db)
+        except Exception:
+            await self.discard_uploads([row["public_id"] for row in rows], db)
+            raise
+
+        for (result, post_info, _), post in zip(created, posts):
+            result["post"] = post
+            comment_service.remember_post(post.id)
+
+            metadata = post_info.get("metadata")
+            if metadata:
+                duplicate_index.add(post.id, metadata.phash, user.id)
+                background_tasks.add_task(image_service.ingest, post.id, post_info["public_id"], metadata)
+
+        return results
 
 
     async def resize_post(self, post_id: str, width: int, height: int, user: User, db: Session):
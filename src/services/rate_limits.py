@@ -0,0 +1,291 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import logging
+import math
+import time
+from typing import Awaitable, Callable
+
+from fastapi import Depends, HTTPException, Request, status
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.models import User, UserRole
+from src.services.auth import auth_service
+
+
+logger = logging.getLogger(__name__)
+
+API_KEY_HEADER = 'X-API-Key'
+
+# KEYS[1] bucket hash with the tokens left and the time of the last refill in ms
+# ARGV[1] capacity, ARGV[2] tokens added per ms, ARGV[3] cost of the request
+# Returns allowed (1 or 0), tokens left and ms until the request could be allowed.
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or capacity
+local at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - at) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = math.ceil((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1000)
+return {allowed, math.floor(tokens), wait}
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class Quota:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+    reset: float
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(math.ceil(self.reset)),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class LocalBuckets:
+    """
+    Token buckets kept in this process, used while Redis is unreachable.
+
+    Every process counts on its own, so with several workers a client gets up to
+    that many times its quota until Redis is back. The least recently used
+    buckets are dropped above size entries.
+    """
+
+    def __init__(self, size: int = settings.rate_limit_local_size):
+        self.size = size
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, capacity: int, rate: float, cost: int) -> tuple[bool, float, float]:
+        """
+        Take tokens from the bucket.
+
+        :param key: str: Bucket key
+        :param capacity: int: Tokens of a full bucket
+        :param rate: float: Tokens added per second
+        :param cost: int: Tokens the request takes
+        :return: tuple[bool, float, float]: Allowed, tokens left and seconds until the request could be allowed
+        """
+        now = time.monotonic()
+        tokens, at = self.buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - at) * rate)
+
+        allowed = tokens >= cost
+        wait = 0.0
+        if allowed:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.size:
+            self.buckets.popitem(last=False)
+        return allowed, tokens, wait
+
+
+class RateLimiter:
+    """
+    Token bucket rate limits by route class.
+
+    limits maps a route class, such as transformations or uploads, to the number
+    of requests every tier may make per period seconds. The tier is the role of
+    the user, or the tier of the API key from the X-API-Key header, which has its
+    own bucket shared by all its users. A full bucket allows a burst of the whole
+    quota, after that tokens come back evenly over the period. Buckets live in
+    Redis and are updated by one Lua script per request; while Redis is
+    unreachable the buckets of this process are used instead.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, dict[str, int]] = settings.rate_limits,
+        period: int = settings.rate_limit_period,
+        api_keys: dict[str, str] = settings.rate_limit_api_keys,
+        key_prefix: str = 'ratelimit',
+    ):
+        self.limits = limits
+        self.period = period
+        self.api_keys = api_keys
+        self.key_prefix = key_prefix
+        self.local = LocalBuckets()
+        self.redis = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+        self.token_bucket = self.redis.register_script(TOKEN_BUCKET)
+        self.redis_retry_at = 0.0
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self.redis_retry_at
+
+    def _redis_failed(self, error: RedisError) -> None:
+        logger.warning('Rate limits use local buckets, Redis failed: %s', error)
+        self.redis_retry_at = time.monotonic() + 5
+
+    def capacity(self, route_class: str, tier: str) -> int:
+        """
+        Requests per period the tier may make to the route class.
+
+        :param route_class: str: Route class
+        :param tier: str: User role or API key tier
+        :return: int
+        """
+        limits = self.limits[route_class]
+        return limits.get(tier, limits[UserRole.user.value])
+
+    async def hit(self, route_class: str, identity: str, tier: str, cost: int = 1) -> Quota:
+        """
+        Charge a request to the bucket of the identity.
+
+        :param route_class: str: Route class
+        :param identity: str: Whose bucket it is, e.g. user:1 or key:<digest>
+        :param tier: str: User role or API key tier
+        :param cost: int: Tokens the request takes
+        :return: Quota
+        """
+        capacity = self.capacity(route_class, tier)
+        # A request dearer than a full bucket could never pass, it takes the whole bucket instead.
+        cost = min(cost, capacity)
+        rate = capacity / self.period
+        key = f'{self.key_prefix}:{route_class}:{identity}'
+
+        result = None
+        if self._redis_available():
+            try:
+                allowed, tokens, wait = await self.token_bucket(keys=[key], args=[capacity, rate / 1000, cost])
+                result = bool(allowed), float(tokens), wait / 1000
+            except RedisError as e:
+                self._redis_failed(e)
+        if result is None:
+            result = self.local.take(key, capacity, rate, cost)
+
+        allowed, tokens, wait = result
+        return Quota(
+            allowed=allowed,
+            limit=capacity,
+            remaining=int(tokens),
+            retry_after=wait,
+            reset=(capacity - tokens) / rate,
+        )
+
+
+rate_limiter = RateLimiter()
+password_reset_limiter = RateLimiter(limits=settings.password_reset_limits, period=settings.password_reset_period)
+
+
+class RateLimit:
+    """
+    Dependency that charges the request to the bucket of its route class.
+
+    cost is the tokens a request takes, or an async function of the request that
+    returns them, e.g. the number of files in a batch upload. Requests over the
+    quota get 429 with Retry-After. The quota is left in request.state.rate_limit
+    for RateLimitHeadersMiddleware.
+    """
+
+    def __init__(self, route_class: str, cost: int | Callable[[Request], Awaitable[int]] = 1):
+        if route_class not in rate_limiter.limits:
+            raise ValueError(f'No rate limits for route class {route_class}')
+        self.route_class = route_class
+        self.cost = cost
+
+    async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)):
+        if not settings.rate_limit_enabled:
+            return
+
+        api_key = request.headers.get(API_KEY_HEADER)
+        if api_key is not None:
+            tier = rate_limiter.api_keys.get(api_key)
+            if tier is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unknown API key')
+            identity = 'key:' + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+        else:
+            tier = user.user_role.value if user.user_role else UserRole.user.value
+            identity = f'user:{user.id}'
+
+        cost = self.cost if isinstance(self.cost, int) else await self.cost(request)
+        quota = await rate_limiter.hit(self.route_class, identity, tier, cost)
+        request.state.rate_limit = quota
+        if not quota.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail='Rate limit exceeded, try again later',
+                headers=quota.headers,
+            )
+
+
+async def limit_password_reset(ip: str, email: str) -> None:
+    """
+    Charge a password reset request to the client IP and to the email it is for.
+
+    Reset requests are anonymous, so the buckets are per IP and per email rather
+    than per user: one client cannot send many reset emails, and many clients
+    cannot flood one address. Both are charged whether the account exists or
+    not, so a 429 tells nothing about the email.
+
+    :param ip: str: Client IP
+    :param email: str: Email from the request
+    :return: None
+    """
+    if not settings.rate_limit_enabled:
+        return
+
+    identities = (
+        ('password_reset_ip', f'ip:{ip}'),
+        ('password_reset_email', 'email:' + hashlib.sha256(email.encode()).hexdigest()[:32]),
+    )
+    for route_class, identity in identities:
+        quota = await password_reset_limiter.hit(route_class, identity, UserRole.user.value)
+        if not quota.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail='Too many password reset requests, try again later',
+                headers={'Retry-After': quota.headers['Retry-After']},
+            )
+
+
+class RateLimitHeadersMiddleware:
+    """
+    ASGI middleware that adds the X-RateLimit headers of the quota a RateLimit
+    dependency left in the request state, whatever response the route returned.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault('state', {})
+
+        async def send_with_headers(message):
+            quota = state.get('rate_limit')
+            if message['type'] == 'http.response.start' and quota is not None and quota.allowed:
+                message['headers'] = list(message.get('headers', [])) + [
+                    (name.lower().encode(), value.encode()) for name, value in quota.headers.items()
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
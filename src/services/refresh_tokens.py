@@ -0,0 +1,142 @@
+import hashlib
+import logging
+
+from fastapi import HTTPException, status
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ROTATED = 1
+UNKNOWN = 0
+REUSED = -1
+
+# KEYS[1] family hash, KEYS[2] set of the user's families
+# ARGV[1] hash of the presented token, ARGV[2] hash of the new token, ARGV[3] ttl, ARGV[4] family id
+ROTATE = """
+local current = redis.call('HGET', KEYS[1], 'token')
+if not current then
+    return 0
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[4])
+    return -1
+end
+redis.call('HSET', KEYS[1], 'token', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RefreshTokenStore:
+    """
+    Refresh tokens kept in Redis by token family.
+
+    Logging in starts a family: a random id carried in the fid claim of the
+    tokens and a Redis hash with the SHA-256 of the only refresh token of the
+    family that may still be used. Refreshing swaps that hash for the hash of the
+    new token in one Lua script, so two concurrent refreshes with the same token
+    cannot both succeed. Presenting a token of the family that was already
+    rotated means it was stolen or replayed: the whole family is revoked.
+    Every login is its own family, so a user can have any number of sessions.
+    Families expire refresh_token_ttl seconds after the last rotation.
+    """
+
+    def __init__(self, key_prefix: str = 'refresh', ttl: int = settings.refresh_token_ttl):
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.redis = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+        self.rotate_script = self.redis.register_script(ROTATE)
+
+    def _family_key(self, family_id: str) -> str:
+        return f'{self.key_prefix}:family:{family_id}'
+
+    def _user_key(self, email: str) -> str:
+        return f'{self.key_prefix}:user:{email}'
+
+    def _unavailable(self, error: RedisError) -> HTTPException:
+        logger.warning('Refresh token store failed: %s', error)
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Sessions are temporarily unavailable')
+
+    async def start(self, family_id: str, email: str, token: str) -> None:
+        """
+        Start a token family with its first refresh token.
+
+        :param family_id: str: Family id from the fid claim
+        :param email: str: Email of the user
+        :param token: str: Refresh token
+        :return: None
+        """
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(self._family_key(family_id), mapping={'token': token_hash(token), 'user': email})
+                pipe.expire(self._family_key(family_id), self.ttl)
+                pipe.sadd(self._user_key(email), family_id)
+                pipe.expire(self._user_key(email), self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            raise self._unavailable(e)
+
+    async def rotate(self, family_id: str, email: str, token: str, new_token: str) -> int:
+        """
+        Replace the refresh token of the family if the presented one is current.
+
+        :param family_id: str: Family id from the fid claim
+        :param email: str: Email of the user
+        :param token: str: Presented refresh token
+        :param new_token: str: Refresh token that replaces it
+        :return: int: ROTATED, UNKNOWN for a revoked or expired family, REUSED when an old token was presented
+        """
+        try:
+            result = await self.rotate_script(
+                keys=[self._family_key(family_id), self._user_key(email)],
+                args=[token_hash(token), token_hash(new_token), self.ttl, family_id],
+            )
+        except RedisError as e:
+            raise self._unavailable(e)
+
+        if result == REUSED:
+            logger.warning('Refresh token reuse for %s, family %s revoked', email, family_id)
+        return int(result)
+
+    async def revoke(self, family_id: str, email: str) -> None:
+        """
+        Revoke one session.
+
+        :param family_id: str: Family id from the fid claim
+        :param email: str: Email of the user
+        :return: None
+        """
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(self._family_key(family_id))
+                pipe.srem(self._user_key(email), family_id)
+                await pipe.execute()
+        except RedisError as e:
+            raise self._unavailable(e)
+
+    async def revoke_all(self, email: str) -> None:
+        """
+        Revoke every session of the user.
+
+        :param email: str: Email of the user
+        :return: None
+        """
+        try:
+            family_ids = await self.redis.smembers(self._user_key(email))
+            keys = [self._family_key(family_id.decode()) for family_id in family_ids]
+            await self.redis.delete(self._user_key(email), *keys)
+        except RedisError as e:
+            raise self._unavailable(e)
+
+
+refresh_tokens = RefreshTokenStore()
@@ -0,0 +1,31 @@
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson when it is installed.
+
+    orjson encodes datetimes, enums and dataclasses natively and is several times
+    faster than the standard json module. Without orjson it behaves like JSONResponse.
+    Routes that return trusted repository rows can return this response directly
+    to skip FastAPI response_model validation.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
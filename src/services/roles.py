@@ -1,17 +1,111 @@
+from dataclasses import dataclass, field
+import enum
+
 from fastapi import Request, Depends, HTTPException, status
 
 from src.database.models import UserRole, User
 from src.services.auth import auth_service
 
 
+class Permission(enum.Enum):
+
+    manage_users: str = 'manage_users'
+    change_roles: str = 'change_roles'
+    ban_users: str = 'ban_users'
+    unban_users: str = 'unban_users'
+    edit_any_post: str = 'edit_any_post'
+    edit_tags: str = 'edit_tags'
+    delete_comments: str = 'delete_comments'
+    view_ratings: str = 'view_ratings'
+    delete_ratings: str = 'delete_ratings'
+
+
+MODERATOR_PERMISSIONS = frozenset({
+    Permission.manage_users,
+    Permission.ban_users,
+    Permission.edit_tags,
+    Permission.delete_comments,
+    Permission.view_ratings,
+    Permission.delete_ratings,
+})
+
+# Permissions of every role, computed once so a check is a set lookup.
+ROLE_PERMISSIONS: dict[UserRole, frozenset[Permission]] = {
+    UserRole.user: frozenset(),
+    UserRole.moderator: MODERATOR_PERMISSIONS,
+    UserRole.admin: frozenset(Permission),
+}
+
+
+def can(user: User, permission: Permission) -> bool:
+    """
+    Check the permission against the role of the user.
+
+    :param user: User: User
+    :param permission: Permission: Permission to check
+    :return: bool
+    """
+    return permission in ROLE_PERMISSIONS[user.user_role or UserRole.user]
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    The authenticated user of a request, its token claims and the permissions of its role.
+    """
+
+    user: User
+    claims: dict = field(default_factory=dict)
+    permissions: frozenset[Permission] = frozenset()
+
+    def can(self, permission: Permission) -> bool:
+        return permission in self.permissions
+
+
+async def get_principal(request: Request, user: User = Depends(auth_service.get_current_user)) -> Principal:
+    """
+    Dependency that builds the principal of the request once and keeps it in request.state.principal.
+
+    The user and the claims come from auth_service.get_current_user, which resolves
+    the token once per request, so any number of role checks and routes share one
+    token verification and one user lookup.
+
+    :param request: Request: HTTP request
+    :param user: User: The currently authenticated user
+    :return: Principal
+    """
+    principal = getattr(request.state, 'principal', None)
+    if principal is None or principal.user is not user:
+        principal = Principal(
+            user=user,
+            claims=getattr(request.state, 'claims', {}),
+            permissions=ROLE_PERMISSIONS[user.user_role or UserRole.user],
+        )
+        request.state.principal = principal
+    return principal
+
+
 class RoleAccess:
     def __init__(self, allowed_roles: list[UserRole]):
         self.allowed_roles = allowed_roles
 
-    async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)):
+    async def __call__(self, request: Request, principal: Principal = Depends(get_principal)):
+
+        if principal.user.user_role not in self.allowed_roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You do not have permission"
+            )
+
+
+class PermissionAccess:
+    def __init__(self, permission: Permission):
+        self.permission = permission
+
+    async def __call__(self, request: Request, principal: Principal = Depends(get_principal)):
 
-        if user.user_role not in self.allowed_roles:
+        if not principal.can(self.permission):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission"
-            )
\ No newline at end of file
+            )
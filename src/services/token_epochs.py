@@ -0,0 +1,170 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import hashlib
+import logging
+import time
+
+from fastapi import HTTPException, status
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] epoch of the user, ARGV[1] now in ms. The new epoch is never lower than
+# the clock, so an epoch key that was lost and created again cannot repeat an old epoch.
+BUMP = """
+local epoch = tonumber(redis.call('GET', KEYS[1]) or '0')
+local bumped = math.max(epoch + 1, tonumber(ARGV[1]))
+redis.call('SET', KEYS[1], bumped)
+return bumped
+"""
+
+
+class TokenEpochs:
+    """
+    Per-user token epochs and revoked access tokens in Redis.
+
+    Access tokens carry the epoch of their user at the time they were issued.
+    Banning a user or changing the role bumps the epoch, which makes every access
+    token issued before stale at once. Logging out marks the single token as
+    revoked until it expires. Checking a token is one pipelined round trip.
+
+    The epoch key is created with the current time in ms when a token is issued
+    and bumps never go below the clock. A missing key, e.g. after Redis lost its
+    data, is reported as unknown, so the caller checks the user in the database
+    rather than accepting every old token as current. The keys live in
+    sessions_redis_db, which must not be subject to cache eviction.
+
+    Writes raise 503 when Redis fails, because a ban or a logout that did not
+    reach Redis would not take effect. Reads report Redis as unavailable for five
+    seconds, and the caller checks the user in the database instead.
+    """
+
+    def __init__(self, key_prefix: str = 'token'):
+        self.key_prefix = key_prefix
+        self.redis = redis.Redis(
+            host=settings.sessions_redis_host or settings.redis_host,
+            port=settings.sessions_redis_port or settings.redis_port,
+            db=settings.sessions_redis_db,
+        )
+        self.bump_script = self.redis.register_script(BUMP)
+        self.redis_retry_at = 0.0
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self.redis_retry_at
+
+    def _redis_failed(self, error: RedisError) -> None:
+        logger.warning('Token epochs skipped, Redis failed: %s', error)
+        self.redis_retry_at = time.monotonic() + 5
+
+    def _unavailable(self, error: RedisError) -> HTTPException:
+        logger.warning('Token epochs failed: %s', error)
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Sessions are temporarily unavailable')
+
+    def _epoch_key(self, user_id: int) -> str:
+        return f'{self.key_prefix}:epoch:{user_id}'
+
+    def _revoked_key(self, token: str) -> str:
+        return f'{self.key_prefix}:revoked:' + hashlib.sha256(token.encode()).hexdigest()
+
+    async def current(self, user_id: int) -> int | None:
+        """
+        Current epoch of the user, for a token being issued. A missing epoch is created.
+
+        :param user_id: int: User id
+        :return: int | None: Epoch, None if Redis is unavailable
+        """
+        if not self._redis_available():
+            return None
+
+        key = self._epoch_key(user_id)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, int(time.time() * 1000), nx=True)
+                pipe.get(key)
+                _, epoch = await pipe.execute()
+        except RedisError as e:
+            self._redis_failed(e)
+            return None
+        return int(epoch)
+
+    async def check(self, user_id: int, token: str) -> tuple[int, bool] | None:
+        """
+        Current epoch of the user and whether the token was revoked.
+
+        :param user_id: int: User id from the uid claim
+        :param token: str: Access token
+        :return: tuple[int, bool] | None: Epoch and revoked, None if Redis is unavailable or has no epoch of the user
+        """
+        if not self._redis_available():
+            return None
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(self._epoch_key(user_id))
+                pipe.exists(self._revoked_key(token))
+                epoch, revoked = await pipe.execute()
+        except RedisError as e:
+            self._redis_failed(e)
+            return None
+
+        if epoch is None:
+            # Created when the token was issued, so Redis lost it; epoch 0 would accept stale tokens.
+            return None
+        return int(epoch), bool(revoked)
+
+    async def bump(self, user_id: int) -> int:
+        """
+        Make every access token of the user issued so far stale.
+
+        :param user_id: int: User id
+        :return: int: New epoch
+        """
+        try:
+            return int(await self.bump_script(keys=[self._epoch_key(user_id)], args=[int(time.time() * 1000)]))
+        except RedisError as e:
+            raise self._unavailable(e)
+
+    @asynccontextmanager
+    async def bumped(self, user_id: int):
+        """
+        Context manager for a change of the user that old access tokens must not outlive,
+        such as a ban or a new role.
+
+        The epoch is bumped before the block, so a Redis failure raises 503 before
+        anything is changed. It is bumped again after the block for tokens issued
+        while the change was being made; if that fails, only those tokens keep the
+        old claims and the error is logged.
+
+        :param user_id: int: User id
+        :return: Context manager
+        """
+        await self.bump(user_id)
+        yield
+        try:
+            await self.bump(user_id)
+        except HTTPException:
+            logger.error('Token epoch of user %s was not bumped after the change', user_id)
+
+    async def revoke(self, token: str, expires_at: int | float) -> None:
+        """
+        Revoke one access token until it expires.
+
+        :param token: str: Access token
+        :param expires_at: int | float: exp claim of the token
+        :return: None
+        """
+        ttl = int(expires_at - datetime.now(timezone.utc).timestamp()) + 1
+        if ttl <= 0:
+            return
+
+        try:
+            await self.redis.set(self._revoked_key(token), 1, ex=ttl)
+        except RedisError as e:
+            raise self._unavailable(e)
+
+
+token_epochs = TokenEpochs()
@@ -0,0 +1,241 @@
+import base64
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+import time
+from typing import Any
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jose import JWTError, jwk, jwt
+
+from src.conf.config import settings
+
+try:
+    import jwt as pyjwt
+except ImportError:
+    pyjwt = None
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def unverified_header(token: str) -> dict:
+    """
+    Read the JOSE header of a compact token without verifying it.
+
+    :param token: str: JWT
+    :return: dict: Header
+    """
+    try:
+        header = json.loads(b64url_decode(token.split('.', 1)[0]))
+    except (ValueError, UnicodeDecodeError):
+        raise JWTError('Invalid header')
+    if not isinstance(header, dict):
+        raise JWTError('Invalid header')
+    return header
+
+
+@dataclass(frozen=True, slots=True)
+class TokenKey:
+    kid: str | None
+    algorithm: str
+    backend: str
+    signing_key: Any
+    verifying_key: Any
+    jwk: dict | None
+
+
+class KeySet:
+    """
+    Keys that sign and verify JWTs, identified by the kid header.
+
+    Every {kid}.pem file in jwt_keys_dir is a key: RSA keys sign with RS256 and
+    Ed25519 keys with EdDSA (EdDSA needs PyJWT). Private keys sign and verify,
+    public keys only verify. New tokens are signed with jwt_active_kid, or the
+    last kid in name order, so a key is rotated by adding a newer private key and
+    keeping the old public key until its tokens expire. Public keys are published
+    by jwks() for services that verify tokens without the signing key.
+
+    Without key files tokens are signed with secret_key_jwt and algorithm and
+    carry no kid. Such tokens are accepted while jwt_accept_legacy is on.
+
+    python-jose verifies HS256 and RS256 faster than PyJWT, so with jwt_backend
+    'auto' PyJWT is only used for EdDSA, which python-jose does not support;
+    jwt_backend 'jose' or 'pyjwt' uses one library for all keys.
+    """
+
+    def __init__(
+        self,
+        keys_dir: str | None = settings.jwt_keys_dir,
+        active_kid: str | None = settings.jwt_active_kid,
+        accept_legacy: bool = settings.jwt_accept_legacy,
+        backend: str = settings.jwt_backend,
+    ):
+        if backend == 'pyjwt' and pyjwt is None:
+            raise RuntimeError('jwt_backend is pyjwt but PyJWT is not installed')
+
+        self.backend = backend
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self.accept_legacy = accept_legacy
+        legacy_backend = 'pyjwt' if backend == 'pyjwt' else 'jose'
+        self.legacy = TokenKey(None, settings.algorithm, legacy_backend, settings.secret_key_jwt, settings.secret_key_jwt, None)
+        self.keys: dict[str, TokenKey] = {}
+        self.signing: TokenKey = self.legacy
+        self.load()
+
+    def load(self) -> None:
+        """
+        Read the key files and choose the signing key.
+
+        :return: None
+        """
+        keys = {}
+        if self.keys_dir:
+            for name in sorted(os.listdir(self.keys_dir)):
+                kid, extension = os.path.splitext(name)
+                if extension == '.pem':
+                    with open(os.path.join(self.keys_dir, name), 'rb') as f:
+                        keys[kid] = self.make_key(kid, f.read())
+
+        signing = [kid for kid, key in keys.items() if key.signing_key is not None]
+        active_kid = self.active_kid or (signing[-1] if signing else None)
+        if active_kid and active_kid not in signing:
+            raise ValueError(f'No private key for jwt_active_kid {active_kid}')
+
+        self.keys = keys
+        self.signing = keys[active_kid] if active_kid else self.legacy
+
+    def make_key(self, kid: str, pem: bytes) -> TokenKey:
+        """
+        Build a key from a PEM encoded RSA or Ed25519 private or public key.
+
+        :param kid: str: Key id
+        :param pem: bytes: PEM data
+        :return: TokenKey
+        """
+        if b'PRIVATE KEY' in pem:
+            private_key = serialization.load_pem_private_key(pem, password=None)
+            public_key = private_key.public_key()
+        else:
+            private_key = None
+            public_key = serialization.load_pem_public_key(pem)
+
+        if isinstance(public_key, rsa.RSAPublicKey):
+            algorithm = 'RS256'
+            numbers = public_key.public_numbers()
+            key_jwk = {
+                'kty': 'RSA',
+                'n': b64url(numbers.n.to_bytes((numbers.n.bit_length() + 7) // 8, 'big')),
+                'e': b64url(numbers.e.to_bytes((numbers.e.bit_length() + 7) // 8, 'big')),
+            }
+        elif isinstance(public_key, ed25519.Ed25519PublicKey):
+            if self.backend == 'jose' or pyjwt is None:
+                raise ValueError(f'Key {kid}: EdDSA keys need PyJWT')
+            algorithm = 'EdDSA'
+            raw = public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+            key_jwk = {'kty': 'OKP', 'crv': 'Ed25519', 'x': b64url(raw)}
+        else:
+            raise ValueError(f'Key {kid}: only RSA and Ed25519 keys are supported')
+
+        key_jwk.update({'kid': kid, 'alg': algorithm, 'use': 'sig'})
+
+        if self.backend == 'pyjwt' or algorithm == 'EdDSA':
+            return TokenKey(kid, algorithm, 'pyjwt', private_key, public_key, key_jwk)
+
+        public_pem = public_key.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        signing_key = jwk.construct(pem.decode(), algorithm) if private_key is not None else None
+        return TokenKey(kid, algorithm, 'jose', signing_key, jwk.construct(public_pem.decode(), algorithm), key_jwk)
+
+    def sign(self, claims: dict) -> str:
+        """
+        Sign the claims with the active key.
+
+        :param claims: dict: JWT claims
+        :return: str: Encoded JWT
+        """
+        key = self.signing
+        headers = {'kid': key.kid} if key.kid else None
+        if key.backend == 'pyjwt':
+            return pyjwt.encode(claims, key.signing_key, algorithm=key.algorithm, headers=headers)
+        return jwt.encode(claims, key.signing_key, algorithm=key.algorithm, headers=headers)
+
+    def verify(self, token: str) -> dict:
+        """
+        Verify the signature and expiry of the token with the key named by its kid.
+
+        :param token: str: Encoded JWT
+        :return: dict: Claims
+        """
+        kid = unverified_header(token).get('kid')
+        if kid is None:
+            if not self.accept_legacy:
+                raise JWTError('Token has no key id')
+            key = self.legacy
+        else:
+            key = self.keys.get(kid)
+            if key is None:
+                raise JWTError('Unknown key id')
+
+        if key.backend == 'pyjwt':
+            try:
+                return pyjwt.decode(token, key.verifying_key, algorithms=[key.algorithm], options={'verify_aud': False})
+            except pyjwt.PyJWTError as e:
+                raise JWTError(str(e))
+        return jwt.decode(token, key.verifying_key, algorithms=[key.algorithm])
+
+    def jwks(self) -> dict:
+        """
+        Public keys in JWKS format.
+
+        :return: dict
+        """
+        return {'keys': [key.jwk for key in self.keys.values()]}
+
+
+class VerifiedTokens:
+    """
+    LRU of recently verified tokens and their claims.
+
+    Entries are keyed by a digest of the token and are used until the exp claim,
+    so a client sending the same access token again skips signature verification.
+    """
+
+    def __init__(self, key_set: KeySet, size: int = settings.jwt_cache_size):
+        self.key_set = key_set
+        self.size = size
+        self.entries: OrderedDict[bytes, dict] = OrderedDict()
+
+    def verify(self, token: str) -> dict:
+        """
+        Get the claims of the token, verifying it when it is not cached.
+
+        :param token: str: Encoded JWT
+        :return: dict: Claims
+        """
+        digest = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        claims = self.entries.get(digest)
+        if claims is not None:
+            if claims['exp'] > time.time():
+                self.entries.move_to_end(digest)
+                return claims
+            del self.entries[digest]
+
+        claims = self.key_set.verify(token)
+        if self.size and isinstance(claims.get('exp'), (int, float)):
+            self.entries[digest] = claims
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return claims
+
+
+token_keys = KeySet()
+verified_tokens = VerifiedTokens(token_keys)
@@ -0,0 +1,173 @@
+from collections import Counter
+from io import BytesIO
+import logging
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from PIL import Image, UnidentifiedImageError
+
+from src.conf.config import settings
+from src.database.models import User, UserRole
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Room for multipart boundaries and the other form fields around the file.
+MULTIPART_OVERHEAD = 64 * 1024
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', 0, 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 0, 'png'),
+    (b'GIF87a', 0, 'gif'),
+    (b'GIF89a', 0, 'gif'),
+    (b'BM', 0, 'bmp'),
+    (b'II*\x00', 0, 'tiff'),
+    (b'MM\x00*', 0, 'tiff'),
+)
+AVIF_BRANDS = (b'avif', b'avis')
+
+rejections: Counter = Counter()
+
+
+def sniff_format(header: bytes) -> str | None:
+    """
+    Detect image format by its magic bytes.
+
+    :param header: bytes: First bytes of the file
+    :return: str | None: Format name, None if it is not a known image format
+    """
+    for signature, offset, name in SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            return name
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+
+    if header[4:8] == b'ftyp' and header[8:12] in AVIF_BRANDS:
+        return 'avif'
+
+    return None
+
+
+def reject(status_code: int, reason: str, role: str, detail: str) -> HTTPException:
+    rejections[(reason, role)] += 1
+    logger.info('Upload rejected (%s) for %s: %s', reason, role, detail)
+    return HTTPException(status_code=status_code, detail=detail)
+
+
+class UploadGuard:
+    """
+    Checks run on an uploaded image before it is sent anywhere.
+
+    The file is read in chunks up to the byte limit of the user role, its format
+    is sniffed from the magic bytes and only the image header is parsed to check
+    the dimensions. Rejections raise 413 or 415 and are counted in rejections
+    by (reason, role).
+    """
+
+    def __init__(
+        self,
+        max_bytes: dict[str, int] = settings.upload_max_bytes,
+        max_pixels: dict[str, int] = settings.upload_max_pixels,
+        formats: list[str] = settings.upload_formats,
+    ):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.formats = set(formats)
+
+    @property
+    def body_limit(self) -> int:
+        return max(self.max_bytes.values()) + MULTIPART_OVERHEAD
+
+    async def check(self, file: UploadFile, user: User | None = None) -> bytes:
+        """
+        Read the uploaded image and reject it if it breaks the limits of the user role.
+
+        :param file: UploadFile: Uploaded file
+        :param user: User | None: Uploader, limits of the user role apply without one
+        :return: bytes: Content of the file
+        """
+        role = user.user_role.value if user and user.user_role else UserRole.user.value
+        max_bytes = self.max_bytes.get(role, self.max_bytes[UserRole.user.value])
+        max_pixels = self.max_pixels.get(role, self.max_pixels[UserRole.user.value])
+
+        if file.size is not None and file.size > max_bytes:
+            raise reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, 'size', role, f'File is larger than {max_bytes} bytes')
+
+        chunks = []
+        received = 0
+        await file.seek(0)
+        while chunk := await file.read(CHUNK_SIZE):
+            received += len(chunk)
+            if received > max_bytes:
+                raise reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, 'size', role, f'File is larger than {max_bytes} bytes')
+            chunks.append(chunk)
+        await file.seek(0)
+        data = b''.join(chunks)
+
+        image_format = sniff_format(data[:16])
+        if image_format not in self.formats:
+            raise reject(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, 'format', role, 'File is not a supported image')
+
+        try:
+            # Image.open only parses the header, pixels are not decoded here.
+            with Image.open(BytesIO(data)) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            raise reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, 'dimensions', role, f'Image is larger than {max_pixels} pixels')
+        except (UnidentifiedImageError, OSError):
+            raise reject(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, 'format', role, 'File is not a supported image')
+
+        if width * height > max_pixels:
+            raise reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, 'dimensions', role, f'Image is larger than {max_pixels} pixels')
+
+        return data
+
+
+upload_guard = UploadGuard()
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware that stops reading request bodies at a hard byte cap.
+
+    Requests with a larger Content-Length are answered with 413 before the body
+    is read; chunked bodies are counted while they stream in. This keeps oversized
+    uploads from being spooled before the route and its role limits run.
+    Paths in path_limits, such as batch uploads, get their own cap.
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: dict[str, int] | None = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.path_limits.get(scope['path'].rstrip('/'), self.max_bytes)
+        content_length = dict(scope['headers']).get(b'content-length')
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            rejections[('size', 'request')] += 1
+            response = JSONResponse(
+                {'detail': f'Request body is larger than {max_bytes} bytes'},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > max_bytes:
+                    raise reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, 'size', 'request', f'Request body is larger than {max_bytes} bytes')
+            return message
+
+        await self.app(scope, limited_receive, send)
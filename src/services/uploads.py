@@ -0,0 +1,231 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+import json
+import logging
+import os
+import re
+import time
+from typing import AsyncIterator
+from uuid import uuid4
+
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+from src.database.models import User, UserRole
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ID = re.compile(r'[0-9a-f]{32}')
+
+
+@dataclass
+class UploadSession:
+    id: str
+    user_id: int
+    length: int
+    description: str
+    offset: int = 0
+
+
+class UploadStore:
+    """
+    Resumable uploads kept in local temp storage.
+
+    A session is a {id}.part file with the bytes received so far and a {id}.json
+    file with its metadata. Chunks are written at an explicit offset: a chunk that
+    was already received is acknowledged without writing, a chunk that overlaps the
+    received part only appends its new bytes, and a gap is refused with 409.
+    Sessions not touched for upload_session_ttl seconds are removed by collect().
+    Sessions live on the disk of one instance, so all requests of an upload must
+    reach the same instance or a shared upload_dir.
+    """
+
+    def __init__(self, directory: str = settings.upload_dir, ttl: int = settings.upload_session_ttl):
+        self.directory = directory
+        self.ttl = ttl
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f'{upload_id}.{suffix}')
+
+    def _save(self, session: UploadSession) -> None:
+        path = self._path(session.id, 'json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(asdict(session), f)
+        os.replace(path + '.tmp', path)
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self.locks.setdefault(upload_id, asyncio.Lock())
+
+    async def create(self, length: int, description: str, user: User) -> UploadSession:
+        """
+        Start a new upload.
+
+        :param length: int: Size of the whole file in bytes
+        :param description: str: Description of the post
+        :param user: User: Uploader
+        :return: UploadSession
+        """
+        role = user.user_role.value if user.user_role else UserRole.user.value
+        max_bytes = settings.upload_max_bytes.get(role, settings.upload_max_bytes[UserRole.user.value])
+        if length <= 0 or length > max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f'File must be 1 to {max_bytes} bytes')
+
+        os.makedirs(self.directory, exist_ok=True)
+        session = UploadSession(id=uuid4().hex, user_id=user.id, length=length, description=description)
+        open(self._path(session.id, 'part'), 'wb').close()
+        self._save(session)
+        return session
+
+    async def get(self, upload_id: str, user: User) -> UploadSession:
+        """
+        Get upload of the user.
+
+        :param upload_id: str: Upload id
+        :param user: User: Uploader
+        :return: UploadSession
+        """
+        if not UPLOAD_ID.fullmatch(upload_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Upload not found')
+
+        try:
+            with open(self._path(upload_id, 'json')) as f:
+                session = UploadSession(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Upload not found')
+
+        if session.user_id != user.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Upload not found')
+
+        return session
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes], user: User) -> UploadSession:
+        """
+        Write a chunk received at the offset.
+
+        :param upload_id: str: Upload id
+        :param offset: int: Position of the chunk in the file
+        :param chunks: AsyncIterator[bytes]: Request body
+        :param user: User: Uploader
+        :return: UploadSession: Session with the new offset
+        """
+        await self.get(upload_id, user)
+
+        async with self._lock(upload_id):
+            session = await self.get(upload_id, user)
+
+            if offset > session.offset:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f'Expected offset {session.offset}',
+                    headers={'Upload-Offset': str(session.offset)},
+                )
+
+            skip = session.offset - offset
+            with open(self._path(session.id, 'part'), 'r+b') as f:
+                f.seek(session.offset)
+                try:
+                    async for chunk in chunks:
+                        if skip:
+                            # Bytes before the current offset were received with an earlier attempt.
+                            dropped = min(skip, len(chunk))
+                            chunk = chunk[dropped:]
+                            skip -= dropped
+                        if not chunk:
+                            continue
+                        if session.offset + len(chunk) > session.length:
+                            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail='Chunk exceeds upload length')
+                        f.write(chunk)
+                        session.offset += len(chunk)
+                finally:
+                    # Keep what was written before a failure, the client resumes from there.
+                    f.truncate(session.offset)
+                    self._save(session)
+
+            return session
+
+    @asynccontextmanager
+    async def complete(self, upload_id: str, user: User) -> AsyncIterator[tuple[UploadSession, str]]:
+        """
+        Hold a fully received upload while it is turned into a post.
+
+        The upload is locked for the duration and removed when the block succeeds,
+        so finishing the same upload twice cannot create two posts.
+
+        :param upload_id: str: Upload id
+        :param user: User: Uploader
+        :return: AsyncIterator[tuple[UploadSession, str]]: Session and path of the assembled file
+        """
+        await self.get(upload_id, user)
+
+        async with self._lock(upload_id):
+            session = await self.get(upload_id, user)
+
+            if session.offset != session.length:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f'Upload is incomplete: {session.offset} of {session.length} bytes received',
+                    headers={'Upload-Offset': str(session.offset)},
+                )
+
+            yield session, self._path(session.id, 'part')
+
+        await self.delete(session.id)
+
+    async def delete(self, upload_id: str) -> None:
+        """
+        Remove upload files.
+
+        :param upload_id: str: Upload id
+        :return: None
+        """
+        self.locks.pop(upload_id, None)
+        for suffix in ('part', 'json'):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    async def collect(self) -> int:
+        """
+        Remove uploads not touched for ttl seconds.
+
+        :return: int: Number of removed uploads
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+
+        expired = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            upload_id, _, suffix = name.partition('.')
+            if suffix != 'json':
+                continue
+            try:
+                touched = max(os.path.getmtime(self._path(upload_id, 'json')), os.path.getmtime(self._path(upload_id, 'part')))
+            except OSError:
+                touched = 0
+            lock = self.locks.get(upload_id)
+            if touched < expired and not (lock and lock.locked()):
+                await self.delete(upload_id)
+                removed += 1
+
+        if removed:
+            logger.info('Removed %s abandoned uploads', removed)
+        return removed
+
+    async def monitor(self, interval: float = settings.upload_gc_interval) -> None:
+        """
+        Collect abandoned uploads every interval seconds.
+
+        :param interval: float: Seconds between collections
+        :return: None
+        """
+        while True:
+            await self.collect()
+            await asyncio.sleep(interval)
+
+
+upload_store = UploadStore()
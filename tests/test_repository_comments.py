@@ -3,7 +3,7 @@ import sys
 from dotenv import load_dotenv
 
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime
 from sqlalchemy.orm import Session
 
@@ -13,6 +13,7 @@ load_dotenv()
 from src.repository import comments  # noqa: E402
 from src.schemas.comments import CommentModel  # noqa: E402
 from src.database.models import User, Comment  # noqa: E402
+from src.repository.read_models import CommentRecord  # noqa: E402
 
 
 class TestComments(unittest.IsolatedAsyncioTestCase):
@@ -39,6 +40,47 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.post_id, 1)
         self.assertEqual(result.user_id, 1)
 
+    async def test_create_comments(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_comments = [MagicMock(spec=Comment), MagicMock(spec=Comment)]
+        mock_session.scalars().all.return_value = mock_comments
+        rows = [
+            {"comment_text": "First", "created_at": datetime(2022, 1, 1), "post_id": 1, "user_id": 1},
+            {"comment_text": "Second", "created_at": datetime(2022, 1, 1), "post_id": 1, "user_id": 2},
+        ]
+
+        result = await comments.create_comments(mock_session, rows)
+
+        self.assertEqual(mock_session.scalars.call_args.args[1], rows)
+        mock_session.commit.assert_called_once()
+        self.assertEqual(result, mock_comments)
+
+    async def test_create_comments_bumps_each_post_once(self):
+
+        mock_session = MagicMock(spec=Session)
+        rows = [
+            {"comment_text": f"Comment {i}", "created_at": datetime(2022, 1, 1), "post_id": 1 + i % 2, "user_id": i}
+            for i in range(10)
+        ]
+
+        with patch('src.repository.comments.bump_post_version', AsyncMock()) as bump_post_version:
+            await comments.create_comments(mock_session, rows)
+
+        bump_post_version.assert_awaited_once()
+        self.assertEqual(sorted(bump_post_version.await_args.args[1:]), [1, 2])
+        self.assertIs(bump_post_version.await_args.args[0], mock_session)
+
+    async def test_create_comments_empty(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        result = await comments.create_comments(mock_session, [])
+
+        mock_session.scalars.assert_not_called()
+        mock_session.commit.assert_not_called()
+        self.assertEqual(result, [])
+
     async def test_get_comment(self):
 
         mock_session = MagicMock(spec=Session)
@@ -85,20 +127,86 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
 
         self.assertIsInstance(result, Comment)
 
+    async def test_delete_comments(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute.return_value.all.return_value = [(1, 1), (1, 2)]
+
+        result = await comments.delete_comments(mock_session, [1, 2])
+
+        self.assertEqual(mock_session.execute.call_count, 2)
+        mock_session.commit.assert_called_once()
+        self.assertEqual(result, 2)
+
     async def test_get_comments_for_post(self):
         
         mock_session = MagicMock(spec=Session)
-        mock_comments = [MagicMock(spec=Comment), MagicMock(spec=Comment)]
-        mock_session.query().filter().all.return_value = mock_comments
-
-        result = await comments.get_comments_for_post(1, mock_session)
+        mock_session.execute().all.return_value = [
+            (1, "First", datetime(2022, 1, 1), None, 1, 1),
+            (2, "Second", datetime(2022, 1, 2), None, 1, 2),
+        ]
 
-        mock_session.query().filter().all.assert_called_once()
+        result = await comments.get_comments_for_post(1, mock_session, limit=2)
 
         self.assertIsInstance(result, list)
-        self.assertIsInstance(result[0], Comment)
-        self.assertIsInstance(result[1], Comment)
+        self.assertIsInstance(result[0], CommentRecord)
+        self.assertEqual(result[0].comment_text, "First")
+        self.assertEqual(result[1].user_id, 2)
+
+    async def test_get_comments_for_post_after_cursor(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute.return_value.all.return_value = [(6, "Next", datetime(2022, 1, 2), None, 1, 1)]
+
+        result = await comments.get_comments_for_post(1, mock_session, limit=10, after=(datetime(2022, 1, 1), 5))
+
+        query = mock_session.execute.call_args.args[0]
+        self.assertIn("(comments.created_at, comments.id) >", str(query))
+        self.assertEqual(result, [CommentRecord(6, "Next", datetime(2022, 1, 2), None, 1, 1)])
+
+    async def test_iter_comments_for_post(self):
+
+        first = MagicMock(spec=Comment, id=1, created_at=datetime(2022, 1, 1))
+        second = MagicMock(spec=Comment, id=2, created_at=datetime(2022, 1, 2))
+        third = MagicMock(spec=Comment, id=3, created_at=datetime(2022, 1, 3))
+
+        with patch('src.repository.comments.get_comments_for_post') as mock_get_page:
+            mock_get_page.side_effect = [[first, second], [third]]
+
+            result = [comment async for comment in comments.iter_comments_for_post(1, MagicMock(spec=Session), page_size=2)]
+
+        self.assertEqual(result, [first, second, third])
+        self.assertEqual(mock_get_page.call_args_list[1].kwargs['after'], (datetime(2022, 1, 2), 2))
+
+    async def test_count_comments_for_posts(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute().all.return_value = [(1, 3), (2, 1)]
+
+        result = await comments.count_comments_for_posts([1, 2, 3], mock_session)
+
+        self.assertEqual(result, {1: 3, 2: 1})
+
+    async def test_get_latest_comment_rows_for_posts(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute().all.return_value = [(1, 5, 'newest'), (1, 6, 'older'), (2, 5, 'only')]
+
+        result = await comments.get_latest_comment_rows_for_posts([1, 2], mock_session, limit=3)
+
+        self.assertEqual(result, {
+            1: [{'user_id': 5, 'comment': 'newest'}, {'user_id': 6, 'comment': 'older'}],
+            2: [{'user_id': 5, 'comment': 'only'}],
+        })
+
+    async def test_get_latest_comment_rows_for_posts_empty(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        result = await comments.get_latest_comment_rows_for_posts([], mock_session)
 
+        mock_session.execute.assert_not_called()
+        self.assertEqual(result, {})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,57 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import OutgoingEmail  # noqa: E402
+from src.repository import email  # noqa: E402
+
+
+class TestEmail(unittest.IsolatedAsyncioTestCase):
+
+    async def test_enqueue_email(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        result = await email.enqueue_email(mock_session, "test@example.com", "Subject", "email_template.html", {"username": "test"})
+
+        self.assertIsInstance(result, OutgoingEmail)
+        self.assertEqual(result.recipient, "test@example.com")
+        self.assertEqual(result.attempts, 0)
+        mock_session.add.assert_called_once_with(result)
+        mock_session.commit.assert_called_once()
+
+    async def test_get_due_emails(self):
+
+        mock_session = MagicMock(spec=Session)
+        outgoing = OutgoingEmail(recipient="test@example.com")
+        mock_session.scalars.return_value.all.return_value = [outgoing]
+
+        result = await email.get_due_emails(mock_session, 50)
+
+        self.assertEqual(result, [outgoing])
+
+    async def test_complete_emails(self):
+
+        mock_session = MagicMock(spec=Session)
+        sent = OutgoingEmail(id=1, recipient="sent@example.com", attempts=0, next_attempt_at=datetime(2022, 1, 1))
+        failed = OutgoingEmail(id=2, recipient="failed@example.com", attempts=1, next_attempt_at=datetime(2022, 1, 1))
+
+        await email.complete_emails(mock_session, [sent, failed], {2: "error"}, 10)
+
+        mock_session.execute.assert_called_once()
+        mock_session.commit.assert_called_once()
+        self.assertEqual(failed.attempts, 2)
+        self.assertEqual(failed.last_error, "error")
+        self.assertGreater(failed.next_attempt_at, datetime.now())
+
+
+if __name__ == '__main__':
+    unittest.main()
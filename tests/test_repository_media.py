@@ -0,0 +1,74 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import MediaDeletion  # noqa: E402
+from src.repository import media  # noqa: E402
+
+
+class TestMedia(unittest.IsolatedAsyncioTestCase):
+
+    async def test_enqueue_media_deletion(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.scalars.return_value.all.return_value = ["queued"]
+
+        await media.enqueue_media_deletion(mock_session, "queued", "new")
+
+        added = mock_session.add_all.call_args[0][0]
+        self.assertEqual([deletion.public_id for deletion in added], ["new"])
+        mock_session.commit.assert_not_called()
+
+    async def test_enqueue_media_deletion_without_ids(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        await media.enqueue_media_deletion(mock_session)
+
+        mock_session.scalars.assert_not_called()
+        mock_session.add_all.assert_not_called()
+
+    async def test_get_due_media_deletions(self):
+
+        mock_session = MagicMock(spec=Session)
+        deletion = MediaDeletion(public_id="public_id")
+        mock_session.scalars.return_value.all.return_value = [deletion]
+
+        result = await media.get_due_media_deletions(mock_session, 100)
+
+        self.assertEqual(result, [deletion])
+
+    async def test_complete_media_deletions(self):
+
+        mock_session = MagicMock(spec=Session)
+        done = MediaDeletion(id=1, public_id="done", attempts=0, next_attempt_at=datetime(2022, 1, 1))
+        failed = MediaDeletion(id=2, public_id="failed", attempts=2, next_attempt_at=datetime(2022, 1, 1))
+
+        await media.complete_media_deletions(mock_session, [done, failed], {"failed": "error"}, 10)
+
+        mock_session.execute.assert_called_once()
+        mock_session.commit.assert_called_once()
+        self.assertEqual(failed.attempts, 3)
+        self.assertEqual(failed.last_error, "error")
+        self.assertGreater(failed.next_attempt_at, datetime.now())
+
+    async def test_get_referenced_public_ids(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.scalars.return_value.all.side_effect = [["post"], ["queued"]]
+
+        result = await media.get_referenced_public_ids(mock_session, ["post", "queued", "orphan"])
+
+        self.assertEqual(result, {"post", "queued"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import MagicMock, patch
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import PostImage  # noqa: E402
+from src.repository import post_images  # noqa: E402
+from src.repository.read_models import ImageRecord  # noqa: E402
+
+
+class TestPostImages(unittest.IsolatedAsyncioTestCase):
+
+    async def test_add_post_image(self):
+
+        mock_session = MagicMock(spec=Session)
+        thumbnails = [{"width": 150, "format": "webp", "url": "thumb_url"}]
+
+        with patch('src.repository.post_images.events.emit') as mock_emit:
+            result = await post_images.add_post_image(mock_session, 1, 800, 600, 1, "ce0ff00ff00bf00b", thumbnails)
+
+        self.assertIsInstance(result, PostImage)
+        self.assertEqual(result.post_id, 1)
+        self.assertEqual(result.thumbnails, thumbnails)
+        mock_session.add.assert_called_once_with(result)
+        mock_session.execute.assert_called_once()
+        mock_session.commit.assert_called_once()
+        mock_emit.assert_called_once()
+
+    async def test_get_images_for_posts(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute.return_value.all.return_value = [(1, 800, 600, [])]
+
+        result = await post_images.get_images_for_posts([1, 2], mock_session)
+
+        self.assertEqual(result, {1: ImageRecord(800, 600, [])})
+
+    async def test_get_images_for_posts_empty(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        result = await post_images.get_images_for_posts([], mock_session)
+
+        self.assertEqual(result, {})
+        mock_session.execute.assert_not_called()
+
+    async def test_get_post_hashes(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute.return_value.all.return_value = [(1, 2, "ce0ff00ff00bf00b")]
+
+        result = await post_images.get_post_hashes(mock_session)
+
+        self.assertEqual(result, [(1, 2, "ce0ff00ff00bf00b")])
+        mock_session.execute.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.repository import post_versions  # noqa: E402
+
+
+class TestPostVersions(unittest.IsolatedAsyncioTestCase):
+
+    async def test_bump_post_version(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        await post_versions.bump_post_version(mock_session, 1, 2)
+
+        mock_session.execute.assert_called_once()
+        mock_session.commit.assert_not_called()
+
+    async def test_bump_post_version_without_posts(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        await post_versions.bump_post_version(mock_session)
+
+        mock_session.execute.assert_not_called()
+
+    async def test_get_post_version(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute().first.return_value = (3, datetime(2022, 1, 1))
+
+        result = await post_versions.get_post_version(1, mock_session)
+
+        self.assertEqual(result, (3, datetime(2022, 1, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ import sys
 from dotenv import load_dotenv
 
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime
 from sqlalchemy.orm import Session
 
@@ -12,6 +12,7 @@ load_dotenv()
 
 from src.repository import posts  # noqa: E402
 from src.database.models import User, Post, Tag, TransformedPost  # noqa: E402
+from src.repository.read_models import ImageRecord, PostRecord, TagRecord  # noqa: E402
 
 
 class TestPostsRepository(unittest.IsolatedAsyncioTestCase):
@@ -23,7 +24,7 @@ class TestPostsRepository(unittest.IsolatedAsyncioTestCase):
         mock_user = MagicMock(spec=User)
         mock_user.id = 1
 
-        with patch('src.repository.posts.cloudinary.uploader') as mock_uploader:
+        with patch('src.repository.posts.events.emit'):
     
             result = await posts.add_post("post_url", "public_id", "description", mock_user, mock_session)
 
@@ -39,6 +40,39 @@ class TestPostsRepository(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(result.created_at, datetime(2022, 1, 1))
             self.assertEqual(result.updated_at, datetime(2022, 1, 1))
 
+    async def test_add_posts(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_user = MagicMock(spec=User)
+        mock_user.id = 1
+        mock_session.execute.return_value.all.return_value = [
+            (1, "url_1", 1, datetime(2022, 1, 1), datetime(2022, 1, 1), "Post 1", 0.0),
+            (2, "url_2", 1, datetime(2022, 1, 1), datetime(2022, 1, 1), "Post 2", 0.0),
+        ]
+        rows = [
+            {"post_url": "url_1", "public_id": "public_id_1", "description": "Post 1"},
+            {"post_url": "url_2", "public_id": "public_id_2", "description": "Post 2"},
+        ]
+
+        with patch('src.repository.posts.events.emit') as mock_emit:
+            result = await posts.add_posts(rows, mock_user, mock_session)
+
+        mock_session.execute.assert_called_once()
+        self.assertEqual(mock_session.execute.call_args[0][1][0]["user_id"], 1)
+        mock_session.commit.assert_called_once()
+        self.assertEqual([post.id for post in result], [1, 2])
+        self.assertIsInstance(result[0], PostRecord)
+        self.assertEqual(mock_emit.call_count, 2)
+
+    async def test_add_posts_empty(self):
+
+        mock_session = MagicMock(spec=Session)
+
+        result = await posts.add_posts([], MagicMock(spec=User), mock_session)
+
+        self.assertEqual(result, [])
+        mock_session.execute.assert_not_called()
+
     @patch('src.repository.posts.datetime')
     async def test_delete_post(self, mock_datetime):
      
@@ -49,14 +83,14 @@ class TestPostsRepository(unittest.IsolatedAsyncioTestCase):
         mock_post.public_id = "public_id"
         mock_session.query().filter().first.return_value = mock_post
 
-        with patch('src.repository.posts.cloudinary.uploader') as mock_uploader:
+        with patch('src.repository.posts.enqueue_media_deletion') as mock_enqueue:
             
             result = await posts.delete_post(1, mock_session)
 
             mock_session.query().filter().first.assert_called_once()
             mock_session.delete.assert_called_once_with(mock_post)
             mock_session.commit.assert_called_once()
-            mock_uploader.destroy.assert_called_once_with("public_id")
+            mock_enqueue.assert_called_once_with(mock_session, "public_id")
 
             self.assertEqual(result, mock_post)
 
@@ -81,25 +115,38 @@ class TestPostsRepository(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_user_posts(self):
      
-        mock_post = MagicMock(spec=Post)
-
         user_id = 1
 
         posts_data = [
-            mock_post(id=1, user_id=1, title="Post 1", content="Content 1"),
-            mock_post(id=2, user_id=1, title="Post 2", content="Content 2")
+            (1, "url_1", 1, datetime(2022, 1, 1), None, "Post 1", 0.0),
+            (2, "url_2", 1, datetime(2022, 1, 2), None, "Post 2", 4.5),
         ]
 
         mock_session = MagicMock(spec=Session)
-        mock_session.query.return_value.filter.return_value.all.return_value = posts_data
+        thumbnails = [{"width": 150, "format": "webp", "url": "thumb_url"}]
+        mock_session.execute.return_value.all.side_effect = [posts_data, [(1, 7, "nature")], [(1, 800, 600, thumbnails)]]
 
         result = await posts.get_user_posts(user_id, mock_session)
 
-        self.assertEqual(result, posts_data)
-        self.assertEqual(result[0].user_id, posts_data[0].user_id)
+        self.assertEqual(len(result), 2)
+        self.assertIsInstance(result[0], PostRecord)
+        self.assertEqual(result[0].user_id, 1)
+        self.assertEqual(result[0].tags, (TagRecord(7, "nature"),))
+        self.assertEqual(result[1].tags, ())
+        self.assertEqual(result[0].image, ImageRecord(800, 600, thumbnails))
+        self.assertIsNone(result[1].image)
+        self.assertEqual(mock_session.execute.call_count, 3)
+        mock_session.query.assert_not_called()
+
+    async def test_get_user_posts_empty(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.execute.return_value.all.return_value = []
+
+        result = await posts.get_user_posts(1, mock_session)
 
-        mock_session.query.assert_called_once_with(Post)
-        mock_session.query.return_value.filter.return_value.all.assert_called_once()
+        self.assertEqual(result, [])
+        mock_session.execute.assert_called_once()
 
     async def test_get_post(self):
        
@@ -116,13 +163,12 @@ class TestPostsRepository(unittest.IsolatedAsyncioTestCase):
     async def test_get_post_url(self):
      
         mock_session = MagicMock(spec=Session)
-        mock_post = MagicMock(spec=Post)
-        mock_post.post_url = "post_url"
-        mock_session.query().filter().first.return_value = mock_post
+        mock_session.query().filter().scalar.return_value = "post_url"
 
         result = await posts.get_post_url(1, mock_session)
 
-        mock_session.query().filter().first.assert_called_once()
+        mock_session.query.assert_called_with(Post.post_url)
+        mock_session.query().filter().scalar.assert_called_once()
 
         self.assertEqual(result, "post_url")
 
@@ -188,15 +234,94 @@ class TestPostsRepository(unittest.IsolatedAsyncioTestCase):
     async def test_get_transformed_post_url(self):
      
         mock_session = MagicMock(spec=Session)
-        mock_transformed_post = MagicMock(spec=TransformedPost)
-        mock_transformed_post.transformed_post_url = "transformed_post_url"
-        mock_session.query().filter().first.return_value = mock_transformed_post
+        mock_session.query().filter().scalar.return_value = "transformed_post_url"
 
         result = await posts.get_transformed_post_url(1, mock_session)
 
-        mock_session.query().filter().first.assert_called_once()
+        mock_session.query.assert_called_with(TransformedPost.transformed_post_url)
+        mock_session.query().filter().scalar.assert_called_once()
 
         self.assertEqual(result, "transformed_post_url")
 
+    async def test_get_post_owner(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.query().filter().first.return_value = (2,)
+
+        result = await posts.get_post_owner(1, mock_session)
+
+        mock_session.query.assert_called_with(Post.user_id)
+        self.assertEqual(result, (2,))
+
+    async def test_get_post_owner_not_found(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.query().filter().first.return_value = None
+
+        result = await posts.get_post_owner(1, mock_session)
+
+        self.assertIsNone(result)
+
+    async def test_get_post_average_rating(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.query().filter().first.return_value = (4.5,)
+
+        result = await posts.get_post_average_rating(1, mock_session)
+
+        mock_session.query.assert_called_with(Post.average_rating)
+        self.assertEqual(result, (4.5,))
+
+    async def test_post_exists(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.query().scalar.return_value = True
+
+        result = await posts.post_exists(1, mock_session)
+
+        self.assertTrue(result)
+
+    async def test_get_post_ids(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.scalars().all.return_value = [1, 2, 3]
+
+        result = await posts.get_post_ids(mock_session)
+
+        self.assertEqual(result, [1, 2, 3])
+
+    async def test_search_posts_rows(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.query().order_by().all.return_value = [(1, "post_url", "description")]
+        mock_session.execute.return_value.all.side_effect = [[(1, 4.5)], [(1, "nature"), (1, "sea")], [(1, 800, 600, [])]]
+
+        with patch('src.repository.posts.repository_comments') as mock_comments:
+            mock_comments.count_comments_for_posts = AsyncMock(return_value={1: 2})
+            mock_comments.get_latest_comment_rows_for_posts = AsyncMock(return_value={1: [{"user_id": 2, "comment": "Nice"}]})
+
+            result = await posts.search_posts_rows(mock_session)
+
+        self.assertEqual(result, {"posts": [{
+            "id": 1,
+            "url": "post_url",
+            "description": "description",
+            "average_rating": 4.5,
+            "tags": ["nature", "sea"],
+            "comments_count": 2,
+            "comments": [{"user_id": 2, "comment": "Nice"}],
+            "image": {"width": 800, "height": 600, "thumbnails": []},
+        }]})
+
+    async def test_search_posts_rows_empty(self):
+
+        mock_session = MagicMock(spec=Session)
+        mock_session.query().filter().order_by().all.return_value = []
+
+        result = await posts.search_posts_rows(mock_session, keyword="nothing")
+
+        mock_session.execute.assert_not_called()
+        self.assertEqual(result, {"posts": []})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
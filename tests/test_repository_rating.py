@@ -13,6 +13,7 @@ load_dotenv()
 
 from src.repository import rating  # noqa: E402
 from src.database.models import PostRating, User, Post  # noqa: E402
+from src.repository.read_models import RatingRecord  # noqa: E402
 
 
 class TestRatingRepository(unittest.IsolatedAsyncioTestCase):
@@ -82,16 +83,15 @@ class TestRatingRepository(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_user_ratings(self):
         mock_session = MagicMock(spec=Session)
-        mock_ratings = [MagicMock(spec=PostRating), MagicMock(spec=PostRating)]
-        mock_session.query().filter().all.return_value = mock_ratings
+        mock_session.execute().all.return_value = [(1, 10, 5, 1), (2, 11, 3, 1)]
 
         result = await rating.get_user_ratings(1, mock_session)
 
-        self.assertEqual(result, mock_ratings)
+        self.assertEqual(result, [RatingRecord(1, 10, 5, 1), RatingRecord(2, 11, 3, 1)])
 
     async def test_get_user_ratings_not_found(self):
         mock_session = MagicMock(spec=Session)
-        mock_session.query().filter().all.return_value = []
+        mock_session.execute().all.return_value = []
 
         with self.assertRaises(HTTPException) as context:
             await rating.get_user_ratings(1, mock_session)
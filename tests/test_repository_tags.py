@@ -4,8 +4,9 @@ from dotenv import load_dotenv
 import asyncio
 
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi import HTTPException, status
+from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -13,7 +14,8 @@ load_dotenv()
 
 from src.repository import tags  # noqa: E402
 from src.schemas.tags import TagModel  # noqa: E402
-from src.database.models import Tag  # noqa: E402
+from src.database.models import Base, Post, Tag, User  # noqa: E402
+from src.services import events  # noqa: E402
 
 
 class TestTagRepository(unittest.IsolatedAsyncioTestCase):
@@ -82,6 +84,58 @@ class TestTagRepository(unittest.IsolatedAsyncioTestCase):
         deleted_tag = await tags.delete_tag(mock_db, tag_id)
         self.assertEqual(deleted_tag.id, tag_id)
 
+    async def test_get_tags_for_post(self):
+        mock_db = MagicMock(spec=Session)
+        post_tags = [Tag(id=1, tag="nature"), Tag(id=2, tag="sea")]
+        mock_db.query.return_value.join.return_value.filter.return_value.all.return_value = post_tags
+
+        result = await tags.get_tags_for_post(1, mock_db)
+
+        mock_db.query.assert_called_once_with(Tag)
+        self.assertEqual(result, post_tags)
+
+
+class TestTagChangesBumpPosts(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = Session(engine)
+        self.addCleanup(self.db.close)
+
+        tag = Tag(id=1, tag='cats')
+        self.db.add(User(id=1, username='user', email='user@example.com', password='secret'))
+        self.db.add_all([
+            Post(id=1, post_url='url', public_id='a', user_id=1, tags=[tag]),
+            Post(id=2, post_url='url', public_id='b', user_id=1, tags=[tag]),
+            Post(id=3, post_url='url', public_id='c', user_id=1),
+        ])
+        self.db.commit()
+
+        self.handler = AsyncMock()
+        patcher = patch.dict(events.handlers, {events.TAG_CHANGED: [self.handler]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def versions(self):
+        self.db.expire_all()
+        return {post.id: post.version for post in self.db.query(Post).all()}
+
+    async def test_update_tag(self):
+
+        await tags.update_tag(self.db, 1, TagModel(tag='kittens'))
+
+        self.assertEqual(self.versions(), {1: 2, 2: 2, 3: 1})
+        self.handler.assert_any_await(tag='cats', post_ids=[1, 2])
+        self.handler.assert_any_await(tag='kittens', post_ids=[1, 2])
+
+    async def test_delete_tag(self):
+
+        await tags.delete_tag(self.db, 1)
+
+        self.assertEqual(self.versions(), {1: 2, 2: 2, 3: 1})
+        self.handler.assert_awaited_once_with(tag='cats', post_ids=[1, 2])
+
 
 if __name__ == '__main__':
     unittest.main()
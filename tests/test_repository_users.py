@@ -38,6 +38,7 @@ class TestUserRepository(unittest.IsolatedAsyncioTestCase):
         result = await users.create_user(user_model, mock_db_session)
         
         self.assertIsInstance(result, User)
+        self.assertIsNone(result.avatar)
         
         mock_db_session.add.assert_called_once()
         mock_db_session.commit.assert_called_once()
@@ -56,13 +57,24 @@ class TestUserRepository(unittest.IsolatedAsyncioTestCase):
     async def test_confirmed_email(self):
        
         mock_db_session = MagicMock(spec=Session)
-        mock_user = MagicMock(spec=User)
+        mock_db_session.execute.return_value.scalar_one_or_none.return_value = 1
        
-        await users.confirmed_email("test@example.com", mock_db_session)
+        result = await users.confirmed_email("test@example.com", mock_db_session)
         
-        mock_user.confirmed = True
+        self.assertEqual(result, 1)
+        mock_db_session.execute.assert_called_once()
         mock_db_session.commit.assert_called_once()
 
+    async def test_confirmed_email_already_confirmed(self):
+
+        mock_db_session = MagicMock(spec=Session)
+        mock_db_session.execute.return_value.scalar_one_or_none.return_value = None
+
+        result = await users.confirmed_email("test@example.com", mock_db_session)
+
+        self.assertIsNone(result)
+        mock_db_session.execute.assert_called_once()
+
     async def test_update_avatar_url(self):
       
         mock_db_session = MagicMock(spec=Session)
@@ -0,0 +1,199 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.db import get_db  # noqa: E402
+from src.database.models import User  # noqa: E402
+from src.routes.auth import router  # noqa: E402
+from src.services import rate_limits  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.rate_limits import LocalBuckets, limit_password_reset  # noqa: E402
+
+
+class TestPasswordResetRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.user = User(id=1, username='user', email='user@example.com', password='hashed-old', is_active=True)
+
+        async def update_password(user, password, db):
+            user.password = password
+
+        self.mocks = {
+            'get_user_by_email': AsyncMock(return_value=self.user),
+            'update_password': AsyncMock(side_effect=update_password),
+            'send_reset_password_email': AsyncMock(),
+            'limit_password_reset': AsyncMock(),
+            'revoke_all': AsyncMock(),
+            'bump': AsyncMock(),
+            'succeeded': AsyncMock(),
+        }
+        for patcher in (
+            patch('src.repository.users.get_user_by_email', self.mocks['get_user_by_email']),
+            patch('src.repository.users.update_password', self.mocks['update_password']),
+            patch('src.routes.auth.send_reset_password_email', self.mocks['send_reset_password_email']),
+            patch('src.routes.auth.limit_password_reset', self.mocks['limit_password_reset']),
+            patch('src.routes.auth.refresh_tokens.revoke_all', self.mocks['revoke_all']),
+            patch('src.routes.auth.token_epochs.bump', self.mocks['bump']),
+            patch('src.routes.auth.login_guard.succeeded', self.mocks['succeeded']),
+            patch.object(auth_service, 'get_password_hash', lambda password: f'hashed-{password}'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        app = FastAPI()
+        app.include_router(router, prefix='/api')
+        app.dependency_overrides[get_db] = lambda: MagicMock(spec=Session)
+        self.client = TestClient(app)
+
+    def test_request_reset_password(self):
+
+        response = self.client.post('/api/auth/request_reset_password', json={'email': 'user@example.com'})
+
+        self.assertEqual(response.status_code, 200)
+        self.mocks['limit_password_reset'].assert_awaited_once_with('testclient', 'user@example.com')
+        self.mocks['send_reset_password_email'].assert_awaited_once()
+        self.assertIs(self.mocks['send_reset_password_email'].await_args.args[0], self.user)
+
+    def test_request_for_unknown_email_gets_same_answer(self):
+
+        known = self.client.post('/api/auth/request_reset_password', json={'email': 'user@example.com'})
+        self.mocks['get_user_by_email'].return_value = None
+        unknown = self.client.post('/api/auth/request_reset_password', json={'email': 'other@example.com'})
+
+        self.assertEqual(unknown.status_code, 200)
+        self.assertEqual(unknown.json(), known.json())
+        self.mocks['send_reset_password_email'].assert_awaited_once()
+
+    def test_request_for_banned_user_sends_nothing(self):
+
+        self.user.is_active = False
+
+        response = self.client.post('/api/auth/request_reset_password', json={'email': 'user@example.com'})
+
+        self.assertEqual(response.status_code, 200)
+        self.mocks['send_reset_password_email'].assert_not_awaited()
+
+    def test_throttled_request_looks_nothing_up(self):
+
+        self.mocks['limit_password_reset'].side_effect = HTTPException(status_code=429, headers={'Retry-After': '60'})
+
+        response = self.client.post('/api/auth/request_reset_password', json={'email': 'user@example.com'})
+
+        self.assertEqual(response.status_code, 429)
+        self.mocks['get_user_by_email'].assert_not_awaited()
+        self.mocks['send_reset_password_email'].assert_not_awaited()
+
+    def test_form(self):
+
+        token = auth_service.create_reset_token(self.user)
+
+        response = self.client.get(f'/api/auth/reset_password/{token}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('text/html', response.headers['content-type'])
+        self.assertIn(f'action="/api/auth/reset_password/{token}"', response.text)
+
+    def test_form_with_invalid_token(self):
+
+        self.assertEqual(self.client.get('/api/auth/reset_password/not-a-token').status_code, 400)
+
+    def test_reset_password(self):
+
+        token = auth_service.create_reset_token(self.user)
+
+        response = self.client.post(f'/api/auth/reset_password/{token}', data={'password': 'newpass'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user.password, 'hashed-newpass')
+        self.mocks['revoke_all'].assert_awaited_once_with('user@example.com')
+        self.assertEqual(self.mocks['bump'].await_count, 2)
+        self.mocks['succeeded'].assert_awaited_once_with('user@example.com')
+
+        # The token is bound to the old password, so it cannot be used twice.
+        reused = self.client.post(f'/api/auth/reset_password/{token}', data={'password': 'other1'})
+        self.assertEqual(reused.status_code, 400)
+        self.assertEqual(self.user.password, 'hashed-newpass')
+
+    def test_reset_password_without_redis_changes_nothing(self):
+
+        token = auth_service.create_reset_token(self.user)
+        self.mocks['bump'].side_effect = HTTPException(status_code=503)
+
+        response = self.client.post(f'/api/auth/reset_password/{token}', data={'password': 'newpass'})
+
+        self.assertEqual(response.status_code, 503)
+        self.mocks['update_password'].assert_not_awaited()
+
+    def test_reset_password_validation(self):
+
+        token = auth_service.create_reset_token(self.user)
+
+        self.assertEqual(self.client.post(f'/api/auth/reset_password/{token}', data={'password': 'short'}).status_code, 422)
+        self.assertEqual(self.client.post(f'/api/auth/reset_password/{token}', data={'password': 'far too long'}).status_code, 422)
+        self.mocks['update_password'].assert_not_awaited()
+
+    def test_reset_password_with_email_token(self):
+
+        token = auth_service.create_email_token({'sub': self.user.email})
+
+        response = self.client.post(f'/api/auth/reset_password/{token}', data={'password': 'newpass'})
+
+        self.assertEqual(response.status_code, 400)
+        self.mocks['update_password'].assert_not_awaited()
+
+
+class TestLimitPasswordReset(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        limiter = rate_limits.RateLimiter(
+            limits={'password_reset_ip': {'user': 5}, 'password_reset_email': {'user': 2}},
+            period=3600,
+        )
+        limiter.local = LocalBuckets()
+        # Only the buckets of this process, Redis is never tried.
+        limiter.redis_retry_at = float('inf')
+        patcher = patch.object(rate_limits, 'password_reset_limiter', limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_per_email(self):
+
+        await limit_password_reset('10.0.0.1', 'user@example.com')
+        await limit_password_reset('10.0.0.2', 'user@example.com')
+
+        with self.assertRaises(HTTPException) as context:
+            await limit_password_reset('10.0.0.3', 'user@example.com')
+
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertIn('Retry-After', context.exception.headers)
+        await limit_password_reset('10.0.0.3', 'other@example.com')
+
+    async def test_per_ip(self):
+
+        for i in range(5):
+            await limit_password_reset('10.0.0.1', f'user{i}@example.com')
+
+        with self.assertRaises(HTTPException) as context:
+            await limit_password_reset('10.0.0.1', 'user5@example.com')
+
+        self.assertEqual(context.exception.status_code, 429)
+
+    async def test_disabled(self):
+
+        with patch.object(rate_limits.settings, 'rate_limit_enabled', False):
+            for _ in range(10):
+                await limit_password_reset('10.0.0.1', 'user@example.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -116,7 +116,7 @@ async def test_get_post_qrcode(client, token, session):
 async def test_search_posts(client, token, session):
 
     posts_repository_mock = MagicMock()
-    posts_repository_mock.get_all_posts.return_value = [{"id": 1, "description": "Test description"}]
+    posts_repository_mock.search_posts_rows.return_value = [{"id": 1, "description": "Test description"}]
 
     response_mock = MagicMock()
     response_mock.status_code = status.HTTP_200_OK
@@ -125,7 +125,7 @@ async def test_search_posts(client, token, session):
     client.get = MagicMock(return_value=response_mock)
 
     with pytest.MonkeyPatch().context() as m:
-        m.setattr('src.routes.posts.posts_repository.get_all_posts', posts_repository_mock.get_all_posts)
+        m.setattr('src.routes.posts.posts_repository.search_posts_rows', posts_repository_mock.search_posts_rows)
 
         response = client.get("/posts/", headers={"Authorization": f"Bearer {token}"})
 
@@ -196,4 +196,4 @@ async def test_get_post_rating(client, token, session):
     response = client.get("/posts/1/rating", headers={"Authorization": f"Bearer {token}"})
 
     assert response.status_code == 200
-    assert response.json() == {"id": 1, "rating": 4.5}
\ No newline at end of file
+    assert response.json() == {"id": 1, "rating": 4.5}
@@ -0,0 +1,67 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from datetime import datetime
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.db import get_db  # noqa: E402
+from src.database.models import User  # noqa: E402
+from src.repository.read_models import CommentRecord  # noqa: E402
+from src.routes.posts import router  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+
+
+async def comments(post_id, db, page_size):
+    for i in (1, 2):
+        yield CommentRecord(i, f'comment {i}', datetime(2024, 3, 1), None, post_id, 1)
+
+
+class TestStreamComments(unittest.TestCase):
+
+    def setUp(self):
+        self.post_exists = AsyncMock(return_value=True)
+        for patcher in (
+            patch('src.routes.posts.comment_service.post_exists', self.post_exists),
+            patch('src.repository.comments.iter_comments_for_post', side_effect=comments),
+            patch('src.routes.posts.settings.cache_enabled', False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_db] = lambda: MagicMock(spec=Session)
+        app.dependency_overrides[auth_service.get_current_user] = lambda: User(id=1)
+        self.client = TestClient(app)
+
+    def test_stream(self):
+
+        response = self.client.get('/posts/1/comments', params={'stream': True})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line['comment_text'] for line in lines], ['comment 1', 'comment 2'])
+
+    def test_stream_of_missing_post(self):
+
+        self.post_exists.return_value = False
+
+        response = self.client.get('/posts/1/comments', params={'stream': True})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Post not found'})
+
+
+if __name__ == '__main__':
+    unittest.main()
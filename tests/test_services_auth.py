@@ -0,0 +1,169 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from datetime import datetime, timedelta
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import User  # noqa: E402
+from src.routes.auth import confirmed_email  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.tokens import token_keys  # noqa: E402
+
+
+class TestResetToken(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.user = User(id=1, email='test@example.com', password='hashed-password', is_active=True)
+        self.db = MagicMock(spec=Session)
+        patcher = patch('src.repository.users.get_user_by_email', AsyncMock(return_value=self.user))
+        self.get_user_by_email = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def assert_invalid(self, token):
+        with self.assertRaises(HTTPException) as context:
+            await auth_service.get_user_from_reset_token(token, self.db)
+        self.assertEqual(context.exception.status_code, 400)
+
+    async def test_get_user_from_reset_token(self):
+
+        token = auth_service.create_reset_token(self.user)
+
+        self.assertIs(await auth_service.get_user_from_reset_token(token, self.db), self.user)
+        self.get_user_by_email.assert_awaited_once_with('test@example.com', self.db)
+
+    async def test_used_after_password_change(self):
+
+        token = auth_service.create_reset_token(self.user)
+        self.user.password = 'hashed-new-password'
+
+        await self.assert_invalid(token)
+
+    async def test_expired(self):
+
+        now = datetime.utcnow()
+        token = token_keys.sign({
+            'sub': self.user.email,
+            'scope': 'reset_password',
+            'pwd': auth_service.password_fingerprint(self.user),
+            'iat': now - timedelta(hours=2),
+            'exp': now - timedelta(hours=1),
+        })
+
+        await self.assert_invalid(token)
+
+    async def test_other_token_kinds(self):
+
+        await self.assert_invalid(auth_service.create_email_token({'sub': self.user.email}))
+        await self.assert_invalid(token_keys.sign({'sub': self.user.email, 'scope': 'access_token'}))
+        await self.assert_invalid('not-a-token')
+
+    async def test_unknown_or_inactive_user(self):
+
+        token = auth_service.create_reset_token(self.user)
+
+        self.user.is_active = False
+        await self.assert_invalid(token)
+
+        self.get_user_by_email.return_value = None
+        await self.assert_invalid(token)
+
+
+class TestEmailToken(unittest.IsolatedAsyncioTestCase):
+
+    async def test_get_email_from_token(self):
+
+        token = auth_service.create_email_token({'sub': 'test@example.com'})
+
+        self.assertEqual(await auth_service.get_email_from_token(token), 'test@example.com')
+
+    async def test_other_token_kinds(self):
+
+        user = User(id=1, email='test@example.com', password='hashed-password')
+        tokens = [
+            await auth_service.create_access_token({'sub': user.email}),
+            await auth_service.create_refresh_token({'sub': user.email}),
+            auth_service.create_reset_token(user),
+            token_keys.sign({'sub': user.email}),
+            'not-a-token',
+        ]
+
+        for token in tokens:
+            with self.subTest(token=token[:20]):
+                with self.assertRaises(HTTPException) as context:
+                    await auth_service.get_email_from_token(token)
+                self.assertEqual(context.exception.status_code, 422)
+
+
+class TestConfirmedEmail(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.db = MagicMock(spec=Session)
+        self.mocks = {
+            'get_email_from_token': AsyncMock(return_value='test@example.com'),
+            'claim_email_token': AsyncMock(return_value=True),
+            'release_email_token': AsyncMock(),
+        }
+        for name, mock in self.mocks.items():
+            patcher = patch.object(auth_service, name, mock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def patch_users(self, user_id, user):
+        confirmed = patch('src.repository.users.confirmed_email', AsyncMock(return_value=user_id))
+        get_user_by_email = patch('src.repository.users.get_user_by_email', AsyncMock(return_value=user))
+        return confirmed, get_user_by_email
+
+    async def test_confirmed(self):
+
+        confirmed, get_user_by_email = self.patch_users(1, None)
+        with confirmed, get_user_by_email:
+            self.assertEqual(await confirmed_email('token', self.db), {'message': 'Email confirmed'})
+
+        self.mocks['release_email_token'].assert_not_awaited()
+
+    async def test_already_confirmed(self):
+
+        confirmed, get_user_by_email = self.patch_users(None, User(id=1, confirmed=True))
+        with confirmed, get_user_by_email:
+            self.assertEqual(await confirmed_email('token', self.db), {'message': 'Your email is already confirmed'})
+
+        self.mocks['release_email_token'].assert_not_awaited()
+
+    async def test_replayed_token(self):
+
+        self.mocks['claim_email_token'].return_value = False
+
+        with patch('src.repository.users.confirmed_email', AsyncMock()) as confirmed:
+            self.assertEqual(await confirmed_email('token', self.db), {'message': 'Your email is already confirmed'})
+
+        confirmed.assert_not_awaited()
+
+    async def test_unknown_user_releases_claim(self):
+
+        confirmed, get_user_by_email = self.patch_users(None, None)
+        with confirmed, get_user_by_email:
+            with self.assertRaises(HTTPException) as context:
+                await confirmed_email('token', self.db)
+
+        self.assertEqual(context.exception.status_code, 400)
+        self.mocks['release_email_token'].assert_awaited_once_with('token')
+
+    async def test_database_error_releases_claim(self):
+
+        with patch('src.repository.users.confirmed_email', AsyncMock(side_effect=RuntimeError('connection lost'))):
+            with self.assertRaises(RuntimeError):
+                await confirmed_email('token', self.db)
+
+        self.mocks['release_email_token'].assert_awaited_once_with('token')
+
+
+if __name__ == '__main__':
+    unittest.main()
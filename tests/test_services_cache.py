@@ -0,0 +1,290 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import asyncio
+import inspect
+import unittest
+from unittest.mock import patch
+
+from fastapi import Depends, FastAPI, Request, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from redis.exceptions import ConnectionError
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services import cache, events  # noqa: E402
+from src.services.cache import ResponseCache, cached, etag_matches, make_etag, with_request_response  # noqa: E402
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append(('set', key, value))
+
+    def sadd(self, key, member):
+        self.commands.append(('sadd', key, member))
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        self.redis.check()
+        for command, key, value in self.commands:
+            if command == 'set':
+                self.redis.data[key] = value
+            else:
+                self.redis.sets.setdefault(key, set()).add(value.encode())
+
+
+class FakeRedis:
+    """
+    The part of redis.asyncio.Redis that ResponseCache uses, kept in dicts.
+    """
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.sets: dict[str, set[bytes]] = {}
+        self.error: Exception | None = None
+        self.calls = 0
+
+    def check(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        self.check()
+        return self.data.get(key)
+
+    async def smembers(self, key):
+        self.check()
+        return set(self.sets.get(key, ()))
+
+    async def delete(self, *keys):
+        self.check()
+        for key in keys:
+            self.data.pop(key, None)
+            self.sets.pop(key, None)
+
+
+def make_cache(**kwargs):
+    response_cache = ResponseCache(**kwargs)
+    response_cache.redis = FakeRedis()
+    return response_cache
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_l1_hit(self):
+
+        response_cache = make_cache()
+        await response_cache.set('a', b'1', ['post:1'])
+        response_cache.redis.data.clear()
+
+        self.assertEqual(await response_cache.get('a'), b'1')
+
+    async def test_l1_expiry_falls_back_to_redis(self):
+
+        response_cache = make_cache(l1_ttl=5)
+        with patch('src.services.cache.time.monotonic', return_value=100.0):
+            await response_cache.set('a', b'1', ['post:1'])
+        response_cache.redis.data['response_cache:a'] = b'2'
+
+        with patch('src.services.cache.time.monotonic', return_value=106.0):
+            self.assertEqual(await response_cache.get('a'), b'2')
+
+        # The Redis value is copied back into L1.
+        self.assertEqual(response_cache.l1['a'][1], b'2')
+
+    async def test_l1_lru_eviction(self):
+
+        response_cache = make_cache(l1_size=2)
+        await response_cache.set('a', b'1', [])
+        await response_cache.set('b', b'2', [])
+        await response_cache.get('a')
+        await response_cache.set('c', b'3', [])
+
+        self.assertEqual(list(response_cache.l1), ['a', 'c'])
+
+    async def test_redis_failure_falls_back_to_l1(self):
+
+        response_cache = make_cache()
+        response_cache.redis.error = ConnectionError('down')
+
+        await response_cache.set('a', b'1', ['post:1'])
+        self.assertEqual(await response_cache.get('a'), b'1')
+        self.assertIsNone(await response_cache.get('b'))
+
+        # Redis is skipped after the first failure instead of being retried on every call.
+        self.assertEqual(response_cache.redis.calls, 1)
+        self.assertFalse(response_cache._redis_available())
+
+    async def test_redis_failure_on_get(self):
+
+        response_cache = make_cache()
+        response_cache.redis.error = ConnectionError('down')
+
+        self.assertIsNone(await response_cache.get('a'))
+        self.assertFalse(response_cache._redis_available())
+
+    async def test_invalidate_drops_both_tiers(self):
+
+        response_cache = make_cache()
+        await response_cache.set('a', b'1', ['post:1'])
+        await response_cache.set('b', b'2', ['post:2'])
+
+        await response_cache.invalidate('post:1')
+
+        self.assertNotIn('a', response_cache.l1)
+        self.assertNotIn('response_cache:a', response_cache.redis.data)
+        self.assertNotIn('response_cache:tag:post:1', response_cache.redis.sets)
+        self.assertEqual(await response_cache.get('b'), b'2')
+
+    async def test_events_invalidate_tags(self):
+
+        response_cache = make_cache()
+        await response_cache.set('post', b'1', ['post:1'])
+        await response_cache.set('comments', b'2', ['post:1:comments'])
+        await response_cache.set('mine', b'3', ['user:7'])
+        await response_cache.set('tagged', b'4', ['tag:cats'])
+        await response_cache.set('feed', b'5', ['posts'])
+
+        handlers = {
+            events.POST_CHANGED: [cache.invalidate_post],
+            events.COMMENTS_CHANGED: [cache.invalidate_comments],
+            events.TAG_CHANGED: [cache.invalidate_tag],
+            events.USER_CHANGED: [cache.invalidate_user],
+        }
+        with patch.object(cache, 'response_cache', response_cache), patch.dict(events.handlers, handlers):
+            await events.emit(events.COMMENTS_CHANGED, post_id=1)
+            self.assertEqual(set(response_cache.l1), {'post', 'mine', 'tagged', 'feed'})
+
+            await events.emit(events.POST_CHANGED, post_id=1, user_id=7)
+            self.assertEqual(set(response_cache.l1), {'tagged', 'feed'})
+
+            await events.emit(events.TAG_CHANGED, tag='cats')
+            self.assertEqual(set(response_cache.l1), set())
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+
+
+class TestCached(unittest.TestCase):
+
+    def setUp(self):
+        self.response_cache = make_cache()
+        patcher = patch.object(cache, 'response_cache', self.response_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.calls = 0
+        app = FastAPI()
+
+        @app.get('/items/{item_id}')
+        @cached(Item, 'item:{item_id}', headers=['X-Total'])
+        async def read_item(item_id: int, response: Response):
+            self.calls += 1
+            response.headers['X-Total'] = '10'
+            response.headers['X-Other'] = 'not cached'
+            return {'id': item_id, 'name': f'item {item_id}'}
+
+        self.client = TestClient(app)
+
+    def test_signature_injection(self):
+
+        async def endpoint(item_id: int, request: Request):
+            pass
+
+        signature, injected = with_request_response(endpoint)
+
+        self.assertEqual(injected, ['response'])
+        self.assertEqual(list(signature.parameters), ['item_id', 'request', 'response'])
+        self.assertEqual(signature.parameters['response'].kind, inspect.Parameter.KEYWORD_ONLY)
+
+    def test_hit_skips_endpoint(self):
+
+        first = self.client.get('/items/1')
+        second = self.client.get('/items/1')
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(first.json(), {'id': 1, 'name': 'item 1'})
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.headers['X-Total'], '10')
+        self.assertNotIn('X-Other', second.headers)
+        self.assertEqual(second.headers['ETag'], make_etag(first.content))
+
+    def test_if_none_match(self):
+
+        etag = self.client.get('/items/1').headers['ETag']
+
+        response = self.client.get('/items/1', headers={'If-None-Match': f'"other", {etag}'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get('/items/1', headers={'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalidated_entry_is_rebuilt(self):
+
+        self.client.get('/items/1')
+        asyncio.run(self.response_cache.invalidate('item:1'))
+        self.client.get('/items/1')
+
+        self.assertEqual(self.calls, 2)
+
+    def test_disabled(self):
+
+        with patch.object(cache.settings, 'cache_enabled', False):
+            self.client.get('/items/1')
+            self.client.get('/items/1')
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.response_cache.l1, {})
+
+    def test_miss_is_filled_from_primary(self):
+
+        session = Session()
+        reads = []
+        app = FastAPI()
+
+        @app.get('/items/{item_id}')
+        @cached(Item, 'item:{item_id}')
+        async def read_item(item_id: int, db: Session = Depends(lambda: session)):
+            reads.append(db.info.get('primary'))
+            return {'id': item_id, 'name': f'item {item_id}'}
+
+        TestClient(app).get('/items/1')
+
+        self.assertEqual(reads, [True])
+        self.assertFalse(session.info['primary'])
+
+    def test_etag_matches_wildcard(self):
+
+        request = Request({'type': 'http', 'headers': [(b'if-none-match', b'*')]})
+
+        self.assertTrue(etag_matches(request, '"abc"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import Comment, User  # noqa: E402
+from src.routes.comments import create_comment_for_post  # noqa: E402
+from src.schemas.comments import CommentModel  # noqa: E402
+from src.services.comments import CommentService, PendingComment, ProfanityFilter  # noqa: E402
+
+
+def rows_to_comments(rows):
+    return [Comment(id=i, **row) for i, row in enumerate(rows, start=1)]
+
+
+class TestCommentService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.user = User(id=1)
+        self.insert = AsyncMock(side_effect=rows_to_comments)
+        patcher = patch.object(CommentService, '_insert', self.insert)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def start(self, service):
+        service.queue = asyncio.Queue()
+        service.worker = asyncio.create_task(service._run())
+        self.addAsyncCleanup(service.stop)
+
+    async def test_batch_flushed_by_size(self):
+
+        service = CommentService(batch_size=3, batch_interval_ms=60_000)
+        await self.start(service)
+
+        comments = await asyncio.wait_for(asyncio.gather(*(
+            service.create_comment(MagicMock(), 1, CommentModel(comment_text=f'comment {i}'), self.user)
+            for i in range(3)
+        )), timeout=1)
+
+        self.insert.assert_awaited_once()
+        self.assertEqual(len(self.insert.await_args.args[0]), 3)
+        self.assertEqual([comment.comment_text for comment in comments], ['comment 0', 'comment 1', 'comment 2'])
+
+    async def test_batch_flushed_by_interval(self):
+
+        service = CommentService(batch_size=100, batch_interval_ms=20)
+        await self.start(service)
+
+        comments = await asyncio.wait_for(asyncio.gather(*(
+            service.create_comment(MagicMock(), 1, CommentModel(comment_text=f'comment {i}'), self.user)
+            for i in range(2)
+        )), timeout=1)
+
+        self.insert.assert_awaited_once()
+        self.assertEqual(len(comments), 2)
+
+    async def test_flush_isolates_bad_row(self):
+
+        def insert(rows):
+            if len(rows) > 1 or rows[0]['post_id'] == 2:
+                raise IntegrityError('INSERT', {}, Exception('foreign key'))
+            return rows_to_comments(rows)
+
+        self.insert.side_effect = insert
+        service = CommentService()
+        service.remember_post(1)
+        service.remember_post(2)
+        batch = [
+            PendingComment(values={'comment_text': 'good', 'post_id': 1, 'user_id': 1}),
+            PendingComment(values={'comment_text': 'bad', 'post_id': 2, 'user_id': 1}),
+            PendingComment(values={'comment_text': 'good too', 'post_id': 1, 'user_id': 1}),
+        ]
+
+        await service._flush(batch)
+
+        self.assertEqual(batch[0].future.result().comment_text, 'good')
+        self.assertIsInstance(batch[1].future.exception(), IntegrityError)
+        self.assertEqual(batch[2].future.result().comment_text, 'good too')
+        self.assertNotIn(2, service.post_ids)
+        self.assertIn(1, service.post_ids)
+
+    async def test_unknown_post_not_found(self):
+
+        db = MagicMock(Session)
+        with patch('src.services.comments.comment_service.post_exists', AsyncMock(return_value=False)), \
+                patch('src.services.comments.comment_service.create_comment', AsyncMock()) as create_comment:
+            with self.assertRaises(HTTPException) as context:
+                await create_comment_for_post(5, CommentModel(comment_text='hello'), db, self.user)
+
+        self.assertEqual(context.exception.status_code, 404)
+        create_comment.assert_not_awaited()
+
+    async def test_post_exists_falls_back_to_database(self):
+
+        service = CommentService()
+        with patch('src.repository.posts.post_exists', AsyncMock(side_effect=[True, False])) as post_exists:
+            self.assertTrue(await service.post_exists(3, MagicMock()))
+            self.assertTrue(await service.post_exists(3, MagicMock()))
+            self.assertFalse(await service.post_exists(4, MagicMock()))
+
+        self.assertEqual(post_exists.await_count, 2)
+        self.assertIn(3, service.post_ids)
+
+    async def test_empty_comment_rejected(self):
+
+        service = CommentService()
+
+        with self.assertRaises(HTTPException) as context:
+            await service.create_comment(MagicMock(), 1, CommentModel(comment_text=''), self.user)
+
+        self.assertEqual(context.exception.status_code, 400)
+
+    async def test_profanity_rejected(self):
+
+        service = CommentService()
+        service.add_moderator(ProfanityFilter(['darn']))
+
+        with patch('src.repository.comments.delete_comments', AsyncMock()) as delete_comments, \
+                patch('src.services.comments.SessionLocal', MagicMock()):
+            await service._moderate([
+                Comment(id=1, comment_text='a fine post'),
+                Comment(id=2, comment_text='Darn it'),
+                Comment(id=3, comment_text='darning socks'),
+            ])
+
+        delete_comments.assert_awaited_once()
+        self.assertEqual(delete_comments.await_args.args[1], [2])
+
+    async def test_profanity_filter_without_words(self):
+
+        self.assertTrue(await ProfanityFilter([])(Comment(comment_text='anything')))
+
+
+if __name__ == '__main__':
+    unittest.main()
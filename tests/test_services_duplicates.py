@@ -0,0 +1,137 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import random
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services.duplicates import HashIndex  # noqa: E402
+
+
+def flip(phash: str, *bits: int) -> str:
+    value = int(phash, 16)
+    for bit in bits:
+        value ^= 1 << bit
+    return f'{value:016x}'
+
+
+class TestHashIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = HashIndex(max_distance=4)
+        self.phash = 'c3a5f00f96e1b24d'
+
+    def test_chunks_cover_all_bits(self):
+
+        covered = 0
+        for shift, mask in self.index.chunks:
+            self.assertEqual(covered & (mask << shift), 0)
+            covered |= mask << shift
+
+        self.assertEqual(len(self.index.chunks), 5)
+        self.assertEqual(covered, (1 << 64) - 1)
+
+    def test_find_exact(self):
+
+        self.index.add(1, self.phash, 10)
+
+        self.assertEqual(self.index.find(self.phash), [(0, 1)])
+
+    def test_find_at_max_distance(self):
+
+        # One flipped bit in each of four chunks, only the fifth chunk still matches.
+        other = flip(self.phash, 0, 13, 26, 39)
+        self.index.add(1, other, 10)
+
+        self.assertEqual(self.index.find(self.phash), [(4, 1)])
+
+    def test_miss_above_max_distance(self):
+
+        # One flipped bit in every chunk, no chunk matches any more.
+        self.index.add(1, flip(self.phash, 0, 13, 26, 39, 52), 10)
+        # Five bits flipped in a single chunk, the other chunks match but the distance is too large.
+        self.index.add(2, flip(self.phash, 0, 1, 2, 3, 4), 10)
+
+        self.assertEqual(self.index.find(self.phash), [])
+
+    def test_find_with_smaller_max_distance(self):
+
+        self.index.add(1, flip(self.phash, 0), 10)
+        self.index.add(2, flip(self.phash, 0, 20, 40), 10)
+
+        self.assertEqual(self.index.find(self.phash), [(1, 1), (3, 2)])
+        self.assertEqual(self.index.find(self.phash, max_distance=2), [(1, 1)])
+        self.assertEqual(self.index.find(self.phash, max_distance=10), [(1, 1), (3, 2)])
+
+    def test_find_by_user(self):
+
+        self.index.add(1, self.phash, 10)
+        self.index.add(2, flip(self.phash, 5), 20)
+
+        self.assertEqual(self.index.find(self.phash, user_id=20), [(1, 2)])
+
+    def test_remove(self):
+
+        self.index.add(1, self.phash, 10)
+        self.index.add(2, flip(self.phash, 5), 10)
+
+        self.index.remove(1)
+        self.index.remove(3)
+
+        self.assertEqual(self.index.find(self.phash), [(1, 2)])
+        self.assertEqual(len(self.index), 1)
+
+        self.index.remove(2)
+        self.assertEqual(self.index.tables, [{} for _ in self.index.chunks])
+
+    def test_add_replaces_previous_hash(self):
+
+        self.index.add(1, self.phash, 10)
+        self.index.add(1, 'ffffffffffffffff', 10)
+
+        self.assertEqual(self.index.find(self.phash), [])
+        self.assertEqual(self.index.find('ffffffffffffffff'), [(0, 1)])
+        self.assertEqual(len(self.index), 1)
+
+    def test_matches_linear_scan(self):
+
+        rng = random.Random(7)
+        hashes = {post_id: rng.getrandbits(64) for post_id in range(300)}
+        for post_id, value in list(hashes.items())[:100]:
+            # Near copies of other hashes, so there is something to find.
+            hashes[post_id + 1000] = value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        for post_id, value in hashes.items():
+            self.index.add(post_id, f'{value:016x}', 10)
+
+        for value in list(hashes.values())[::7]:
+            expected = sorted(
+                ((value ^ other).bit_count(), post_id)
+                for post_id, other in hashes.items()
+                if (value ^ other).bit_count() <= 4
+            )
+            self.assertEqual(self.index.find(f'{value:016x}'), expected)
+
+
+class TestHashIndexLoad(unittest.IsolatedAsyncioTestCase):
+
+    async def test_load(self):
+
+        index = HashIndex(max_distance=4)
+        rows = [(1, 10, 'c3a5f00f96e1b24d'), (2, 20, '0000000000000000')]
+        mock_session = MagicMock()
+
+        with patch('src.services.duplicates.SessionLocal', return_value=mock_session), \
+                patch('src.repository.post_images.get_post_hashes', AsyncMock(return_value=rows)):
+            await index.load()
+
+        mock_session.close.assert_called_once()
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.find('0000000000000001', user_id=20), [(1, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
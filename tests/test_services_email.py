@@ -0,0 +1,186 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import asyncio
+import time
+import unittest
+from email.message import EmailMessage
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from jinja2 import DictLoader, Environment, select_autoescape  # noqa: E402
+
+from src.services.email import MailService, is_permanent  # noqa: E402
+from src.services.mail_templates import SUBJECTS, MailTemplates, TEMPLATE_FOLDER, is_plain  # noqa: E402
+
+
+class LocalSMTPServer:
+    """
+    SMTP stand-in that accepts messages in memory.
+
+    Recipients in refused are answered with the given reply to RCPT TO.
+    """
+
+    def __init__(self, refused: dict | None = None):
+        self.refused = refused or {}
+        self.messages = []
+        self.connections = 0
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b'220 localhost ESMTP\r\n')
+        recipients = []
+
+        while line := await reader.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                reply = '250 localhost'
+            elif verb == 'MAIL':
+                recipients = []
+                reply = '250 OK'
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip(' <>')
+                reply = self.refused.get(address)
+                if reply is None:
+                    recipients.append(address)
+                    reply = '250 OK'
+            elif verb == 'DATA':
+                writer.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                data = b''
+                while (chunk := await reader.readline()) != b'.\r\n':
+                    data += chunk
+                self.messages.append((recipients, data))
+                reply = '250 OK'
+            elif verb in ('RSET', 'NOOP'):
+                reply = '250 OK'
+            elif verb == 'QUIT':
+                writer.write(b'221 Bye\r\n')
+                break
+            else:
+                reply = '502 Command not implemented'
+
+            writer.write(reply.encode() + b'\r\n')
+            await writer.drain()
+
+        writer.close()
+
+
+def make_message(recipient):
+    message = EmailMessage()
+    message['From'] = 'sender@example.com'
+    message['To'] = recipient
+    message['Subject'] = 'Subject'
+    message.set_content('<p>Hi</p>', subtype='html')
+    return message
+
+
+def make_service(port, **options):
+    return MailService(
+        hostname='127.0.0.1',
+        port=port,
+        username=None,
+        password=None,
+        use_tls=False,
+        start_tls=False,
+        **options,
+    )
+
+
+class TestMailService(unittest.IsolatedAsyncioTestCase):
+
+    async def test_send_batch_reuses_connections(self):
+
+        async with LocalSMTPServer() as server:
+            service = make_service(server.port, pool_size=2, rate=1000)
+
+            errors = await service.send_batch({i: make_message(f'user{i}@example.com') for i in range(5)})
+            errors.update(await service.send_batch({i: make_message(f'user{i}@example.com') for i in range(5, 8)}))
+            await service.stop()
+
+        self.assertEqual(errors, {})
+        self.assertEqual(len(server.messages), 8)
+        self.assertLessEqual(server.connections, 2)
+
+    async def test_send_batch_refused_recipient(self):
+
+        async with LocalSMTPServer(refused={'gone@example.com': '550 No such user'}) as server:
+            service = make_service(server.port, pool_size=1, rate=1000)
+
+            errors = await service.send_batch({1: make_message('gone@example.com'), 2: make_message('user@example.com')})
+            await service.stop()
+
+        self.assertEqual(list(errors), [1])
+        self.assertTrue(is_permanent(errors[1]))
+        self.assertEqual(server.messages[0][0], ['user@example.com'])
+
+    async def test_send_batch_rate_limit(self):
+
+        async with LocalSMTPServer() as server:
+            service = make_service(server.port, pool_size=2, rate=50)
+
+            start = time.monotonic()
+            await service.send_batch({i: make_message(f'user{i}@example.com') for i in range(5)})
+            elapsed = time.monotonic() - start
+            await service.stop()
+
+        self.assertGreaterEqual(elapsed, 4 / 50 - 0.01)
+
+    async def test_connection_error_is_not_permanent(self):
+
+        service = make_service(1, pool_size=1, rate=1000)
+
+        errors = await service.send_batch({1: make_message('user@example.com')})
+
+        self.assertFalse(is_permanent(errors[1]))
+
+
+class TestMailTemplates(unittest.TestCase):
+
+    def test_render_matches_jinja(self):
+
+        templates = MailTemplates()
+        templates.load()
+        environment = Environment(autoescape=select_autoescape())
+        context = {'host': 'http://localhost/', 'username': '<b>Ann & Bob</b>', 'token': 'a.b.c', 'title': 'News', 'message': '"quoted"'}
+
+        for name in SUBJECTS:
+            source = (TEMPLATE_FOLDER / name).read_text()
+            expected = environment.from_string(source).render(context)
+            self.assertIsNotNone(templates.fragments[name])
+            self.assertEqual(templates.render(name, context), expected)
+
+        self.assertEqual(templates.subject('notification.html', context), 'News')
+
+    def test_is_plain(self):
+
+        environment = Environment()
+
+        self.assertTrue(is_plain(environment.parse('<p>{{ username }}</p>')))
+        self.assertFalse(is_plain(environment.parse('<p>{{ username|upper }}</p>')))
+        self.assertFalse(is_plain(environment.parse('{% for tag in tags %}{{ tag }}{% endfor %}')))
+
+    def test_render_without_fragments(self):
+
+        templates = MailTemplates(subjects={'email_template.html': 'Confirm your email'})
+        templates.environment.loader = DictLoader({'email_template.html': '{% if username %}Hi {{ username }}{% endif %}'})
+        templates.load()
+
+        self.assertIsNone(templates.fragments['email_template.html'])
+        self.assertEqual(templates.render('email_template.html', {'username': 'Ann'}), 'Hi Ann')
+
+
+if __name__ == '__main__':
+    unittest.main()
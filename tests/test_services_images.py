@@ -0,0 +1,78 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from io import BytesIO
+import unittest
+
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services.images import ORIENTATION_TAG, extract_metadata, phash  # noqa: E402
+
+
+KNOWN_PHASH = 'e817c768b56a9568'
+
+
+def known_image(size=(320, 240)):
+    image = Image.linear_gradient('L').resize((320, 240)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((40, 30, 160, 150), fill=(200, 30, 30))
+    draw.rectangle((180, 120, 300, 220), fill=(20, 60, 220))
+    return image.resize(size)
+
+
+def encode(image, image_format, **kwargs):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **kwargs)
+    return buffer.getvalue()
+
+
+def distance(first, second):
+    return (int(first, 16) ^ int(second, 16)).bit_count()
+
+
+class TestPhash(unittest.TestCase):
+
+    def test_known_image(self):
+
+        # Stored hashes are compared with new ones, so the hash of an image must never change.
+        self.assertEqual(phash(known_image()), KNOWN_PHASH)
+
+    def test_extract_metadata(self):
+
+        metadata = extract_metadata(encode(known_image(), 'PNG'))
+
+        self.assertEqual((metadata.width, metadata.height, metadata.orientation), (320, 240, 1))
+        self.assertEqual(metadata.phash, KNOWN_PHASH)
+
+    def test_jpeg_decoded_at_reduced_scale(self):
+
+        data = encode(known_image((2048, 1536)), 'JPEG', quality=90)
+        with Image.open(BytesIO(data)) as image:
+            full = phash(image)
+
+        metadata = extract_metadata(data)
+
+        self.assertEqual((metadata.width, metadata.height), (2048, 1536))
+        self.assertLessEqual(distance(metadata.phash, full), 2)
+        self.assertLessEqual(distance(metadata.phash, KNOWN_PHASH), 2)
+
+    def test_exif_orientation(self):
+
+        exif = Image.Exif()
+        exif[ORIENTATION_TAG] = 6
+        image = known_image()
+
+        metadata = extract_metadata(encode(image, 'JPEG', quality=95, exif=exif))
+
+        # The hash is taken of the image as displayed, not of the stored pixels.
+        self.assertEqual((metadata.width, metadata.height, metadata.orientation), (240, 320, 6))
+        self.assertLessEqual(distance(metadata.phash, phash(image.transpose(Image.Transpose.ROTATE_270))), 2)
+        self.assertGreater(distance(metadata.phash, phash(image)), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
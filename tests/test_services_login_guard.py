@@ -0,0 +1,112 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import asyncio
+import unittest
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services.login_guard import LoginGuard  # noqa: E402
+
+
+def make_guard(results=None, error=None, bcrypt_concurrency=4):
+    guard = LoginGuard(bcrypt_concurrency=bcrypt_concurrency)
+    guard.redis = MagicMock()
+    pipe = guard.redis.pipeline.return_value.__aenter__.return_value
+    pipe.execute = AsyncMock(return_value=results, side_effect=error)
+    guard.record_failure = AsyncMock(return_value=0)
+    return guard
+
+
+class TestLoginGuard(unittest.IsolatedAsyncioTestCase):
+
+    async def test_check_passes(self):
+
+        guard = make_guard([0, -2, -2])
+
+        await guard.check("127.0.0.1", "test@example.com")
+
+    async def test_check_locked(self):
+
+        guard = make_guard([0, -2, 120])
+
+        with self.assertRaises(HTTPException) as context:
+            await guard.check("127.0.0.1", "test@example.com")
+
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(context.exception.headers, {'Retry-After': '120'})
+
+    async def test_check_unknown_email(self):
+
+        guard = make_guard([1, -2, -2])
+
+        with self.assertRaises(HTTPException) as context:
+            await guard.check("127.0.0.1", "unknown@example.com")
+
+        self.assertEqual(context.exception.status_code, 401)
+
+    async def test_unknown_email_keeps_case(self):
+
+        guard = make_guard([0, -2, -2])
+        guard.redis.set = AsyncMock()
+
+        await guard.failed("127.0.0.1", "foo@example.com", unknown=True)
+        await guard.check("127.0.0.1", "Foo@example.com")
+
+        guard.redis.set.assert_awaited_once_with("login:unknown:foo@example.com", 1, ex=ANY)
+        pipe = guard.redis.pipeline.return_value.__aenter__.return_value
+        pipe.exists.assert_called_once_with("login:unknown:Foo@example.com")
+
+    async def test_check_without_redis(self):
+
+        guard = make_guard(error=ConnectionError("refused"))
+
+        await guard.check("127.0.0.1", "test@example.com")
+        await guard.check("127.0.0.1", "test@example.com")
+
+        guard.redis.pipeline.assert_called_once()
+
+    async def test_failed(self):
+
+        guard = make_guard()
+        guard.redis.set = AsyncMock()
+        guard.record_failure.return_value = 60
+
+        result = await guard.failed("127.0.0.1", "Test@Example.com", unknown=True)
+
+        self.assertEqual(result, 60)
+        guard.redis.set.assert_awaited_once()
+        keys = guard.record_failure.await_args.kwargs['keys']
+        self.assertEqual(keys[0], "login:ip:failures:127.0.0.1")
+        self.assertEqual(keys[3], "login:account:failures:test@example.com")
+
+    async def test_verify_password_cap(self):
+
+        guard = make_guard(bcrypt_concurrency=1)
+        await guard.bcrypt_slots.acquire()
+
+        with patch('src.services.login_guard.settings.login_bcrypt_timeout', 0.01):
+            with self.assertRaises(HTTPException) as context:
+                await guard.verify_password("password", "hash")
+
+        self.assertEqual(context.exception.status_code, 503)
+
+    async def test_verify_password(self):
+
+        guard = make_guard(bcrypt_concurrency=1)
+
+        with patch('src.services.login_guard.auth_service.verify_password', return_value=True) as verify:
+            results = await asyncio.gather(*(guard.verify_password("password", "hash") for _ in range(3)))
+
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(verify.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from datetime import datetime, timedelta, timezone
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.exc import OperationalError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import MediaDeletion  # noqa: E402
+from src.services.media import MediaDeletionService  # noqa: E402
+
+
+def created(hours_ago):
+    return (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class TestMediaDeletionService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.service = MediaDeletionService(batch_size=2, max_attempts=3, backoff=30)
+        self.db = MagicMock()
+        self.repository = {
+            name: AsyncMock()
+            for name in ('get_due_media_deletions', 'complete_media_deletions', 'get_referenced_public_ids', 'enqueue_media_deletion')
+        }
+        for patcher in [
+            patch('src.services.media.SessionLocal', return_value=self.db),
+            *(patch(f'src.repository.media.{name}', mock) for name, mock in self.repository.items()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_process(self):
+
+        deletions = [MediaDeletion(id=1, public_id='a', attempts=0), MediaDeletion(id=2, public_id='b', attempts=0)]
+        self.repository['get_due_media_deletions'].return_value = deletions
+
+        with patch('cloudinary.api.delete_resources', return_value={'deleted': {'a': 'deleted', 'b': 'not_found'}}) as delete_resources:
+            self.assertEqual(await self.service.process(), 2)
+
+        delete_resources.assert_called_once_with(['a', 'b'], invalidate=True)
+        self.repository['complete_media_deletions'].assert_awaited_once_with(self.db, deletions, {}, 30)
+        self.db.close.assert_called_once()
+
+    async def test_process_nothing_due(self):
+
+        self.repository['get_due_media_deletions'].return_value = []
+
+        with patch('cloudinary.api.delete_resources') as delete_resources:
+            self.assertEqual(await self.service.process(), 0)
+
+        delete_resources.assert_not_called()
+        self.db.commit.assert_called_once()
+
+    async def test_process_retries_failed(self):
+
+        deletions = [MediaDeletion(id=1, public_id='a', attempts=0), MediaDeletion(id=2, public_id='b', attempts=1)]
+        self.repository['get_due_media_deletions'].return_value = deletions
+
+        with patch('cloudinary.api.delete_resources', return_value={'deleted': {'a': 'deleted', 'b': 'rate_limited'}}):
+            self.assertEqual(await self.service.process(), 1)
+
+        errors = self.repository['complete_media_deletions'].await_args.args[2]
+        self.assertEqual(errors, {'b': 'rate_limited'})
+
+    async def test_process_api_error_retries_batch(self):
+
+        deletions = [MediaDeletion(id=1, public_id='a', attempts=0), MediaDeletion(id=2, public_id='b', attempts=0)]
+        self.repository['get_due_media_deletions'].return_value = deletions
+
+        with patch('cloudinary.api.delete_resources', side_effect=Exception('timeout')):
+            self.assertEqual(await self.service.process(), 0)
+
+        errors = self.repository['complete_media_deletions'].await_args.args[2]
+        self.assertEqual(errors, {'a': 'timeout', 'b': 'timeout'})
+
+    async def test_process_gives_up_after_max_attempts(self):
+
+        deletions = [MediaDeletion(id=1, public_id='a', attempts=2), MediaDeletion(id=2, public_id='b', attempts=1)]
+        self.repository['get_due_media_deletions'].return_value = deletions
+
+        with patch('cloudinary.api.delete_resources', return_value={'deleted': {}}), \
+                self.assertLogs('src.services.media', 'ERROR') as logs:
+            await self.service.process()
+
+        # The error of 'a' is dropped, so its row is deleted instead of being rescheduled.
+        errors = self.repository['complete_media_deletions'].await_args.args[2]
+        self.assertEqual(errors, {'b': 'missing from response'})
+        self.assertIn('Giving up deleting a', logs.output[0])
+
+    async def test_process_database_error(self):
+
+        self.repository['get_due_media_deletions'].side_effect = OperationalError('SELECT', {}, Exception('down'))
+
+        with self.assertRaises(OperationalError):
+            await self.service.process()
+
+        self.db.rollback.assert_called_once()
+        self.db.close.assert_called_once()
+
+    async def test_reconcile(self):
+
+        pages = [
+            {'resources': [
+                {'public_id': 'SomeFile/old-orphan', 'created_at': created(48)},
+                {'public_id': 'SomeFile/new', 'created_at': created(1)},
+                {'public_id': 'SomeFile/old-post', 'created_at': created(30)},
+            ], 'next_cursor': 'page-2'},
+            {'resources': [
+                {'public_id': 'SomeFile/old-queued', 'created_at': created(72)},
+                {'public_id': 'SomeFile/older-orphan', 'created_at': created(100)},
+            ]},
+        ]
+        self.repository['get_referenced_public_ids'].side_effect = [{'SomeFile/old-post'}, {'SomeFile/old-queued'}]
+
+        with patch('cloudinary.api.resources', side_effect=pages) as resources, \
+                patch('src.services.media.settings.media_prefix', 'SomeFile/'), \
+                patch('src.services.media.settings.media_orphan_grace', 24 * 60 * 60):
+            self.assertEqual(await self.service.reconcile(), 2)
+
+        self.assertEqual(resources.call_count, 2)
+        self.assertNotIn('next_cursor', resources.call_args_list[0].kwargs)
+        self.assertEqual(resources.call_args_list[1].kwargs['next_cursor'], 'page-2')
+        self.assertEqual(resources.call_args_list[0].kwargs['prefix'], 'SomeFile/')
+
+        # Uploads inside the grace period are not even checked, the rest in chunks of batch_size.
+        checked = [call.args[1] for call in self.repository['get_referenced_public_ids'].await_args_list]
+        self.assertEqual(checked, [['SomeFile/old-orphan', 'SomeFile/old-post'], ['SomeFile/old-queued', 'SomeFile/older-orphan']])
+        self.repository['enqueue_media_deletion'].assert_awaited_once_with(self.db, 'SomeFile/old-orphan', 'SomeFile/older-orphan')
+        self.db.commit.assert_called_once()
+
+    async def test_reconcile_without_orphans(self):
+
+        with patch('cloudinary.api.resources', return_value={'resources': []}):
+            self.assertEqual(await self.service.reconcile(), 0)
+
+        self.repository['get_referenced_public_ids'].assert_not_awaited()
+        self.repository['enqueue_media_deletion'].assert_awaited_once_with(self.db)
+
+
+if __name__ == '__main__':
+    unittest.main()
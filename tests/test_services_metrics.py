@@ -0,0 +1,146 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from collections import Counter
+from types import SimpleNamespace
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services.metrics import Histogram, Metrics, MetricsMiddleware, request_stats, timed  # noqa: E402
+from src.services import metrics as metrics_module  # noqa: E402
+
+
+def make_app(status=200, route=None, queries=0, registry=None):
+
+    async def app(scope, receive, send):
+        if route is not None:
+            scope['route'] = SimpleNamespace(path=route)
+        for _ in range(queries):
+            registry.observe_query('SELECT 1', 0.001)
+        await send({'type': 'http.response.start', 'status': status, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    return app
+
+
+async def call(app, path='/api/posts/1'):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({'type': 'http', 'method': 'GET', 'path': path, 'headers': []}, receive, send)
+    return messages
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+
+    def test_histogram(self):
+
+        histogram = Histogram([0.1, 1.0])
+
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+
+    def test_render(self):
+
+        registry = Metrics(buckets=[0.1, 1.0])
+        registry.observe_request('GET', '/api/posts/{post_id}', 200, 0.5, 2, 0.01)
+        registry.register_counter('upload_rejections_total', 'Rejected uploads', Counter({('size', 'user'): 3}), ('reason', 'role'))
+
+        text = registry.render()
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/api/posts/{post_id}",status="200",le="0.1"} 0', text)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/api/posts/{post_id}",status="200",le="1.0"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/api/posts/{post_id}",status="200"} 1', text)
+        self.assertIn('upload_rejections_total{reason="size",role="user"} 3', text)
+
+    async def test_middleware(self):
+
+        registry = Metrics(buckets=[0.1, 1.0])
+        app = MetricsMiddleware(make_app(201, '/api/posts/{post_id}', queries=2, registry=registry), registry)
+
+        await call(app)
+        await call(MetricsMiddleware(make_app(404), registry), '/missing')
+
+        self.assertEqual(registry.requests[('GET', '/api/posts/{post_id}', 201)].count, 1)
+        self.assertEqual(registry.requests[('GET', 'unmatched', 404)].count, 1)
+        self.assertEqual(registry.request_queries['/api/posts/{post_id}'].total, 2)
+        self.assertEqual(registry.queries['SELECT'], 2)
+        self.assertIsNone(request_stats.get())
+
+    async def test_middleware_excludes_background_work(self):
+
+        registry = Metrics(buckets=[0.1, 1.0])
+        clock = iter([10.0, 10.05, 12.0])
+
+        async def app(scope, receive, send):
+            scope['route'] = SimpleNamespace(path='/api/posts/')
+            registry.observe_query('INSERT INTO posts', 0.01)
+            await send({'type': 'http.response.start', 'status': 201, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'{', 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'}'})
+            # Background tasks run after the response was sent, in the same call.
+            for _ in range(3):
+                registry.observe_query('UPDATE posts', 0.5)
+
+        with patch('src.services.metrics.perf_counter', lambda: next(clock)):
+            await call(MetricsMiddleware(app, registry))
+
+        histogram = registry.requests[('GET', '/api/posts/', 201)]
+        self.assertEqual(histogram.count, 1)
+        self.assertAlmostEqual(histogram.total, 0.05)
+        self.assertEqual(registry.request_queries['/api/posts/'].total, 1)
+        self.assertAlmostEqual(registry.request_db_seconds['/api/posts/'], 0.01)
+        self.assertEqual(registry.background_queries['/api/posts/'], 3)
+        self.assertAlmostEqual(registry.background_db_seconds['/api/posts/'], 1.5)
+        self.assertIn('http_background_db_queries_total{route="/api/posts/"} 3', registry.render())
+
+    async def test_middleware_error(self):
+
+        registry = Metrics(buckets=[0.1, 1.0])
+
+        async def failing(scope, receive, send):
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            await call(MetricsMiddleware(failing, registry))
+
+        self.assertEqual(registry.requests[('GET', 'unmatched', 500)].count, 1)
+
+    async def test_timed(self):
+
+        registry = Metrics()
+        original = metrics_module.metrics
+        metrics_module.metrics = registry
+
+        async def send_message(client, message):
+            return message
+
+        def upload(file):
+            raise ValueError(file)
+
+        try:
+            self.assertEqual(await timed(send_message, 'smtp', 'send_message')(None, 'hello'), 'hello')
+            with self.assertRaises(ValueError):
+                timed(upload, 'cloudinary', 'upload')('file')
+        finally:
+            metrics_module.metrics = original
+
+        self.assertEqual(registry.calls[('smtp', 'send_message', 'ok')], 1)
+        self.assertEqual(registry.calls[('cloudinary', 'upload', 'error')], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from datetime import datetime, timezone
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.repository import post_versions as post_versions_repository  # noqa: E402
+from src.services import events, post_versions  # noqa: E402
+from src.services.cache import ResponseCache  # noqa: E402
+
+
+def get_db():
+    return MagicMock(spec=Session)
+
+
+def local_cache():
+    # Only the in-process tier, Redis is never tried.
+    cache = ResponseCache(key_prefix='post_version')
+    cache.redis_retry_at = float('inf')
+    return cache
+
+
+class TestConditionalPost(unittest.TestCase):
+
+    def setUp(self):
+        self.updated_at = datetime(2024, 3, 1, 12, 30, 15, 500)
+        self.get_post_version = AsyncMock(return_value=(3, self.updated_at))
+        for patcher in (
+            patch.object(post_versions, 'version_cache', local_cache()),
+            patch.object(post_versions, 'get_post_version', self.get_post_version),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.calls = 0
+        app = FastAPI()
+
+        @app.get('/posts/{post_id}')
+        @post_versions.conditional_post
+        async def read_post(post_id: int, db: Session = Depends(get_db)):
+            self.calls += 1
+            return {'id': post_id}
+
+        self.client = TestClient(app)
+        self.last_modified = self.client.get('/posts/1').headers['Last-Modified']
+        self.calls = 0
+
+    def test_headers(self):
+
+        response = self.client.get('/posts/1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'id': 1})
+        self.assertEqual(response.headers['ETag'], '"post-1-v3"')
+        expected = self.updated_at.astimezone(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')
+        self.assertEqual(response.headers['Last-Modified'], expected)
+
+    def test_endpoint_reads_primary(self):
+
+        session = Session()
+        reads = []
+        app = FastAPI()
+
+        @app.get('/posts/{post_id}')
+        @post_versions.conditional_post
+        async def read_post(post_id: int, db: Session = Depends(lambda: session)):
+            reads.append(db.info.get('primary'))
+            return {'id': post_id}
+
+        self.assertEqual(TestClient(app).get('/posts/1').headers['ETag'], '"post-1-v3"')
+        self.assertEqual(reads, [True])
+
+    def test_etag_match(self):
+
+        response = self.client.get('/posts/1', headers={'If-None-Match': '"post-1-v3"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], '"post-1-v3"')
+        self.assertEqual(self.calls, 0)
+
+    def test_etag_mismatch(self):
+
+        response = self.client.get('/posts/1', headers={'If-None-Match': '"post-1-v2"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+    def test_etag_takes_precedence_over_if_modified_since(self):
+
+        response = self.client.get('/posts/1', headers={
+            'If-None-Match': '"post-1-v2"',
+            'If-Modified-Since': self.last_modified,
+        })
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+
+        response = self.client.get('/posts/1', headers={'If-Modified-Since': self.last_modified})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.calls, 0)
+
+    def test_modified_since(self):
+
+        response = self.client.get('/posts/1', headers={'If-Modified-Since': 'Thu, 01 Jan 2015 00:00:00 GMT'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalid_if_modified_since(self):
+
+        response = self.client.get('/posts/1', headers={'If-Modified-Since': 'yesterday'})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_post_calls_endpoint(self):
+
+        self.get_post_version.return_value = None
+
+        response = self.client.get('/posts/2', headers={'If-None-Match': '*'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+
+class TestVersionCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.version_cache = local_cache()
+        patcher = patch.object(post_versions, 'version_cache', self.version_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_local_time_converted_to_utc(self):
+
+        updated_at = datetime(2024, 3, 1, 12, 0)
+        with patch.object(post_versions, 'get_post_version', AsyncMock(return_value=(1, updated_at))):
+            _, first = await post_versions.get_version(1, MagicMock())
+            _, cached = await post_versions.get_version(1, MagicMock())
+
+        expected = datetime.fromtimestamp(time.mktime(updated_at.timetuple()), timezone.utc)
+        self.assertEqual(first, expected)
+        self.assertEqual(cached, expected)
+        self.assertEqual(first.tzinfo, timezone.utc)
+
+    async def test_missing_updated_at(self):
+
+        with patch.object(post_versions, 'get_post_version', AsyncMock(return_value=(1, None))):
+            version, updated_at = await post_versions.get_version(1, MagicMock())
+
+        self.assertEqual(updated_at, datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+    async def test_invalidated_on_bump(self):
+
+        db = MagicMock(spec=Session)
+        get_post_version = AsyncMock(side_effect=[(1, datetime(2024, 3, 1)), (2, datetime(2024, 3, 2))])
+
+        with patch.object(post_versions, 'get_post_version', get_post_version), \
+                patch.dict(events.handlers, {events.COMMENTS_CHANGED: [post_versions.invalidate_version]}):
+            self.assertEqual((await post_versions.get_version(1, db))[0], 1)
+            self.assertEqual((await post_versions.get_version(1, db))[0], 1)
+
+            # Write functions bump the version in their transaction and emit the event after commit.
+            await post_versions_repository.bump_post_version(db, 1)
+            await events.emit(events.COMMENTS_CHANGED, post_id=1, user_id=1)
+
+            self.assertEqual((await post_versions.get_version(1, db))[0], 2)
+
+        db.execute.assert_called_once()
+        self.assertEqual(get_post_version.await_count, 2)
+
+    async def test_tag_change_invalidates_tagged_posts(self):
+
+        get_post_version = AsyncMock(return_value=(1, datetime(2024, 3, 1)))
+
+        with patch.object(post_versions, 'get_post_version', get_post_version), \
+                patch.dict(events.handlers, {events.TAG_CHANGED: [post_versions.invalidate_tagged_versions]}):
+            for post_id in (1, 2, 3):
+                await post_versions.get_version(post_id, MagicMock())
+
+            await events.emit(events.TAG_CHANGED, tag='cats', post_ids=[1, 2])
+
+            for post_id in (1, 2, 3):
+                await post_versions.get_version(post_id, MagicMock())
+
+        self.assertEqual([call.args[0] for call in get_post_version.await_args_list], [1, 2, 3, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import BackgroundTasks, HTTPException
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import User  # noqa: E402
+from src.repository.read_models import PostRecord  # noqa: E402
+from src.services.images import ImageMetadata  # noqa: E402
+from src.services.posts import PostService  # noqa: E402
+
+
+def uploaded(name):
+    return {
+        'public_id': f'photoshare/{name}',
+        'url': f'https://example.com/{name}',
+        'metadata': ImageMetadata(width=10, height=10, orientation=1, phash='0000000000000001'),
+    }
+
+
+def file(name):
+    upload = MagicMock()
+    upload.filename = name
+    return upload
+
+
+def add_posts(rows, user, db):
+    return [
+        PostRecord(i, row['post_url'], user.id, None, None, row['description'], 0.0)
+        for i, row in enumerate(rows, start=100)
+    ]
+
+
+class TestCreatePosts(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.service = PostService()
+        self.user = User(id=1)
+        self.db = MagicMock(spec=Session)
+        self.background_tasks = BackgroundTasks()
+
+        self.add_posts = AsyncMock(side_effect=add_posts)
+        self.get_post = AsyncMock(return_value={'id': 7})
+        self.post_exists = AsyncMock(return_value=True)
+        self.enqueue_media_deletion = AsyncMock()
+        self.duplicate_index = MagicMock()
+        for patcher in (
+            patch('src.services.posts.add_posts', self.add_posts),
+            patch('src.services.posts.get_post', self.get_post),
+            patch('src.services.posts.post_exists', self.post_exists),
+            patch('src.services.posts.enqueue_media_deletion', self.enqueue_media_deletion),
+            patch('src.services.posts.duplicate_index', self.duplicate_index),
+            patch('src.services.posts.comment_service', MagicMock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def create_posts(self, names, descriptions=()):
+        return await self.service.create_posts([file(name) for name in names], list(descriptions), self.user, self.db, self.background_tasks)
+
+    async def test_results_per_file(self):
+
+        outcomes = {
+            'new.png': uploaded('new'),
+            'duplicate.png': {'duplicate_of': 7, 'metadata': None},
+            'text.txt': HTTPException(status_code=415, detail='File is not a supported image'),
+            'broken.png': RuntimeError('Cloudinary is down'),
+        }
+
+        async def upload_post(file, user, check_duplicates=True):
+            outcome = outcomes[file.filename]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with patch.object(self.service, 'upload_post', side_effect=upload_post):
+            results = await self.create_posts(outcomes, ['new post'])
+
+        self.assertEqual([result['status_code'] for result in results], [201, 200, 415, 502])
+        self.assertEqual([result['index'] for result in results], [0, 1, 2, 3])
+        self.assertEqual(results[0]['post'].id, 100)
+        self.assertEqual(results[0]['post'].description, 'new post')
+        self.assertEqual(results[1]['post'], {'id': 7})
+        self.assertEqual(results[2]['detail'], 'File is not a supported image')
+        self.assertEqual(results[3]['detail'], 'Upload failed')
+
+        self.add_posts.assert_awaited_once()
+        self.assertEqual([row['public_id'] for row in self.add_posts.await_args.args[0]], ['photoshare/new'])
+        self.duplicate_index.add.assert_called_once_with(100, '0000000000000001', 1)
+        self.assertEqual(len(self.background_tasks.tasks), 1)
+
+    async def test_stale_duplicate_uploaded_again(self):
+
+        self.post_exists.return_value = False
+        upload_post = AsyncMock(side_effect=[{'duplicate_of': 7, 'metadata': None}, uploaded('new')])
+
+        with patch.object(self.service, 'upload_post', upload_post):
+            results = await self.create_posts(['new.png'])
+
+        self.assertEqual(results[0]['status_code'], 201)
+        self.duplicate_index.remove.assert_called_once_with(7)
+        self.assertFalse(upload_post.await_args.kwargs['check_duplicates'])
+
+    async def test_concurrency_limit(self):
+
+        running = 0
+        peak = 0
+
+        async def upload_post(file, user, check_duplicates=True):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return uploaded(file.filename)
+
+        with patch.object(self.service, 'upload_post', side_effect=upload_post), \
+                patch('src.services.posts.settings.posts_batch_concurrency', 2):
+            results = await self.create_posts([f'{i}.png' for i in range(6)])
+
+        self.assertEqual(peak, 2)
+        self.assertEqual([result['status_code'] for result in results], [201] * 6)
+
+    async def test_failed_insert_queues_uploads_for_deletion(self):
+
+        self.add_posts.side_effect = OperationalError('INSERT', {}, Exception('connection lost'))
+        outcomes = {'a.png': uploaded('a'), 'b.png': uploaded('b'), 'text.txt': HTTPException(status_code=415, detail='')}
+
+        async def upload_post(file, user, check_duplicates=True):
+            outcome = outcomes[file.filename]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with patch.object(self.service, 'upload_post', side_effect=upload_post):
+            with self.assertRaises(OperationalError):
+                await self.create_posts(outcomes)
+
+        self.db.rollback.assert_called_once()
+        self.enqueue_media_deletion.assert_awaited_once_with(self.db, 'photoshare/a', 'photoshare/b')
+        self.db.commit.assert_called_once()
+        self.duplicate_index.add.assert_not_called()
+
+    async def test_failed_outbox_keeps_original_error(self):
+
+        self.add_posts.side_effect = OperationalError('INSERT', {}, Exception('connection lost'))
+        self.enqueue_media_deletion.side_effect = OperationalError('SELECT', {}, Exception('connection lost'))
+
+        with patch.object(self.service, 'upload_post', AsyncMock(return_value=uploaded('a'))):
+            with self.assertRaises(OperationalError) as context:
+                await self.create_posts(['a.png'])
+
+        self.assertEqual(context.exception.statement, 'INSERT')
+        self.assertEqual(self.db.rollback.call_count, 2)
+        self.db.commit.assert_not_called()
+
+
+class TestCreatePost(unittest.IsolatedAsyncioTestCase):
+
+    async def test_failed_insert_queues_upload_for_deletion(self):
+
+        service = PostService()
+        db = MagicMock(spec=Session)
+        error = OperationalError('INSERT', {}, Exception('connection lost'))
+
+        with patch.object(service, 'upload_post', AsyncMock(return_value=uploaded('a'))), \
+                patch('src.services.posts.add_post', AsyncMock(side_effect=error)), \
+                patch('src.services.posts.enqueue_media_deletion', AsyncMock()) as enqueue_media_deletion:
+            with self.assertRaises(OperationalError):
+                await service.create_post(file('a.png'), 'description', User(id=1), db, BackgroundTasks())
+
+        enqueue_media_deletion.assert_awaited_once_with(db, 'photoshare/a')
+        db.commit.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services.rate_limits import LocalBuckets, Quota, RateLimiter  # noqa: E402
+
+
+LIMITS = {'search': {'user': 2, 'admin': 4}}
+
+
+class TestLocalBuckets(unittest.TestCase):
+
+    def test_take(self):
+
+        buckets = LocalBuckets(size=10)
+
+        with patch('src.services.rate_limits.time.monotonic', return_value=100.0):
+            results = [buckets.take('key', 2, 1.0, 1) for _ in range(3)]
+
+        self.assertEqual([allowed for allowed, _, _ in results], [True, True, False])
+        self.assertEqual(results[2][2], 1.0)
+
+    def test_refill(self):
+
+        buckets = LocalBuckets(size=10)
+
+        with patch('src.services.rate_limits.time.monotonic', return_value=100.0):
+            buckets.take('key', 2, 1.0, 2)
+        with patch('src.services.rate_limits.time.monotonic', return_value=101.5):
+            allowed, tokens, _ = buckets.take('key', 2, 1.0, 1)
+
+        self.assertTrue(allowed)
+        self.assertEqual(tokens, 0.5)
+
+    def test_size(self):
+
+        buckets = LocalBuckets(size=2)
+
+        for key in ('first', 'second', 'third'):
+            buckets.take(key, 2, 1.0, 1)
+
+        self.assertEqual(list(buckets.buckets), ['second', 'third'])
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(limits=LIMITS, period=60, api_keys={})
+        self.limiter.token_bucket = AsyncMock()
+
+    def test_capacity(self):
+
+        self.assertEqual(self.limiter.capacity('search', 'admin'), 4)
+        self.assertEqual(self.limiter.capacity('search', 'moderator'), 2)
+
+    async def test_hit(self):
+
+        self.limiter.token_bucket.return_value = [1, 3, 0]
+
+        quota = await self.limiter.hit('search', 'user:1', 'admin')
+
+        self.assertEqual(quota, Quota(allowed=True, limit=4, remaining=3, retry_after=0.0, reset=15.0))
+        self.limiter.token_bucket.assert_awaited_once_with(keys=['ratelimit:search:user:1'], args=[4, 4 / 60 / 1000, 1])
+
+    async def test_hit_limited(self):
+
+        self.limiter.token_bucket.return_value = [0, 0, 15000]
+
+        quota = await self.limiter.hit('search', 'user:1', 'admin')
+
+        self.assertFalse(quota.allowed)
+        self.assertEqual(quota.headers['Retry-After'], '15')
+        self.assertEqual(quota.headers['X-RateLimit-Remaining'], '0')
+
+    async def test_hit_cost_over_capacity(self):
+
+        self.limiter.token_bucket.return_value = [1, 0, 0]
+
+        await self.limiter.hit('search', 'user:1', 'user', cost=10)
+
+        self.assertEqual(self.limiter.token_bucket.await_args.kwargs['args'][2], 2)
+
+    async def test_hit_without_redis(self):
+
+        self.limiter.token_bucket.side_effect = ConnectionError("refused")
+
+        results = [(await self.limiter.hit('search', 'user:1', 'user')).allowed for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+        self.limiter.token_bucket.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services.refresh_tokens import REUSED, ROTATED, RefreshTokenStore, token_hash  # noqa: E402
+
+
+class TestRefreshTokenStore(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.store = RefreshTokenStore(ttl=60)
+        self.store.rotate_script = AsyncMock()
+
+    async def test_rotate(self):
+
+        self.store.rotate_script.return_value = ROTATED
+
+        result = await self.store.rotate("family", "test@example.com", "old", "new")
+
+        self.assertEqual(result, ROTATED)
+        self.store.rotate_script.assert_awaited_once_with(
+            keys=["refresh:family:family", "refresh:user:test@example.com"],
+            args=[token_hash("old"), token_hash("new"), 60, "family"],
+        )
+
+    async def test_rotate_reused_token(self):
+
+        self.store.rotate_script.return_value = REUSED
+
+        result = await self.store.rotate("family", "test@example.com", "old", "new")
+
+        self.assertEqual(result, REUSED)
+
+    async def test_rotate_without_redis(self):
+
+        self.store.rotate_script.side_effect = ConnectionError("refused")
+
+        with self.assertRaises(HTTPException) as context:
+            await self.store.rotate("family", "test@example.com", "old", "new")
+
+        self.assertEqual(context.exception.status_code, 503)
+
+    async def test_revoke_all(self):
+
+        self.store.redis = MagicMock()
+        self.store.redis.smembers = AsyncMock(return_value={b"first", b"second"})
+        self.store.redis.delete = AsyncMock()
+
+        await self.store.revoke_all("test@example.com")
+
+        args = self.store.redis.delete.await_args[0]
+        self.assertEqual(args[0], "refresh:user:test@example.com")
+        self.assertEqual(set(args[1:]), {"refresh:family:first", "refresh:family:second"})
+
+
+if __name__ == '__main__':
+    unittest.main()
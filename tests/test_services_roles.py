@@ -0,0 +1,75 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import User, UserRole  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.roles import Permission, PermissionAccess, RoleAccess, can, get_principal  # noqa: E402
+
+
+def make_request():
+    return Request({'type': 'http', 'headers': []})
+
+
+class TestRoles(unittest.IsolatedAsyncioTestCase):
+
+    def test_can(self):
+
+        self.assertTrue(can(User(user_role=UserRole.admin), Permission.change_roles))
+        self.assertTrue(can(User(user_role=UserRole.moderator), Permission.ban_users))
+        self.assertFalse(can(User(user_role=UserRole.moderator), Permission.unban_users))
+        self.assertFalse(can(User(user_role=UserRole.user), Permission.manage_users))
+
+    async def test_get_principal(self):
+
+        request = make_request()
+        user = User(id=1, user_role=UserRole.moderator)
+
+        principal = await get_principal(request, user)
+
+        self.assertIs(await get_principal(request, user), principal)
+        self.assertTrue(principal.can(Permission.delete_comments))
+        self.assertFalse(principal.can(Permission.edit_any_post))
+
+    async def test_access(self):
+
+        request = make_request()
+        principal = await get_principal(request, User(id=1, user_role=UserRole.user))
+
+        with self.assertRaises(HTTPException) as context:
+            await PermissionAccess(Permission.manage_users)(request, principal)
+        self.assertEqual(context.exception.status_code, 403)
+
+        with self.assertRaises(HTTPException):
+            await RoleAccess([UserRole.admin])(request, principal)
+
+    async def test_get_current_user_once(self):
+
+        request = make_request()
+        user = User(id=1, email="test@example.com", user_role=UserRole.user, is_active=True)
+        claims = {'sub': user.email, 'scope': 'access_token'}
+
+        with patch('src.services.auth.verified_tokens.verify', return_value=claims) as verify, \
+                patch('src.services.auth.repository_users.is_blacklisted_token', AsyncMock(return_value=False)), \
+                patch('src.services.auth.repository_users.get_user_by_email', AsyncMock(return_value=user)) as get_user:
+            first = await auth_service.get_current_user(request, "token", MagicMock())
+            second = await auth_service.get_current_user(request, "token", MagicMock())
+
+        self.assertIs(first, user)
+        self.assertIs(second, user)
+        self.assertEqual(request.state.claims, claims)
+        verify.assert_called_once()
+        get_user.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
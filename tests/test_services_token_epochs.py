@@ -0,0 +1,211 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from datetime import datetime, timezone
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import User, UserRole  # noqa: E402
+from src.routes.users import manage_user  # noqa: E402
+from src.schemas.users import Action  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.roles import Permission, Principal  # noqa: E402
+from src.services.token_epochs import TokenEpochs  # noqa: E402
+
+
+def make_epochs(results=None, error=None):
+    epochs = TokenEpochs()
+    epochs.redis = MagicMock()
+    pipe = epochs.redis.pipeline.return_value.__aenter__.return_value
+    pipe.execute = AsyncMock(return_value=results, side_effect=error)
+    epochs.bump_script = AsyncMock(return_value=3)
+    return epochs
+
+
+CLAIMS = {'sub': 'test@example.com', 'uid': 1, 'role': 'moderator', 'active': True, 'epoch': 2}
+
+
+class TestTokenEpochs(unittest.IsolatedAsyncioTestCase):
+
+    async def test_check(self):
+
+        epochs = make_epochs([b'2', 0])
+
+        self.assertEqual(await epochs.check(1, "token"), (2, False))
+
+    async def test_check_missing_epoch(self):
+
+        # Redis lost the key, reading it as epoch 0 would accept tokens issued before a ban.
+        epochs = make_epochs([None, 0])
+
+        self.assertIsNone(await epochs.check(1, "token"))
+
+    async def test_current_creates_epoch(self):
+
+        epochs = make_epochs([True, b'1700000000000'])
+
+        with patch('src.services.token_epochs.time.time', return_value=1700000000.0):
+            self.assertEqual(await epochs.current(1), 1700000000000)
+
+        pipe = epochs.redis.pipeline.return_value.__aenter__.return_value
+        pipe.set.assert_called_once_with('token:epoch:1', 1700000000000, nx=True)
+
+    async def test_bump_never_below_clock(self):
+
+        epochs = make_epochs()
+
+        with patch('src.services.token_epochs.time.time', return_value=1700000000.0):
+            self.assertEqual(await epochs.bump(1), 3)
+
+        epochs.bump_script.assert_awaited_once_with(keys=['token:epoch:1'], args=[1700000000000])
+
+    async def test_check_without_redis(self):
+
+        epochs = make_epochs(error=ConnectionError("refused"))
+
+        self.assertIsNone(await epochs.check(1, "token"))
+        self.assertIsNone(await epochs.check(1, "token"))
+        epochs.redis.pipeline.assert_called_once()
+
+    async def test_bump_without_redis(self):
+
+        epochs = make_epochs()
+        epochs.bump_script.side_effect = ConnectionError("refused")
+
+        with self.assertRaises(HTTPException) as context:
+            await epochs.bump(1)
+
+        self.assertEqual(context.exception.status_code, 503)
+
+    async def test_bumped(self):
+
+        epochs = make_epochs()
+        changed = MagicMock()
+
+        async with epochs.bumped(1):
+            self.assertEqual(epochs.bump_script.await_count, 1)
+            changed()
+
+        self.assertEqual(epochs.bump_script.await_count, 2)
+        changed.assert_called_once()
+
+    async def test_bumped_without_redis_changes_nothing(self):
+
+        epochs = make_epochs()
+        epochs.bump_script.side_effect = ConnectionError("refused")
+        changed = MagicMock()
+
+        with self.assertRaises(HTTPException):
+            async with epochs.bumped(1):
+                changed()
+
+        changed.assert_not_called()
+
+    async def test_bumped_second_bump_failure_is_logged(self):
+
+        epochs = make_epochs()
+        epochs.bump_script.side_effect = [3, ConnectionError("refused")]
+
+        with self.assertLogs('src.services.token_epochs', 'ERROR'):
+            async with epochs.bumped(1):
+                pass
+
+    async def test_revoke(self):
+
+        epochs = make_epochs()
+        epochs.redis.set = AsyncMock()
+        expires_at = datetime.now(timezone.utc).timestamp() + 60
+
+        await epochs.revoke("token", expires_at)
+        await epochs.revoke("token", expires_at - 120)
+
+        epochs.redis.set.assert_awaited_once()
+        self.assertIn(epochs.redis.set.await_args.kwargs['ex'], (60, 61))
+
+
+class TestUserFromClaims(unittest.IsolatedAsyncioTestCase):
+
+    async def test_user_from_claims(self):
+
+        with patch('src.services.auth.token_epochs.check', AsyncMock(return_value=(2, False))):
+            user = await auth_service.user_from_claims(CLAIMS, "token")
+
+        self.assertEqual(user.id, 1)
+        self.assertEqual(user.email, 'test@example.com')
+        self.assertEqual(user.user_role, UserRole.moderator)
+
+    async def test_stale_epoch(self):
+
+        with patch('src.services.auth.token_epochs.check', AsyncMock(return_value=(3, False))):
+            with self.assertRaises(HTTPException) as context:
+                await auth_service.user_from_claims(CLAIMS, "token")
+
+        self.assertEqual(context.exception.status_code, 401)
+
+    async def test_revoked(self):
+
+        with patch('src.services.auth.token_epochs.check', AsyncMock(return_value=(2, True))):
+            with self.assertRaises(HTTPException):
+                await auth_service.user_from_claims(CLAIMS, "token")
+
+    async def test_without_epoch(self):
+
+        with patch('src.services.auth.token_epochs.check', AsyncMock()) as check:
+            self.assertIsNone(await auth_service.user_from_claims({'sub': 'test@example.com'}, "token"))
+
+        check.assert_not_awaited()
+
+    async def test_without_redis(self):
+
+        with patch('src.services.auth.token_epochs.check', AsyncMock(return_value=None)):
+            self.assertIsNone(await auth_service.user_from_claims(CLAIMS, "token"))
+
+
+class TestManageUser(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.principal = Principal(user=User(id=1), permissions=frozenset(Permission))
+        self.user = User(id=2, email='user@example.com', is_active=True)
+        self.bump = AsyncMock()
+        self.revoke_all = AsyncMock()
+        self.ban_user = AsyncMock(return_value=self.user)
+        for patcher in (
+            patch('src.routes.users.token_epochs.bump', self.bump),
+            patch('src.routes.users.refresh_tokens.revoke_all', self.revoke_all),
+            patch('src.repository.users.get_user_by_id', AsyncMock(return_value=self.user)),
+            patch('src.repository.users.ban_user', self.ban_user),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_ban_bumps_around_the_change(self):
+
+        calls = MagicMock()
+        self.bump.side_effect = lambda user_id: calls.bump(user_id)
+        self.revoke_all.side_effect = lambda email: calls.revoke_all(email)
+        self.ban_user.side_effect = lambda email, db: calls.ban_user(email)
+
+        await manage_user(2, Action.ban, principal=self.principal, db=MagicMock())
+
+        self.assertEqual([call[0] for call in calls.mock_calls], ['bump', 'revoke_all', 'ban_user', 'bump'])
+
+    async def test_ban_without_redis_is_not_committed(self):
+
+        self.bump.side_effect = HTTPException(status_code=503)
+
+        with self.assertRaises(HTTPException) as context:
+            await manage_user(2, Action.ban, principal=self.principal, db=MagicMock())
+
+        self.assertEqual(context.exception.status_code, 503)
+        self.ban_user.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()
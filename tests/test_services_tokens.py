@@ -0,0 +1,147 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jose import JWTError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.services.tokens import KeySet, VerifiedTokens, pyjwt, unverified_header  # noqa: E402
+
+
+def write_key(directory, kid, private_key, public_only=False):
+    if public_only:
+        pem = private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    else:
+        pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    with open(os.path.join(directory, f'{kid}.pem'), 'wb') as f:
+        f.write(pem)
+
+
+class TestKeySet(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.old_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.new_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def claims(self):
+        return {'sub': 'test@example.com', 'exp': int(time.time()) + 60}
+
+    def test_sign_with_last_kid(self):
+
+        write_key(self.directory.name, '2024-01', self.old_key)
+        write_key(self.directory.name, '2024-02', self.new_key)
+        keys = KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='jose')
+
+        token = keys.sign(self.claims())
+
+        self.assertEqual(unverified_header(token)['kid'], '2024-02')
+        self.assertEqual(unverified_header(token)['alg'], 'RS256')
+        self.assertEqual(keys.verify(token)['sub'], 'test@example.com')
+
+    def test_rotation_keeps_old_tokens_valid(self):
+
+        write_key(self.directory.name, '2024-01', self.old_key)
+        old_token = KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='jose').sign(self.claims())
+
+        os.remove(os.path.join(self.directory.name, '2024-01.pem'))
+        write_key(self.directory.name, '2024-01', self.old_key, public_only=True)
+        write_key(self.directory.name, '2024-02', self.new_key)
+        keys = KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='jose')
+
+        self.assertEqual(keys.signing.kid, '2024-02')
+        self.assertEqual(keys.verify(old_token)['sub'], 'test@example.com')
+        self.assertEqual([key['kid'] for key in keys.jwks()['keys']], ['2024-01', '2024-02'])
+        self.assertTrue(all('d' not in key for key in keys.jwks()['keys']))
+
+    def test_unknown_kid(self):
+
+        write_key(self.directory.name, 'other', self.old_key)
+        token = KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='jose').sign(self.claims())
+        os.remove(os.path.join(self.directory.name, 'other.pem'))
+        write_key(self.directory.name, 'current', self.new_key)
+
+        keys = KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='jose')
+
+        with self.assertRaises(JWTError):
+            keys.verify(token)
+
+    def test_legacy_tokens(self):
+
+        legacy_token = KeySet(keys_dir=None, active_kid=None, accept_legacy=True, backend='jose').sign(self.claims())
+        write_key(self.directory.name, '2024-01', self.old_key)
+
+        self.assertEqual(KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=True, backend='jose').verify(legacy_token)['sub'], 'test@example.com')
+        with self.assertRaises(JWTError):
+            KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='jose').verify(legacy_token)
+
+    def test_eddsa_needs_pyjwt(self):
+
+        write_key(self.directory.name, 'ed', ed25519.Ed25519PrivateKey.generate())
+
+        with self.assertRaises(ValueError):
+            KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='jose')
+
+    @unittest.skipIf(pyjwt is None, 'PyJWT is not installed')
+    def test_eddsa_with_pyjwt(self):
+
+        write_key(self.directory.name, 'ed', ed25519.Ed25519PrivateKey.generate())
+        keys = KeySet(keys_dir=self.directory.name, active_kid=None, accept_legacy=False, backend='auto')
+
+        token = keys.sign(self.claims())
+
+        self.assertEqual(unverified_header(token)['alg'], 'EdDSA')
+        self.assertEqual(keys.verify(token)['sub'], 'test@example.com')
+        self.assertEqual(keys.jwks()['keys'][0]['kty'], 'OKP')
+
+
+class TestVerifiedTokens(unittest.TestCase):
+
+    def test_cached_until_exp(self):
+
+        key_set = MagicMock()
+        key_set.verify.return_value = {'sub': 'test@example.com', 'exp': time.time() + 60}
+        tokens = VerifiedTokens(key_set, size=2)
+
+        tokens.verify('token')
+        tokens.verify('token')
+
+        key_set.verify.assert_called_once_with('token')
+
+    def test_expired_entry_is_verified_again(self):
+
+        key_set = MagicMock()
+        key_set.verify.return_value = {'sub': 'test@example.com', 'exp': time.time() - 1}
+        tokens = VerifiedTokens(key_set, size=2)
+
+        tokens.verify('token')
+        tokens.verify('token')
+
+        self.assertEqual(key_set.verify.call_count, 2)
+
+    def test_size(self):
+
+        key_set = MagicMock()
+        key_set.verify.return_value = {'sub': 'test@example.com', 'exp': time.time() + 60}
+        tokens = VerifiedTokens(key_set, size=2)
+
+        for token in ('a', 'b', 'c'):
+            tokens.verify(token)
+
+        self.assertEqual(len(tokens.entries), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
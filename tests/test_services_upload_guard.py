@@ -0,0 +1,177 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+from io import BytesIO
+import struct
+import unittest
+import zlib
+
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import User, UserRole  # noqa: E402
+from src.services.upload_guard import BodySizeLimitMiddleware, UploadGuard, rejections, sniff_format  # noqa: E402
+
+
+def encode(image_format, size=(8, 8)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (10, 20, 30)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def png_header(width, height):
+    # A PNG that declares its dimensions but has no pixel data.
+    ihdr = png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    return b'\x89PNG\r\n\x1a\n' + ihdr + png_chunk(b'IEND', b'')
+
+
+def upload(data, size=True):
+    return UploadFile(file=BytesIO(data), size=len(data) if size else None)
+
+
+class TestSniffFormat(unittest.TestCase):
+
+    def test_formats(self):
+
+        for image_format, name in (('JPEG', 'jpeg'), ('PNG', 'png'), ('GIF', 'gif'), ('BMP', 'bmp'), ('TIFF', 'tiff'), ('WEBP', 'webp')):
+            with self.subTest(image_format):
+                self.assertEqual(sniff_format(encode(image_format)[:16]), name)
+
+    def test_avif(self):
+
+        self.assertEqual(sniff_format(b'\x00\x00\x00\x1cftypavif\x00\x00\x00\x00'), 'avif')
+        self.assertIsNone(sniff_format(b'\x00\x00\x00\x1cftypmp42\x00\x00\x00\x00'))
+
+    def test_unknown(self):
+
+        self.assertIsNone(sniff_format(b'%PDF-1.7\n'))
+        self.assertIsNone(sniff_format(b'RIFF\x00\x00\x00\x00WAVE'))
+        self.assertIsNone(sniff_format(b''))
+
+
+class TestUploadGuard(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.guard = UploadGuard(
+            max_bytes={'user': 1000, 'moderator': 2000, 'admin': 4000},
+            max_pixels={'user': 48_000_000, 'moderator': 80_000_000, 'admin': 120_000_000},
+            formats=['jpeg', 'png'],
+        )
+        self.user = User(id=1, user_role=UserRole.user)
+        self.moderator = User(id=2, user_role=UserRole.moderator)
+        rejections.clear()
+
+    async def assert_rejected(self, file, user, status_code, reason):
+        with self.assertRaises(HTTPException) as context:
+            await self.guard.check(file, user)
+        self.assertEqual(context.exception.status_code, status_code)
+        self.assertEqual(rejections[(reason, user.user_role.value if user else 'user')], 1)
+
+    async def test_accepts_image(self):
+
+        data = encode('PNG')
+
+        self.assertEqual(await self.guard.check(upload(data), self.user), data)
+
+    async def test_unsupported_format(self):
+
+        await self.assert_rejected(upload(encode('GIF')), self.user, 415, 'format')
+
+    async def test_not_an_image(self):
+
+        await self.assert_rejected(upload(b'%PDF-1.7\n' + b'0' * 100), self.user, 415, 'format')
+
+    async def test_broken_image_with_image_signature(self):
+
+        await self.assert_rejected(upload(b'\xff\xd8\xff' + b'\x00' * 100), self.user, 415, 'format')
+
+    async def test_size_by_role(self):
+
+        data = encode('PNG') + b'\x00' * 1500
+
+        await self.assert_rejected(upload(data), self.user, 413, 'size')
+        self.assertEqual(await self.guard.check(upload(data), self.moderator), data)
+
+    async def test_size_counted_while_reading(self):
+
+        # Without a declared size the limit is enforced on the bytes actually read.
+        await self.assert_rejected(upload(encode('PNG') + b'\x00' * 1500, size=False), self.user, 413, 'size')
+
+    async def test_without_user_limits_of_user_role_apply(self):
+
+        with self.assertRaises(HTTPException) as context:
+            await self.guard.check(upload(encode('PNG') + b'\x00' * 1500))
+
+        self.assertEqual(context.exception.status_code, 413)
+
+    async def test_dimensions_from_header_by_role(self):
+
+        # 60 megapixels: over the user limit, under the moderator limit, never decoded.
+        data = png_header(10_000, 6_000)
+
+        await self.assert_rejected(upload(data), self.user, 413, 'dimensions')
+        self.assertEqual(await self.guard.check(upload(data), self.moderator), data)
+
+    async def test_decompression_bomb(self):
+
+        await self.assert_rejected(upload(png_header(30_000, 30_000)), self.moderator, 413, 'dimensions')
+
+
+class TestBodySizeLimitMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        app = FastAPI()
+
+        @app.post('/upload')
+        @app.post('/batch')
+        async def receive(request: Request):
+            return {'received': len(await request.body())}
+
+        app.add_middleware(BodySizeLimitMiddleware, max_bytes=100, path_limits={'/batch': 1000})
+        self.client = TestClient(app)
+        rejections.clear()
+
+    def test_within_limit(self):
+
+        response = self.client.post('/upload', content=b'x' * 100)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'received': 100})
+
+    def test_content_length_over_limit(self):
+
+        response = self.client.post('/upload', content=b'x' * 101)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(rejections[('size', 'request')], 1)
+
+    def test_chunked_body_over_limit(self):
+
+        def body():
+            for _ in range(5):
+                yield b'x' * 30
+
+        response = self.client.post('/upload', content=body())
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(rejections[('size', 'request')], 1)
+
+    def test_path_limits(self):
+
+        self.assertEqual(self.client.post('/batch', content=b'x' * 500).status_code, 200)
+        self.assertEqual(self.client.post('/batch/', content=b'x' * 500).status_code, 200)
+        self.assertEqual(self.client.post('/batch', content=b'x' * 1001).status_code, 413)
+        self.assertEqual(self.client.post('/upload', content=b'x' * 500).status_code, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+import tempfile
+import time
+import unittest
+
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+load_dotenv()
+
+from src.database.models import User, UserRole  # noqa: E402
+from src.services.uploads import UploadStore  # noqa: E402
+
+
+async def body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestUploadStore(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.store = UploadStore(directory=self.directory, ttl=60)
+        self.user = User(id=1, user_role=UserRole.user)
+        self.data = bytes(range(256)) * 4
+
+    def read_part(self, upload_id):
+        with open(os.path.join(self.directory, f'{upload_id}.part'), 'rb') as f:
+            return f.read()
+
+    async def test_create(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+
+        self.assertEqual((session.offset, session.length, session.user_id), (0, 1024, 1))
+        self.assertEqual(await self.store.get(session.id, self.user), session)
+        self.assertEqual(self.read_part(session.id), b'')
+
+    async def test_create_length_limits(self):
+
+        for length in (0, 10 * 1024 * 1024 + 1):
+            with self.subTest(length):
+                with self.assertRaises(HTTPException) as context:
+                    await self.store.create(length, 'description', self.user)
+                self.assertEqual(context.exception.status_code, 413)
+
+    async def test_get_of_other_user(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+
+        for upload_id, user in ((session.id, User(id=2)), ('../../etc/passwd', self.user), ('0' * 32, self.user)):
+            with self.subTest(upload_id):
+                with self.assertRaises(HTTPException) as context:
+                    await self.store.get(upload_id, user)
+                self.assertEqual(context.exception.status_code, 404)
+
+    async def test_append_and_complete(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+
+        session = await self.store.append(session.id, 0, body(self.data[:300], self.data[300:500]), self.user)
+        self.assertEqual(session.offset, 500)
+        session = await self.store.append(session.id, 500, body(self.data[500:]), self.user)
+        self.assertEqual(session.offset, 1024)
+
+        async with self.store.complete(session.id, self.user) as (completed, path):
+            self.assertEqual(completed.description, 'description')
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.data)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+    async def test_resend_same_offset_is_idempotent(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+        await self.store.append(session.id, 0, body(self.data[:500]), self.user)
+
+        # The response to the first attempt was lost, the client sends the same chunk again.
+        session = await self.store.append(session.id, 0, body(self.data[:500]), self.user)
+
+        self.assertEqual(session.offset, 500)
+        self.assertEqual(self.read_part(session.id), self.data[:500])
+
+    async def test_overlapping_chunk_appends_new_bytes(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+        await self.store.append(session.id, 0, body(self.data[:500]), self.user)
+
+        session = await self.store.append(session.id, 400, body(self.data[400:450], self.data[450:700]), self.user)
+
+        self.assertEqual(session.offset, 700)
+        self.assertEqual(self.read_part(session.id), self.data[:700])
+
+    async def test_gap_conflict(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+        await self.store.append(session.id, 0, body(self.data[:500]), self.user)
+
+        with self.assertRaises(HTTPException) as context:
+            await self.store.append(session.id, 600, body(self.data[600:]), self.user)
+
+        self.assertEqual(context.exception.status_code, 409)
+        self.assertEqual(context.exception.headers, {'Upload-Offset': '500'})
+        self.assertEqual(self.read_part(session.id), self.data[:500])
+
+    async def test_length_overflow(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+
+        with self.assertRaises(HTTPException) as context:
+            await self.store.append(session.id, 0, body(self.data[:1000], b'x' * 100), self.user)
+
+        self.assertEqual(context.exception.status_code, 413)
+        # The bytes written before the overflow are kept, the client resumes from there.
+        session = await self.store.get(session.id, self.user)
+        self.assertEqual(session.offset, 1000)
+        self.assertEqual(self.read_part(session.id), self.data[:1000])
+
+    async def test_failed_body_keeps_received_bytes(self):
+
+        async def broken_body():
+            yield self.data[:200]
+            raise ConnectionResetError
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+
+        with self.assertRaises(ConnectionResetError):
+            await self.store.append(session.id, 0, broken_body(), self.user)
+
+        self.assertEqual((await self.store.get(session.id, self.user)).offset, 200)
+
+    async def test_complete_incomplete_upload(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+        await self.store.append(session.id, 0, body(self.data[:500]), self.user)
+
+        with self.assertRaises(HTTPException) as context:
+            async with self.store.complete(session.id, self.user):
+                pass
+
+        self.assertEqual(context.exception.status_code, 409)
+        self.assertEqual(context.exception.headers, {'Upload-Offset': '500'})
+
+    async def test_failed_complete_keeps_upload(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+        await self.store.append(session.id, 0, body(self.data), self.user)
+
+        with self.assertRaises(RuntimeError):
+            async with self.store.complete(session.id, self.user):
+                raise RuntimeError('post was not created')
+
+        self.assertEqual((await self.store.get(session.id, self.user)).offset, 1024)
+
+    async def test_collect_expired(self):
+
+        expired = await self.store.create(len(self.data), 'description', self.user)
+        fresh = await self.store.create(len(self.data), 'description', self.user)
+        old = time.time() - 120
+        for suffix in ('json', 'part'):
+            os.utime(os.path.join(self.directory, f'{expired.id}.{suffix}'), (old, old))
+
+        self.assertEqual(await self.store.collect(), 1)
+
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([f'{fresh.id}.json', f'{fresh.id}.part']))
+
+    async def test_collect_keeps_upload_in_progress(self):
+
+        session = await self.store.create(len(self.data), 'description', self.user)
+        old = time.time() - 120
+        for suffix in ('json', 'part'):
+            os.utime(os.path.join(self.directory, f'{session.id}.{suffix}'), (old, old))
+
+        async with self.store._lock(session.id):
+            self.assertEqual(await self.store.collect(), 0)
+
+        self.assertEqual(await self.store.collect(), 1)
+
+    async def test_collect_without_directory(self):
+
+        store = UploadStore(directory=os.path.join(self.directory, 'missing'))
+
+        self.assertEqual(await store.collect(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()